@@ -1,26 +1,22 @@
-import io
-import re
-import unicodedata
-from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta, timezone
+# pandas / pdfplumber などの重いライブラリは、ログイン画面とアップロード画面を表示してから読み込む
+# （「集計に使うライブラリの読み込み」以降）。型注釈は実行時に評価しない。
+from __future__ import annotations
 
-# 作成日時は実行環境のタイムゾーンに依存させず、常に日本時間で表示する
-JST = timezone(timedelta(hours=9))
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
 
 import streamlit as st
-import pdfplumber
-import pandas as pd
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+
+from kwh_engine import EXTRACTOR_VERSION, ExtractionCache, ExtractionStore, resolve_store_path
+from kwh_engine.budget import InputTooLarge, check_memory_budget, resolve_memory_budget
+from kwh_engine.parallel import ExtractionCancelled, resolve_workers
+from kwh_engine.profiling import STAGE_LABELS, Profiler
+from kwh_engine.scheduler import ExtractionScheduler
+from kwh_engine.warmup import BackgroundWarmUp
 
 
 # =========================================================
@@ -180,6 +176,15 @@ PASSWORD = "energy2026"
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
 
+
+@st.cache_resource
+def background_warm_up() -> BackgroundWarmUp:
+    # パスワード入力中に、集計用ライブラリの読み込みとPDFレポート用フォントの登録を済ませておく（プロセスで1回）
+    return BackgroundWarmUp()
+
+
+background_warm_up()
+
 if not st.session_state.authenticated:
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -206,544 +211,315 @@ if not st.session_state.authenticated:
 
 
 # =========================================================
-# タイプキー抽出
+# 抽出結果キャッシュ（同じPDFの再アップロード・再実行でpdfplumberを省略）
 # =========================================================
-def extract_type_key_from_filename(name: str) -> str:
-    s = unicodedata.normalize("NFKC", name).strip()
-    s = s.replace("／", "/")
-    if "/" in s:
-        s = s.split("/")[-1]
-    if s.lower().endswith(".pdf"):
-        s = s[:-4]
-    return s.strip()
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "kwh-app", "extractions.sqlite3")
 
 
-def extract_type_key_from_label(label: str) -> str:
-    s = unicodedata.normalize("NFKC", str(label)).strip()
-    s = s.replace("／", "/")
-    if "/" in s:
-        s = s.split("/")[-1]
-    return s.strip()
+def open_extraction_store() -> Optional[ExtractionStore]:
+    # 抽出ストアは全セッションで共有し、再起動後も使う。KWH_STORE_PATH=off で使わない
+    path = resolve_store_path(default=DEFAULT_STORE_PATH)
+    if path is None:
+        return None
+    try:
+        return ExtractionStore(path)
+    except (OSError, sqlite3.Error):
+        # 書き込めない環境ではメモリ上のキャッシュだけで動かす
+        return None
+
+
+@st.cache_resource
+def get_extraction_cache() -> ExtractionCache:
+    # KWH_CACHE_DIR を設定するとディスクにも保存し、再起動後も再利用する
+    return ExtractionCache(disk_dir=os.environ.get("KWH_CACHE_DIR") or None, store=open_extraction_store())
 
 
 # =========================================================
-# PDFから消費電力量[kWh]を抽出（専用部）
+# 抽出スケジューラ（全セッションで1つのプロセスプールを共有し、同時に走る集計の数を抑える）
 # =========================================================
-def extract_kwh_from_pdf_bytes(pdf_bytes: bytes) -> Optional[int]:
-    try:
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            page = pdf.pages[-1]
-            raw = page.extract_text() or ""
-    except Exception:
-        return None
+@st.cache_resource
+def get_scheduler() -> ExtractionScheduler:
+    # ワーカー数は KWH_MAX_WORKERS、同時に抽出を進める集計の数は KWH_MAX_ACTIVE_RUNS で変えられる
+    return ExtractionScheduler()
+
+
+def session_id() -> str:
+    return st.session_state.setdefault("_session_id", uuid.uuid4().hex)
 
-    raw = unicodedata.normalize("NFKC", raw).replace("ｋＷｈ", "kWh")
-    lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
 
-    for i, ln in enumerate(lines):
-        if "消費電力量" in ln and "kWh" in ln:
-            for j in range(1, 4):
-                if i + j < len(lines):
-                    m = re.search(r"([0-9]{3,}(?:,[0-9]{3})*)", lines[i + j])
-                    if m:
-                        return int(m.group(1).replace(",", ""))
-            m = re.search(r"([0-9]{3,}(?:,[0-9]{3})*)", ln)
-            if m:
-                return int(m.group(1).replace(",", ""))
-    return None
+def scheduler_status() -> str:
+    stats = get_scheduler().stats()
+    return (
+        f"抽出ワーカー 稼働 {stats['running']}/{stats['workers']}（平均稼働率 {stats['average_utilization']:.0%}）"
+        f"・抽出待ち {stats['queued']}件・集計中 {stats['active_runs']}件・順番待ち {stats['waiting_runs']}件"
+    )
 
 
 # =========================================================
-# 共用部PDFから消費電力量を抽出（3ページ目）
+# 集計結果の保持（再実行のたびに再計算しない）
 # =========================================================
-def extract_common_area_energy(pdf_bytes: bytes) -> Tuple[Optional[float], Optional[float], Optional[float], list]:
-    """共用部PDFから「建物全体」「太陽光削減量」「実消費電力」(MWh) を抽出。
-
-    対応フォーマット:
-      - 新 (Ver.3.10 2026.04 以降): 4ページ目に「二次エネルギー消費量計算結果」。
-        太陽光発電は正の値（例: 5.33）で表示される。
-      - 旧: 3ページ目に「二次エネルギー消費量計算結果」。
-        太陽光発電はマイナス符号付き（例: -5.78）で表示される。
-
-    solar_reduction は内部的に常に正の「削減量」として保持し、
-    actual_consumption = building_total + solar_reduction を返す。
-    """
-    debug_info = []
-
-    raw = None
-    page_used = None
-    try:
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            debug_info.append(f"PDFページ数: {len(pdf.pages)}ページ")
-            # 4ページ目→3ページ目の順に「二次エネルギー消費量計算結果」を探す（新旧両対応）
-            for idx in (3, 2):
-                if idx < len(pdf.pages):
-                    txt = pdf.pages[idx].extract_text() or ""
-                    txt_norm = unicodedata.normalize("NFKC", txt)
-                    if (
-                        "二次エネルギー消費量計算結果" in txt_norm
-                        and "建物全体" in txt_norm
-                    ):
-                        raw = txt_norm
-                        page_used = idx + 1
-                        debug_info.append(
-                            f"✓ {page_used}ページ目から「二次エネルギー消費量計算結果」を検出: {len(raw)}文字"
-                        )
-                        break
-            if raw is None:
-                debug_info.append(
-                    "❌ 「二次エネルギー消費量計算結果」が3〜4ページ目に見つかりません"
-                )
-                return None, None, None, debug_info
-    except Exception as e:
-        debug_info.append(f"❌ PDF読み込みエラー: {str(e)}")
-        return None, None, None, debug_info
-
-    lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
-    debug_info.append(f"抽出行数: {len(lines)}行")
-
-    section_start_idx = None
-    for i, ln in enumerate(lines):
-        if "二次エネルギー消費量計算結果" in ln:
-            section_start_idx = i
-            debug_info.append(f"✓ セクション発見(行{i}): {ln[:50]}")
-            break
-
-    if section_start_idx is None:
-        debug_info.append("❌ 二次エネルギー消費量計算結果セクションが見つかりません")
-        return None, None, None, debug_info
-
-    building_total = None
-    solar_reduction = None
-    building_idx = None
-
-    for i in range(section_start_idx, min(section_start_idx + 30, len(lines))):
-        ln = lines[i]
-        # 「建物全体（延床面積あたり）」は除外
-        if "建物全体" in ln and "延床" not in ln and building_total is None:
-            building_idx = i
-            for offset in range(0, 5):
-                if i + offset < len(lines):
-                    search_line = lines[i + offset]
-                    match = re.search(r"(\d+\.\d+)", search_line)
-                    if match:
-                        building_total = float(match.group(1))
-                        debug_info.append(f"✓ 建物全体の値: {building_total} MWh")
-                        break
-            if building_total is not None:
-                break
-
-    if building_idx is not None:
-        for i in range(max(section_start_idx, building_idx - 20), building_idx):
-            ln = lines[i]
-            if "太陽光" in ln or "PV" in ln:
-                # マイナス符号あり/なし両対応。値は常に正の「削減量」として保持する
-                for offset in range(0, 4):
-                    if i + offset < len(lines):
-                        search_line = lines[i + offset]
-                        match = re.search(r"(-?\d+\.\d+)", search_line)
-                        if match:
-                            solar_reduction = abs(float(match.group(1)))
-                            debug_info.append(
-                                f"✓ 太陽光削減量: {solar_reduction} MWh（符号は除去して正値で保持）"
-                            )
-                            break
-                if solar_reduction is not None:
-                    break
-
-    if building_total is not None and solar_reduction is not None:
-        # 建物全体は太陽光削減後の値。実消費 = 建物全体 + 太陽光削減量
-        actual_consumption = building_total + solar_reduction
-        debug_info.append(
-            f"✓ 計算完了: {building_total} + {solar_reduction} = {actual_consumption} MWh"
-        )
-        return building_total, solar_reduction, actual_consumption, debug_info
-
-    return building_total, solar_reduction, None, debug_info
+def uploaded_digest(f) -> str:
+    # 同じアップロード（file_id）のハッシュは1回だけ計算する
+    digests = st.session_state.setdefault("_file_digests", {})
+    if f.file_id not in digests:
+        digests[f.file_id] = content_digest(f.getbuffer())
+    return digests[f.file_id]
 
 
 # =========================================================
-# 住戸リストCSVの列検出
+# 集計中の進捗表示
 # =========================================================
-def detect_unitlist_columns(df: pd.DataFrame):
-    col_row = next(c for c in df.columns if "行" in c)
-    col_num = next(c for c in df.columns if ("住戸" in c and "番号" in c))
-    candidates = [
-        c for c in df.columns
-        if ("住宅タイプ" in c) or ("タイプ" in c and "名称" in c)
-    ]
-    if not candidates:
-        raise RuntimeError("『住宅タイプの名称』列が見つかりません")
-    return col_row, col_num, candidates[0]
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds + 0.5)
+    return f"{seconds // 60}分{seconds % 60:02d}秒" if seconds >= 60 else f"{seconds}秒"
+
+
+class RunProgress:
+    """専用部PDFが1件終わるたびに、プログレスバー（残り時間つき）と途中結果の表を更新する。"""
+
+    def __init__(self, total: int, bar, table, interval: float = 0.25):
+        self.total = total
+        self.bar = bar
+        self.table = table
+        self.interval = interval   # 件数が多いときに描画が追いつかないよう間引く
+        self.rows = {}
+        self.started = time.perf_counter()
+        self.drawn_at = 0.0
+
+    def __call__(self, index: int, row: dict) -> None:
+        self.rows[index] = row
+        done = len(self.rows)
+        now = time.perf_counter()
+        if done < self.total and now - self.drawn_at < self.interval:
+            return
+        self.drawn_at = now
+        if done < self.total:
+            eta = (now - self.started) / done * (self.total - done)
+            text = f"⏳ 専用部PDF {done}/{self.total}件 抽出済み（残り約{format_eta(eta)}）"
+        else:
+            text = f"⏳ 専用部PDF {done}/{self.total}件 抽出済み。共用部PDF・住戸リストを処理中..."
+        self.bar.progress(done / self.total, text=text)
+        self.table.dataframe(pd.DataFrame([self.rows[i] for i in sorted(self.rows)]), use_container_width=True)
+
+    def waiting(self, position: int) -> None:
+        # 順番待ちの間も定期的に描画する（中止ボタンによる再実行はこの時点で反映される）
+        self.bar.progress(0.0, text=f"⏳ 待機中 ({position}件目)…他の集計が終わると自動で始まります")
+        self.started = time.perf_counter()
+
+    def clear(self) -> None:
+        self.bar.empty()
+        self.table.empty()
 
 
 # =========================================================
-# PDF出力機能
+# 集計結果の表示
 # =========================================================
-def build_pdf_report(
-    unit_list: pd.DataFrame,
-    project_name: str,
-    common_area_mwh: Optional[float] = None,
-    building_total: Optional[float] = None,
-    solar_reduction: Optional[float] = None
-) -> bytes:
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=20*mm,
-        leftMargin=20*mm,
-        topMargin=20*mm,
-        bottomMargin=20*mm
+def render_changes(update: IncrementalUpdate) -> None:
+    st.markdown("### 🔄 前回からの変更")
+    st.caption(
+        f"再抽出 {len(update.extracted_pdfs)}件 / 前回の抽出結果を使用 {update.reused_pdfs}件"
+        f" / 削除 {len(update.removed_pdfs)}件"
     )
-    
-    # 日本語フォント設定（OS別TTFを順に試し、最後はreportlab内蔵CIDフォントに必ずフォールバック）
-    font_name = None
-    for ttf_path, idx in [
-        ('C:\\Windows\\Fonts\\msgothic.ttc', 0),               # Windows
-        ('/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc', 0),  # macOS
-        ('/usr/share/fonts/truetype/fonts-japanese-gothic.ttf', None),
-        ('/usr/share/fonts/opentype/ipafont-gothic/ipagp.ttf', None),
-    ]:
-        try:
-            if idx is not None:
-                pdfmetrics.registerFont(TTFont('Japanese', ttf_path, subfontIndex=idx))
-            else:
-                pdfmetrics.registerFont(TTFont('Japanese', ttf_path))
-            font_name = 'Japanese'
-            break
-        except Exception:
-            continue
-    if font_name is None:
-        # Render等の最小環境向け: reportlab同梱のCID日本語フォント（追加パッケージ不要）
-        try:
-            pdfmetrics.registerFont(UnicodeCIDFont('HeiseiKakuGo-W5'))
-            font_name = 'HeiseiKakuGo-W5'
-        except Exception:
-            font_name = 'Courier'
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontName=font_name,
-        fontSize=16,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontName=font_name,
-        fontSize=14,
-        spaceAfter=10
-    )
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontName=font_name,
-        fontSize=10
-    )
-    
-    elements = []
-    
-    elements.append(Paragraph(project_name, title_style))
-    elements.append(Paragraph(f"作成日時: {datetime.now(JST).strftime('%Y年%m月%d日 %H:%M')}", normal_style))
-    elements.append(Spacer(1, 10*mm))
-    
-    elements.append(Paragraph("集計結果サマリー", heading_style))
-    
-    total_private_kwh = int(unit_list["消費電力量[kWh]"].sum())
-    summary_data = [["専用部合計消費電力量", f"{total_private_kwh:,} kWh"]]
-    
-    if common_area_mwh:
-        common_kwh = int(common_area_mwh * 1000)
-        grand_total = total_private_kwh + common_kwh
-        summary_data.extend([
-            ["共用部消費電力量", f"{common_kwh:,} kWh"],
-            ["建物全体消費電力量", f"{grand_total:,} kWh"]
-        ])
-    
-    summary_table = Table(summary_data, colWidths=[80*mm, 80*mm])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.yellow),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 10*mm))
-    
-    if common_area_mwh and building_total is not None and solar_reduction is not None:
-        elements.append(Paragraph("共用部消費電力量の計算内訳", heading_style))
-        
-        common_detail_data = [
-            ["項目", "値"],
-            ["建物全体（太陽光削減後）", f"{building_total:.2f} MWh"],
-            ["太陽光削減量", f"{solar_reduction:.2f} MWh"],
-            ["実際の消費電力（太陽光削減前）", f"{common_area_mwh:.2f} MWh"],
-            ["", f"= {common_area_mwh * 1000:,.0f} kWh"]
-        ]
-        
-        common_detail_table = Table(common_detail_data, colWidths=[80*mm, 80*mm])
-        common_detail_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-            ('BACKGROUND', (0, 3), (-1, 3), colors.lightgreen),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTNAME', (0, 0), (-1, -1), font_name),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(common_detail_table)
-        elements.append(Spacer(1, 5*mm))
-        
-        calc_text = f"計算式: {building_total:.2f} + {solar_reduction:.2f} = {common_area_mwh:.2f} MWh"
-        elements.append(Paragraph(calc_text, normal_style))
-        elements.append(Spacer(1, 10*mm))
-    
-    elements.append(Paragraph("タイプ別集計", heading_style))
-    
-    type_summary = (
-        unit_list
-        .groupby("タイプ", as_index=False)
-        .agg(戸数=("住戸の番号", "count"), 合計消費電力量=("消費電力量[kWh]", "sum"))
-    )
-    type_summary["1住戸あたり"] = (type_summary["合計消費電力量"] / type_summary["戸数"]).round(0).astype(int)
-    
-    type_data = [["タイプ", "戸数", "1住戸あたり[kWh]", "合計[kWh]"]]
-    for _, row in type_summary.sort_values("タイプ").iterrows():
-        type_data.append([
-            str(row["タイプ"]),
-            f"{int(row['戸数'])}",
-            f"{int(row['1住戸あたり']):,}",
-            f"{int(row['合計消費電力量']):,}"
-        ])
-    
-    type_table = Table(type_data, colWidths=[40*mm, 30*mm, 45*mm, 45*mm])
-    type_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(type_table)
-    elements.append(PageBreak())
-    
-    elements.append(Paragraph("住戸別詳細", heading_style))
-    
-    detail_data = [["行番号", "住戸番号", "タイプ", "消費電力量[kWh]"]]
-    for _, row in unit_list.iterrows():
-        detail_data.append([
-            str(row["行番号"]),
-            str(row["住戸の番号"]),
-            str(row["タイプ"]),
-            f"{int(row['消費電力量[kWh]']) if pd.notna(row['消費電力量[kWh]']) else '-':,}" if pd.notna(row['消費電力量[kWh]']) else "-"
-        ])
-    
-    detail_table = Table(detail_data, colWidths=[25*mm, 35*mm, 40*mm, 60*mm])
-    detail_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('ALIGN', (0, 0), (2, -1), 'CENTER'),
-        ('ALIGN', (3, 0), (3, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-    ]))
-    elements.append(detail_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
+    if not update.type_changes:
+        st.info("💡 kWhが変わったタイプはありません")
+        return
+    changes = pd.DataFrame(update.type_changes, columns=["タイプ", "前回kWh", "今回kWh", "住戸数"])
+    changes["差分kWh"] = [c.delta for c in update.type_changes]
+    changes["合計への影響kWh"] = [c.delta * c.units if c.delta is not None else None for c in update.type_changes]
+    for col in ("前回kWh", "今回kWh", "差分kWh", "合計への影響kWh"):
+        changes[col] = changes[col].astype("Int64")
+    st.dataframe(changes[["タイプ", "前回kWh", "今回kWh", "差分kWh", "住戸数", "合計への影響kWh"]], use_container_width=True)
+
+
+def render_performance(result: AggregationResult) -> None:
+    profile = result.profile
+    if profile is None:
+        return
+    with st.expander("⏱ パフォーマンス", expanded=False):
+        stages = pd.DataFrame(profile.summary())
+        st.dataframe(pd.DataFrame({
+            "処理段階": stages["stage"].map(STAGE_LABELS).fillna(stages["stage"]),
+            "回数": stages["count"],
+            "経過時間[秒]": stages["wall_sec"].round(3),
+            "CPU時間[秒]": stages["cpu_sec"].round(3),
+            "ピークメモリ[MB]": (pd.to_numeric(stages["peak_bytes"]) / 1024 ** 2).round(1),
+        }), hide_index=True, use_container_width=True)
+
+        per_pdf = pd.DataFrame([e for e in profile.events if e["stage"] == "extract_private"])
+        if not per_pdf.empty:
+            st.markdown("**時間のかかった専用部PDF（上位10件）**")
+            slowest = per_pdf.nlargest(10, "wall_sec")
+            st.dataframe(pd.DataFrame({
+                "PDF名": slowest["label"],
+                "経過時間[秒]": slowest["wall_sec"].round(3),
+                "CPU時間[秒]": slowest["cpu_sec"].round(3),
+                "ピークメモリ[MB]": (pd.to_numeric(slowest["peak_bytes"]) / 1024 ** 2).round(1),
+            }), hide_index=True, use_container_width=True)
+
+        st.caption(
+            "専用部PDF抽出の経過時間は1件ごとの合計です（並列抽出では実際の待ち時間より長くなります）。"
+            "Excel/PDF作成の計測はダウンロードボタンを押して作成した時点で記録されますが、ダウンロードでは画面が"
+            "再表示されないため、この表には次にボタンや入力欄を操作したときに反映されます。"
+            "計測結果（JSON）には、それまでに作成したExcel/PDFの計測も含まれます。"
+        )
+        warm = background_warm_up()
+        if warm.done and warm.timings:
+            st.caption(
+                f"集計用ライブラリとPDFレポートのフォントは、ログイン画面の表示中に読み込み済みです"
+                f"（{sum(warm.timings.values()):.2f}秒）。"
+            )
+        st.caption(f"{scheduler_status()}（全セッション共通・画面表示時点）")
+        if not profile.trace_memory:
+            st.caption("ピークメモリは「⚙️ 詳細設定」でメモリ計測をオンにすると表示されます。")
+        st.download_button(
+            "📥 計測結果（JSON）",
+            data=lambda: profile.to_json(),
+            file_name=f"{result.project_name}_パフォーマンス.json",
+            mime="application/json",
+            on_click="ignore",
+        )
+
+
+def render_results(result: AggregationResult, streaming_excel: bool, update: Optional[IncrementalUpdate] = None) -> None:
+    project_name = result.project_name
+
+    st.markdown("<div class='result-box'>", unsafe_allow_html=True)
+    st.markdown("### ✅ 専用部PDF抽出結果")
+    pdf_rows = pd.DataFrame(result.pdf_rows)
+    st.dataframe(pdf_rows, use_container_width=True)
+    if "取得元" in pdf_rows:
+        st.caption("取得元: " + " / ".join(f"{k} {n}件" for k, n in pdf_rows["取得元"].value_counts().items()))
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    if update is not None:
+        render_changes(update)
+
+    common = result.common
+    cache = get_extraction_cache()
+    cache_stats = cache.stats()
+    with st.expander("🔍 抽出デバッグ情報", expanded=False):
+        st.text(
+            f"抽出キャッシュ: ヒット {result.cache_stats['hit']}件 / ミス {result.cache_stats['miss']}件"
+            f"（保持 {cache_stats['entries']}件・累計ヒット"
+            f" {cache_stats['hits'] + cache_stats['disk_hits'] + cache_stats['store_hits']}件）"
+        )
+        if cache.store is not None:
+            store_stats = cache.store.stats()
+            st.text(
+                f"抽出ストア: {store_stats['entries']}件・{store_stats['bytes'] / 1024 ** 2:.1f} MB"
+                f"（{cache.store.path}）"
+            )
+        st.text("\n".join(
+            f"[{row['PDF名']}] {info}" for row, infos in zip(result.pdf_rows, result.private_debug) for info in infos
+        ))
+        for info in (common.debug_info if common else []):
+            st.text(info)
+
+    render_performance(result)
+
+    if common:
+        if common.actual_consumption is not None:
+            st.success("✅ 共用部消費電力量を抽出しました")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("🏢 建物全体（太陽光削減後）", f"{common.building_total:.2f} MWh")
+            with col2:
+                st.metric("☀️ 太陽光削減量", f"{common.solar_reduction:.2f} MWh")
+            with col3:
+                st.metric("⚡ 実際の消費電力", f"{common.actual_consumption:.2f} MWh", delta=f"{common.actual_consumption * 1000:,.0f} kWh")
+        else:
+            st.error("⚠️ 共用部PDFから値を抽出できませんでした")
+
+    if result.unit_list is None:
+        st.error("❌ CSVを読み込めませんでした")
+    else:
+        unit_list = result.unit_list
+        common_area_mwh = result.common_area_mwh
+
+        with st.expander("📋 住戸別マッピング（先頭50行）", expanded=False):
+            st.dataframe(unit_list.head(50), use_container_width=True)
+
+        missing_types = result.missing_types
+        if not missing_types.empty:
+            st.warning("⚠️ kWhが取得できていないタイプがあります")
+            suggestions = result.type_suggestions
+            st.dataframe(pd.DataFrame({
+                "タイプ": missing_types.index,
+                "住戸数": missing_types.to_numpy(),
+                "考えられる原因": [
+                    (f"PDF名が違う可能性: {'、'.join(suggestions[t])}" if suggestions.get(t) else "このタイプのPDFがありません")
+                    if t in suggestions else "PDFから値を読み取れませんでした"
+                    for t in missing_types.index
+                ],
+            }), hide_index=True, use_container_width=True)
+
+        st.markdown("<div class='result-box'>", unsafe_allow_html=True)
+        st.markdown("### 📊 集計結果")
+
+        col1, col2, col3 = st.columns(3)
+        totals = result.totals
+
+        with col1:
+            st.metric("🏠 専用部合計", f"{totals.private_kwh:,} kWh")
+
+        if common_area_mwh:
+            with col2:
+                st.metric("🏢 共用部", f"{totals.common_kwh:,} kWh")
+            with col3:
+                st.metric("🏗️ 建物全体", f"{totals.grand_total_kwh:,} kWh")
+
+        st.markdown("</div>", unsafe_allow_html=True)
+
+        st.markdown("### 💾 ダウンロード")
+        col1, col2, col3 = st.columns(3)
+        # レポートはボタンが押されたときに作成する（同じ集計結果では作成済みのものを返す）
+
+        with col1:
+            st.download_button("📊 Excelダウンロード", data=lambda: excel_report_for(result, streaming_excel), file_name=f"{project_name}_消費電力量集計.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", on_click="ignore", use_container_width=True)
+
+        with col2:
+            st.download_button("📄 PDF出力", data=lambda: pdf_report_for(result), file_name=f"{project_name}_消費電力量集計.pdf", mime="application/pdf", on_click="ignore", use_container_width=True)
+
+        with col3:
+            st.info("💡 PDFをダウンロードして印刷できます")
+
+        st.download_button("🗂 集計結果を保存（スナップショット）", data=lambda: save_snapshot(result), file_name=f"{project_name}_集計結果.json", mime="application/json", on_click="ignore", use_container_width=True)
+        st.caption("保存したファイルを「📂 保存した集計結果から再作成」で読み込むと、PDFを読み込まずに物件名・住戸リストを変えてレポートを作り直せます。")
 
 
 # =========================================================
-# Excel作成
+# スナップショット（保存した集計結果からの再作成）
 # =========================================================
-def build_standard_excel(
-    unit_list: pd.DataFrame, 
-    project_name: str,
-    common_area_mwh: Optional[float] = None
-) -> bytes:
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "集計"
-
-    thin = Side(border_style="thin", color="999999")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    header_fill = PatternFill("solid", fgColor="667EEA")
-    total_fill = PatternFill("solid", fgColor="FFF2CC")
-    title_fill = PatternFill("solid", fgColor="764BA2")
-    common_fill = PatternFill("solid", fgColor="E8DAEF")
-    grand_fill = PatternFill("solid", fgColor="F5576C")
-    bold = Font(bold=True, color="FFFFFF")
-    center = Alignment(horizontal="center")
-    right = Alignment(horizontal="right")
-
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=10)
-    t = ws.cell(row=1, column=1)
-    t.value = project_name
-    t.font = Font(bold=True, size=16, color="FFFFFF")
-    t.alignment = center
-    t.fill = title_fill
-
-    left_headers = ["行番号", "住戸の番号", "タイプ", "消費電力量[kWh]"]
-    for c, h in enumerate(left_headers, start=1):
-        cell = ws.cell(row=2, column=c, value=h)
-        cell.font = bold
-        cell.fill = header_fill
-        cell.alignment = center
-        cell.border = border
-
-    for i, row in unit_list.iterrows():
-        r = i + 3
-        ws.cell(row=r, column=1, value=row["行番号"]).border = border
-        ws.cell(row=r, column=2, value=row["住戸の番号"]).border = border
-        ws.cell(row=r, column=3, value=row["タイプ"]).border = border
-        ws.cell(row=r, column=4, value=row["消費電力量[kWh]"]).border = border
-
-        ws.cell(row=r, column=1).alignment = center
-        ws.cell(row=r, column=2).alignment = right
-        ws.cell(row=r, column=3).alignment = center
-        ws.cell(row=r, column=4).alignment = right
-
-    total_units = int(unit_list["住戸の番号"].nunique())
-    total_kwh = int(unit_list["消費電力量[kWh]"].sum())
-    sum_row = len(unit_list) + 3
-
-    ws.cell(row=sum_row, column=1, value="専用部合計住戸数").fill = total_fill
-    ws.cell(row=sum_row, column=2, value=total_units).fill = total_fill
-    ws.cell(row=sum_row, column=3, value="専用部合計消費電力量[kWh]").fill = total_fill
-    ws.cell(row=sum_row, column=4, value=total_kwh).fill = total_fill
-
-    for c in range(1, 5):
-        ws.cell(row=sum_row, column=c).font = Font(bold=True)
-        ws.cell(row=sum_row, column=c).border = border
-
-    if common_area_mwh is not None:
-        common_kwh = int(common_area_mwh * 1000)
-        sum_row += 1
-        ws.cell(row=sum_row, column=3, value="共用部消費電力量[kWh]").fill = common_fill
-        ws.cell(row=sum_row, column=4, value=common_kwh).fill = common_fill
-        ws.cell(row=sum_row, column=3).font = Font(bold=True)
-        ws.cell(row=sum_row, column=4).font = Font(bold=True)
-        ws.cell(row=sum_row, column=3).border = border
-        ws.cell(row=sum_row, column=4).border = border
-        ws.cell(row=sum_row, column=4).alignment = right
-
-        grand_total = total_kwh + common_kwh
-        sum_row += 1
-        ws.cell(row=sum_row, column=3, value="建物全体消費電力量[kWh]").fill = grand_fill
-        ws.cell(row=sum_row, column=4, value=grand_total).fill = grand_fill
-        ws.cell(row=sum_row, column=3).font = Font(bold=True, size=12, color="FFFFFF")
-        ws.cell(row=sum_row, column=4).font = Font(bold=True, size=12, color="FFFFFF")
-        ws.cell(row=sum_row, column=3).border = border
-        ws.cell(row=sum_row, column=4).border = border
-        ws.cell(row=sum_row, column=4).alignment = right
-
-    ts = (
-        unit_list
-        .groupby("タイプ", as_index=False)
-        .agg(戸数=("住戸の番号", "count"), 合計消費電力量_kWh=("消費電力量[kWh]", "sum"))
-    )
-    ts["kwh_per_unit"] = (ts["合計消費電力量_kWh"] / ts["戸数"]).round(0).astype(int)
-
-    right_headers = ["タイプ", "戸数", "1住戸あたり消費電力量[kWh]", "合計消費電力量[kWh]"]
-    for c, h in enumerate(right_headers, start=6):
-        cell = ws.cell(row=2, column=c, value=h)
-        cell.font = bold
-        cell.fill = header_fill
-        cell.alignment = center
-        cell.border = border
-
-    r0 = 3
-    for i, row in ts.sort_values("タイプ").iterrows():
-        ws.cell(row=r0, column=6, value=row["タイプ"]).border = border
-        ws.cell(row=r0, column=7, value=int(row["戸数"])).border = border
-        ws.cell(row=r0, column=8, value=int(row["kwh_per_unit"])).border = border
-        ws.cell(row=r0, column=9, value=int(row["合計消費電力量_kWh"])).border = border
-
-        for c in range(6, 10):
-            ws.cell(row=r0, column=c).alignment = right if c >= 7 else center
-        r0 += 1
-    
-    sum_units = int(ts["戸数"].sum())
-    sum_kwh = int(ts["合計消費電力量_kWh"].sum())
-    r0 += 1
-
-    ws.cell(row=r0, column=6, value="専用部合計住戸数").fill = total_fill
-    ws.cell(row=r0, column=7, value=sum_units).fill = total_fill
-    ws.cell(row=r0, column=6).font = Font(bold=True)
-    ws.cell(row=r0, column=7).font = Font(bold=True)
-    ws.cell(row=r0, column=6).border = border
-    ws.cell(row=r0, column=7).border = border
-    ws.cell(row=r0, column=6).alignment = center
-    ws.cell(row=r0, column=7).alignment = right
-
-    r0 += 1
-    ws.cell(row=r0, column=6, value="専用部合計消費電力量[kWh]").fill = total_fill
-    ws.cell(row=r0, column=7, value=sum_kwh).fill = total_fill
-    ws.cell(row=r0, column=6).font = Font(bold=True)
-    ws.cell(row=r0, column=7).font = Font(bold=True)
-    ws.cell(row=r0, column=6).border = border
-    ws.cell(row=r0, column=7).border = border
-    ws.cell(row=r0, column=6).alignment = center
-    ws.cell(row=r0, column=7).alignment = right
-
-    if common_area_mwh is not None:
-        common_kwh = int(common_area_mwh * 1000)
-        
-        r0 += 1
-        ws.cell(row=r0, column=6, value="共用部消費電力量[kWh]").fill = common_fill
-        ws.cell(row=r0, column=7, value=common_kwh).fill = common_fill
-        ws.cell(row=r0, column=6).font = Font(bold=True)
-        ws.cell(row=r0, column=7).font = Font(bold=True)
-        ws.cell(row=r0, column=6).border = border
-        ws.cell(row=r0, column=7).border = border
-        ws.cell(row=r0, column=6).alignment = center
-        ws.cell(row=r0, column=7).alignment = right
-
-        grand_total = sum_kwh + common_kwh
-        r0 += 1
-        ws.cell(row=r0, column=6, value="建物全体消費電力量[kWh]").fill = grand_fill
-        ws.cell(row=r0, column=7, value=grand_total).fill = grand_fill
-        ws.cell(row=r0, column=6).font = Font(bold=True, size=12, color="FFFFFF")
-        ws.cell(row=r0, column=7).font = Font(bold=True, size=12, color="FFFFFF")
-        ws.cell(row=r0, column=6).border = border
-        ws.cell(row=r0, column=7).border = border
-        ws.cell(row=r0, column=6).alignment = center
-        ws.cell(row=r0, column=7).alignment = right
-
-    ws.column_dimensions["A"].width = 10
-    ws.column_dimensions["B"].width = 15
-    ws.column_dimensions["C"].width = 12
-    ws.column_dimensions["D"].width = 20
-    ws.column_dimensions["F"].width = 12
-    ws.column_dimensions["G"].width = 10
-    ws.column_dimensions["H"].width = 26
-    ws.column_dimensions["I"].width = 22
-
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf.getvalue()
+def on_snapshot_upload() -> None:
+    # 物件名の入力欄へ保存時の物件名を入れる（ウィジェットの値はコールバック内でだけ変更できる）
+    # コールバックはスクリプトより先に呼ばれるので、ここで読み込む
+    from kwh_engine.snapshot import load_snapshot
+
+    st.session_state.pop("snapshot", None)
+    st.session_state.pop("snapshot_error", None)
+    f = st.session_state.get("snapshot_file")
+    if f is None:
+        return
+    try:
+        snapshot = load_snapshot(f.getvalue())
+    except ValueError as e:
+        st.session_state["snapshot_error"] = str(e)
+        return
+    st.session_state["snapshot"] = snapshot
+    st.session_state["project_name"] = snapshot.result.project_name
+
+
+def snapshot_result(snapshot: Snapshot, project_name: str, csv_file) -> AggregationResult:
+    # 物件名・住戸リストが前回と同じなら、作り直した結果（作成済みのレポートを含む）を使い回す
+    key = (id(snapshot), project_name, uploaded_digest(csv_file) if csv_file else None)
+    view = st.session_state.get("snapshot_view")
+    if view is None or view["key"] != key:
+        result = rebuild_result(
+            snapshot.result, project_name, csv_file.getvalue() if csv_file else None, profiler=Profiler()
+        )
+        view = {"key": key, "result": result}
+        st.session_state["snapshot_view"] = view
+    return view["result"]
 
 
 # =========================================================
@@ -755,7 +531,8 @@ st.markdown("<p style='text-align: center; color: #666; font-size: 18px; margin-
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     st.markdown("### 📝 物件情報")
-    project_name = st.text_input("物件名", value="（仮称）〇〇計画 新築工事", label_visibility="collapsed")
+    st.session_state.setdefault("project_name", "（仮称）〇〇計画 新築工事")
+    project_name = st.text_input("物件名", key="project_name", label_visibility="collapsed")
 
 st.markdown("<div style='margin: 2rem 0;'></div>", unsafe_allow_html=True)
 
@@ -773,106 +550,151 @@ with col3:
     st.markdown("### 🏢 共用部PDF")
     common_pdf = st.file_uploader("共用部PDF（1ファイル）", type=["pdf"], key="common_pdf", label_visibility="collapsed")
 
+with st.expander("📂 保存した集計結果から再作成（PDFの読み込みなし）", expanded=False):
+    st.file_uploader("スナップショット（JSON）", type=["json"], key="snapshot_file", on_change=on_snapshot_upload, label_visibility="collapsed")
+    st.caption("「🗂 集計結果を保存」でダウンロードしたファイルを読み込みます。物件名は上の入力欄、住戸リストCSVをアップロードした場合はそのCSVで作り直します。")
+    if "snapshot_error" in st.session_state:
+        st.error(f"❌ {st.session_state['snapshot_error']}")
+
+with st.expander("⚙️ 詳細設定", expanded=False):
+    parallel_extract = st.checkbox("専用部PDFを並列抽出する（複数CPUコアを使用）", value=True)
+    max_workers = st.number_input("並列数", min_value=1, max_value=64, value=resolve_workers(), step=1, disabled=not parallel_extract)
+    extraction_mode = st.radio(
+        "抽出方式",
+        options=["full", "anchor"],
+        format_func=lambda m: {"full": "ページ全体を読み込む（標準）", "anchor": "アンカー周辺のみ読み込む"}[m],
+        horizontal=True,
+    )
+    streaming_excel = st.checkbox("Excelを高速モードで作成する（大規模物件向け・レイアウトは同じ）", value=True)
+    incremental = st.checkbox("前回の集計から追加・差し替えられたPDFだけ再集計する", value=True)
+    trace_memory = st.checkbox("処理段階ごとのメモリ使用量も計測する（処理が遅くなります）", value=False)
+    st.caption(scheduler_status())
+
+# 入力の合計サイズがメモリ予算（KWH_MEMORY_BUDGET_MB）を超える場合は、集計を始める前に断る
+memory_budget = resolve_memory_budget()
+uploads = ([csv_file] if csv_file else []) + list(pdf_files or []) + ([common_pdf] if common_pdf else [])
+try:
+    check_memory_budget([(f.name, f.size) for f in uploads], memory_budget)
+    over_budget = False
+except InputTooLarge as e:
+    over_budget = True
+    st.error(f"❌ {e}。PDFを減らすか、物件を分けて集計してください")
+
+
+# =========================================================
+# 集計に使うライブラリの読み込み（ここまでの画面を表示してから読み込む）
+# =========================================================
+import pandas as pd
+
+from kwh_engine.pipeline import (
+    AggregationResult,
+    IncrementalUpdate,
+    PdfInput,
+    PipelineInputs,
+    content_digest,
+    excel_report_for,
+    input_fingerprint,
+    pdf_report_for,
+    rebuild_result,
+    run_incremental,
+    run_pipeline,
+)
+from kwh_engine.snapshot import Snapshot, save_snapshot
+from kwh_engine.unitlist import UnitListColumnError
+
 col1, col2, col3 = st.columns([1, 1, 1])
 with col2:
-    if st.button("🚀 集計実行", use_container_width=True):
+    run_clicked = st.button("🚀 集計実行", use_container_width=True, disabled=over_budget)
+    if st.session_state.pop("running", False) and not run_clicked:
+        st.warning("⏹ 集計を中止しました")
+
+    # 入力の指紋が前回の集計と同じなら、ウィジェット操作による再実行でも保存済みの結果を表示する
+    fingerprint = None
+    if csv_file and pdf_files:
+        fingerprint = input_fingerprint(
+            project_name,
+            uploaded_digest(csv_file),
+            [(f.name, uploaded_digest(f)) for f in pdf_files],
+            uploaded_digest(common_pdf) if common_pdf else None,
+            extraction_mode,
+        )
+    stored = st.session_state.get("aggregation")
+
+    if run_clicked:
         if not csv_file or not pdf_files:
             st.error("❌ CSVと専用部PDFを両方アップロードしてください")
-        else:
-            with st.spinner("⏳ 処理中..."):
-                type_kwh: Dict[str, Optional[int]] = {}
-                rows = []
-
-                for f in pdf_files:
-                    kwh = extract_kwh_from_pdf_bytes(f.read())
-                    tkey = extract_type_key_from_filename(f.name)
-                    rows.append({"PDF名": f.name, "タイプ": tkey, "kWh": kwh})
-                    type_kwh[tkey] = kwh
-
-                st.markdown("<div class='result-box'>", unsafe_allow_html=True)
-                st.markdown("### ✅ 専用部PDF抽出結果")
-                st.dataframe(pd.DataFrame(rows), use_container_width=True)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                common_area_mwh = None
-                building_total_value = None
-                solar_reduction_value = None
-                
-                if common_pdf:
-                    building_total, solar_reduction, actual_consumption, debug_info = extract_common_area_energy(common_pdf.read())
-                    
-                    with st.expander("🔍 抽出デバッグ情報", expanded=False):
-                        for info in debug_info:
-                            st.text(info)
-                    
-                    if actual_consumption is not None:
-                        st.success("✅ 共用部消費電力量を抽出しました")
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("🏢 建物全体（太陽光削減後）", f"{building_total:.2f} MWh")
-                        with col2:
-                            st.metric("☀️ 太陽光削減量", f"{solar_reduction:.2f} MWh")
-                        with col3:
-                            st.metric("⚡ 実際の消費電力", f"{actual_consumption:.2f} MWh", delta=f"{actual_consumption * 1000:,.0f} kWh")
-                        common_area_mwh = actual_consumption
-                        building_total_value = building_total
-                        solar_reduction_value = solar_reduction
+        elif stored is None or stored["fingerprint"] != fingerprint:
+            workers = int(max_workers) if parallel_extract else 1
+            inputs = PipelineInputs(
+                project_name=project_name,
+                csv_bytes=csv_file.getvalue(),
+                # PDFはアップロードされたバッファをコピーせずに渡す（getvalue() は全体を複製する）
+                private_pdfs=[PdfInput(f.name, f.getbuffer()) for f in pdf_files],
+                common_pdf=common_pdf.getbuffer() if common_pdf else None,
+                mode=extraction_mode,
+                max_workers=workers,
+                memory_budget=memory_budget,
+            )
+            progress = RunProgress(len(inputs.private_pdfs), st.progress(0.0, text="⏳ 処理中..."), st.empty())
+            cancel_slot = st.empty()
+            # 押すとスクリプトが再実行され、実行中の集計は次の進捗表示の時点で打ち切られる
+            cancel_slot.button("⏹ 中止", use_container_width=True)
+            st.session_state["running"] = True
+            profiler = Profiler(trace_memory=trace_memory)
+            update = None
+            run_error = None
+            interrupted = False
+            try:
+                # 抽出は全セッション共通のプールで行う。同時に走る集計が多いときは順番が来るまで待つ
+                scheduler = get_scheduler()
+                with scheduler.job(session_id(), max_in_flight=workers, on_wait=progress.waiting) as job:
+                    if job.waited_sec >= 0.5:
+                        profiler.record("queue_wait", (job.waited_sec, 0.0, None))
+                    # 並列にならない場合（並列数1・1コア環境）はPDFをワーカーへ渡さず、このプロセスで順に抽出する
+                    executor = job if min(workers, scheduler.max_workers) > 1 else None
+                    if incremental and stored is not None:
+                        update = run_incremental(
+                            inputs, stored["result"], cache=get_extraction_cache(), executor=executor,
+                            on_pdf_done=progress, profiler=profiler,
+                        )
+                        result = update.result
                     else:
-                        st.error("⚠️ 共用部PDFから値を抽出できませんでした")
-
-                units = None
-                for enc in ("utf-8-sig", "cp932", "utf-8"):
-                    try:
-                        units = pd.read_csv(csv_file, encoding=enc)
-                        break
-                    except Exception:
-                        continue
-
-                if units is None:
-                    st.error("❌ CSVを読み込めませんでした")
-                else:
-                    col_row, col_num, col_type = detect_unitlist_columns(units)
-                    units["タイプ"] = units[col_type].apply(extract_type_key_from_label)
-                    units["消費電力量[kWh]"] = units["タイプ"].map(type_kwh)
-                    unit_list = units[[col_row, col_num, "タイプ", "消費電力量[kWh]"]]
-                    unit_list.columns = ["行番号", "住戸の番号", "タイプ", "消費電力量[kWh]"]
-
-                    with st.expander("📋 住戸別マッピング（先頭50行）", expanded=False):
-                        st.dataframe(unit_list.head(50), use_container_width=True)
-
-                    missing = unit_list[unit_list["消費電力量[kWh]"].isna()]
-                    if not missing.empty:
-                        st.warning("⚠️ kWhが取得できていないタイプがあります")
-                        st.dataframe(missing["タイプ"].value_counts())
-
-                    st.markdown("<div class='result-box'>", unsafe_allow_html=True)
-                    st.markdown("### 📊 集計結果")
-                    
-                    col1, col2, col3 = st.columns(3)
-                    total_private = int(unit_list["消費電力量[kWh]"].sum())
-                    
-                    with col1:
-                        st.metric("🏠 専用部合計", f"{total_private:,} kWh")
-                    
-                    if common_area_mwh:
-                        common_kwh = int(common_area_mwh * 1000)
-                        with col2:
-                            st.metric("🏢 共用部", f"{common_kwh:,} kWh")
-                        with col3:
-                            st.metric("🏗️ 建物全体", f"{total_private + common_kwh:,} kWh")
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
-
-                    st.markdown("### 💾 ダウンロード")
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        excel = build_standard_excel(unit_list, project_name, common_area_mwh)
-                        st.download_button("📊 Excelダウンロード", data=excel, file_name=f"{project_name}_消費電力量集計.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
-                    
-                    with col2:
-                        pdf_report = build_pdf_report(unit_list, project_name, common_area_mwh, building_total_value, solar_reduction_value)
-                        st.download_button("📄 PDF出力", data=pdf_report, file_name=f"{project_name}_消費電力量集計.pdf", mime="application/pdf", use_container_width=True)
-                    
-                    with col3:
-                        st.info("💡 PDFをダウンロードして印刷できます")
\ No newline at end of file
+                        result = run_pipeline(
+                            inputs, cache=get_extraction_cache(), executor=executor, on_pdf_done=progress, profiler=profiler
+                        )
+            except UnitListColumnError as e:
+                # 住戸リストCSVの列が見つからない場合は、PDFの抽出を待たずに打ち切られる
+                run_error = f"住戸リストCSV: {e}。CSVを確認して再度アップロードしてください"
+            except BrokenProcessPool:
+                # 共有プールのワーカーが落ちた（メモリ不足など）。プールはスケジューラが作り直している
+                run_error = "抽出中にワーカープロセスが停止しました（メモリ不足など）。もう一度「🚀 集計実行」を押してください"
+            except ExtractionCancelled:
+                run_error = "抽出が中止されました。もう一度「🚀 集計実行」を押してください"
+            except BaseException as e:
+                # 中止ボタンによる再実行は Streamlit が Exception 以外の例外で伝える。その場合は running を残し、
+                # 次の実行で「集計を中止しました」と表示する
+                interrupted = not isinstance(e, Exception)
+                raise
+            finally:
+                if not interrupted:
+                    st.session_state["running"] = False
+                    progress.clear()
+                    cancel_slot.empty()
+            if run_error is not None:
+                st.error(f"❌ {run_error}")
+            else:
+                stored = {"fingerprint": fingerprint, "result": result, "update": update}
+                st.session_state["aggregation"] = stored
+
+    if stored is not None and fingerprint is not None:
+        if stored["fingerprint"] == fingerprint:
+            render_results(stored["result"], streaming_excel, stored["update"])
+        else:
+            st.info("💡 入力が変更されました。「🚀 集計実行」で再集計してください")
+
+    snapshot = st.session_state.get("snapshot")
+    if snapshot is not None and not pdf_files:
+        st.info(f"📂 {snapshot.saved_at[:16].replace('T', ' ')} に保存した集計結果を表示しています（PDFは読み込んでいません）")
+        if snapshot.extractor_version != EXTRACTOR_VERSION:
+            st.warning("⚠️ 保存したときと抽出処理のバージョンが違います。最新の抽出結果が必要な場合はPDFから集計し直してください")
+        render_results(snapshot_result(snapshot, project_name, csv_file), streaming_excel)
@@ -0,0 +1,9 @@
+"""抽出・集計・レポート出力のベンチマーク。
+
+ReportLabで合成した専用部・共用部PDFと住戸リストCSVを使い、物件規模ごとの処理時間を測って
+JSONに書き出す。アプリ本体（app.py / kwh_engine）からは読み込まない。
+
+    python -m benchmarks -o bench.json                     # 全規模
+    python -m benchmarks --sizes S,M -o bench.json         # 規模を選ぶ
+    python -m benchmarks --sizes S --baseline before.json  # 前回の結果と比較
+"""
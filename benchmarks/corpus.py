@@ -0,0 +1,138 @@
+import io
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfgen import canvas
+
+from kwh_engine.formats import resolve_format
+from kwh_engine.pipeline import PdfInput, PipelineInputs
+
+
+# =========================================================
+# 合成PDFの共通設定
+# =========================================================
+FONT_NAME = "HeiseiKakuGo-W5"
+
+# 共用部PDFのレイアウト → 1ページ目に書く計算プログラムのバージョン表記。
+# ページ位置と太陽光の符号は formats.FORMAT_REGISTRY から引くので、実際の判定と必ず一致する。
+COMMON_LAYOUTS: Dict[str, str] = {
+    "new": "Ver.3.10 2026.04",
+    "old": "Ver.3.6 2024.04",
+}
+
+
+@lru_cache(maxsize=None)
+def _register_font() -> str:
+    pdfmetrics.registerFont(UnicodeCIDFont(FONT_NAME))
+    return FONT_NAME
+
+
+def _filler_lines(c: canvas.Canvas, page_no: int, top: float, n_lines: int) -> None:
+    # 実際の計算書と同程度の文字数になるよう、表形式のダミー行を敷き詰める
+    for k in range(n_lines):
+        c.drawString(50, top - k * 15, f"{page_no}-{k + 1:02d} 設備区分{k % 7} 基準値 {k * 1.25:,.2f} 設計値 {k * 1.1:,.2f} MJ/年")
+
+
+# =========================================================
+# 専用部PDF（住戸部分の計算書）
+# =========================================================
+def make_private_pdf(type_name: str, kwh: int, pages: int = 3) -> bytes:
+    """最終ページに「消費電力量 [kWh/年]」と値を載せた専用部PDF。"""
+    font = _register_font()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.setTitle(f"住戸部分 一次エネルギー消費量計算書 {type_name}")
+    for p in range(pages):
+        c.setFont(font, 10)
+        c.drawString(50, 800, f"住戸部分の一次エネルギー消費量計算書（タイプ {type_name}） {p + 1}/{pages}")
+        _filler_lines(c, p + 1, 775, 30)
+        if p == pages - 1:
+            c.drawString(300, 250, "消費電力量 [kWh/年]")
+            c.drawString(300, 235, f"{kwh:,}")
+            c.drawString(300, 220, "（参考）一次エネルギー消費量 [GJ/年]")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+# =========================================================
+# 共用部PDF（非住宅版の計算書）
+# =========================================================
+def make_common_pdf(building_total: float, solar_reduction: float, layout: str = "new", pages: int = 4) -> bytes:
+    """「二次エネルギー消費量計算結果」ページを持つ共用部PDF。
+
+    layout="new" は4ページ目・太陽光は正値、layout="old" は3ページ目・太陽光はマイナス符号付き。
+    """
+    version = COMMON_LAYOUTS[layout]
+    fmt = resolve_format(version)
+    if pages <= fmt.page_index:
+        raise ValueError(f"{layout}形式の共用部PDFは{fmt.page_index + 1}ページ以上必要です")
+    font = _register_font()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for p in range(pages):
+        c.setFont(font, 10)
+        if p == 0:
+            c.drawString(50, 800, f"エネルギー消費性能計算プログラム（非住宅版） {version}")
+        _filler_lines(c, p + 1, 760, 30)
+        if p == fmt.page_index:
+            solar = solar_reduction * fmt.solar_sign
+            c.drawString(50, 300, "二次エネルギー消費量計算結果")
+            c.drawString(50, 280, "太陽光発電")
+            c.drawString(200, 280, f"{solar:.2f}")
+            c.drawString(50, 260, "建物全体")
+            c.drawString(200, 260, f"{building_total:.2f}")
+            c.drawString(50, 240, "建物全体（延床面積あたり）")
+            c.drawString(200, 240, "0.12")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+# =========================================================
+# 住戸リストCSV・物件一式
+# =========================================================
+def type_names(n_types: int) -> List[str]:
+    """A1, B1, …, Z1, A2, … の順のタイプ名。"""
+    return [f"{chr(ord('A') + i % 26)}{i // 26 + 1}" for i in range(n_types)]
+
+
+def make_unit_csv(types: List[str], n_units: int, encoding: str = "cp932") -> bytes:
+    """住戸リストCSV（行番号 / 住戸の番号 / 住宅タイプの名称）。タイプは順番に割り当てる。"""
+    lines = ["行番号,住戸の番号,住宅タイプの名称"]
+    for i in range(n_units):
+        floor, room = divmod(i, 20)
+        lines.append(f"{i + 1},{(floor + 1) * 100 + room + 1},{types[i % len(types)]}")
+    return ("\r\n".join(lines) + "\r\n").encode(encoding)
+
+
+class SyntheticProject(NamedTuple):
+    inputs: PipelineInputs
+    type_kwh: Dict[str, int]                 # 正解のタイプ別kWh
+    common: Tuple[float, float, float]       # 正解の (建物全体, 太陽光削減量, 実消費) [MWh]
+
+
+def make_project(
+    n_types: int,
+    n_units: int,
+    layout: str = "new",
+    private_pages: int = 3,
+    common_pages: int = 4,
+    mode: str = "full",
+) -> SyntheticProject:
+    """タイプ数・住戸数を指定して、正解値つきの物件一式を作る。値は毎回同じ。"""
+    types = type_names(n_types)
+    type_kwh = {t: 1800 + (i * 379) % 2600 for i, t in enumerate(types)}
+    building_total = round(n_units * 0.85 + 40.0, 2)
+    solar_reduction = round(n_units * 0.03 + 1.5, 2)
+    inputs = PipelineInputs(
+        project_name=f"ベンチマーク {n_types}タイプ・{n_units}戸",
+        csv_bytes=make_unit_csv(types, n_units),
+        private_pdfs=[PdfInput(f"{t}.pdf", make_private_pdf(t, kwh, private_pages)) for t, kwh in type_kwh.items()],
+        common_pdf=make_common_pdf(building_total, solar_reduction, layout, common_pages),
+        mode=mode,
+    )
+    return SyntheticProject(inputs, type_kwh, (building_total, solar_reduction, building_total + solar_reduction))
@@ -0,0 +1,221 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.corpus import COMMON_LAYOUTS, make_common_pdf, make_project
+from kwh_engine.extraction import (
+    EXTRACTION_MODES,
+    EXTRACTOR_VERSION,
+    extract_common_area_energy,
+    extract_kwh_from_pdf_bytes,
+)
+from kwh_engine.parallel import available_cpus, resolve_workers
+from kwh_engine.pipeline import run_pipeline
+from kwh_engine.reports import build_pdf_report, build_standard_excel
+from kwh_engine.unitlist import build_unit_list, read_unit_list_csv
+
+
+# 結果JSONの形式を変えたら上げる（比較時に形式の違う結果を取り違えないため）
+SCHEMA_VERSION = 1
+
+# 規模名 → (タイプ数, 住戸数)
+SIZES: Dict[str, tuple] = {
+    "S": (10, 100),
+    "M": (100, 2000),
+    "L": (1000, 20000),
+}
+
+
+# =========================================================
+# 計測
+# =========================================================
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """所要時間（秒）の一覧から、回数・最小・中央値・平均を返す。"""
+    return {
+        "runs": len(samples),
+        "min_sec": round(min(samples), 6),
+        "median_sec": round(statistics.median(samples), 6),
+        "mean_sec": round(statistics.fmean(samples), 6),
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """fn を repeat 回実行し、所要時間の最小・中央値・平均（秒）を返す。"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _check(label: str, actual, expected) -> None:
+    # 抽出結果が正解と違う計測は意味がないので、その場で止める
+    if actual != expected:
+        raise RuntimeError(f"{label}: 抽出結果が正解と一致しません（{actual!r} != {expected!r}）")
+
+
+def bench_size(n_types: int, n_units: int, repeat: int, private_pages: int, common_pages: int) -> Dict:
+    """1つの物件規模について、抽出・住戸リストの突き合わせ・レポート出力の時間を測る。"""
+    project = make_project(n_types, n_units, private_pages=private_pages, common_pages=common_pages)
+    inputs = project.inputs
+    pdfs = inputs.private_pdfs
+    expected_kwh = list(project.type_kwh.values())
+    building_total, solar_reduction, actual = project.common
+    results: Dict[str, Dict[str, float]] = {}
+
+    for mode in EXTRACTION_MODES:
+        values: List[list] = []
+        stats = measure(lambda: values.append([extract_kwh_from_pdf_bytes(p.data, mode) for p in pdfs]), repeat)
+        _check(f"extract_private.{mode}", values[-1], expected_kwh)
+        stats["per_pdf_sec"] = round(stats["median_sec"] / len(pdfs), 6)
+        results[f"extract_private.{mode}"] = stats
+
+    for layout in COMMON_LAYOUTS:
+        common_pdf = make_common_pdf(building_total, solar_reduction, layout, common_pages)
+        for mode in EXTRACTION_MODES:
+            values = []
+            results[f"extract_common.{layout}.{mode}"] = measure(
+                lambda: values.append(extract_common_area_energy(common_pdf, mode)), repeat
+            )
+            _check(f"extract_common.{layout}.{mode}", values[-1][:2], (building_total, solar_reduction))
+
+    results["csv_mapping"] = measure(
+        lambda: build_unit_list(read_unit_list_csv(inputs.csv_bytes), project.type_kwh), repeat
+    )
+    unit_list = build_unit_list(read_unit_list_csv(inputs.csv_bytes), project.type_kwh)
+    _check("csv_mapping", len(unit_list), n_units)
+
+    for streaming in (False, True):
+        results["excel.streaming" if streaming else "excel"] = measure(
+            lambda: build_standard_excel(unit_list, inputs.project_name, actual, streaming=streaming), repeat
+        )
+    for streaming in (False, True):
+        results["pdf_report.streaming" if streaming else "pdf_report"] = measure(
+            lambda: build_pdf_report(
+                unit_list, inputs.project_name, actual, building_total, solar_reduction, streaming=streaming
+            ),
+            repeat,
+        )
+
+    # 抽出から突き合わせまでの通し（既定の並列数・キャッシュなし）
+    inputs.mode = "anchor"
+    results["pipeline.anchor"] = measure(lambda: run_pipeline(inputs), repeat)
+
+    return {
+        "types": n_types,
+        "units": n_units,
+        "private_pdf_bytes": sum(len(p.data) for p in pdfs),
+        "benchmarks": results,
+    }
+
+
+def environment() -> Dict:
+    packages = {}
+    for name in ("pdfplumber", "pdfminer.six", "pandas", "openpyxl", "reportlab"):
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": available_cpus(),
+        "workers": resolve_workers(),
+        "extractor_version": EXTRACTOR_VERSION,
+        "packages": packages,
+    }
+
+
+def warm_up() -> None:
+    """フォント登録・モジュールの初回読み込みなどの一度きりの処理を、計測の前に済ませておく。"""
+    bench_size(1, 1, 1, private_pages=1, common_pages=4)
+
+
+def run_benchmarks(sizes: List[str], repeat: int = 3, private_pages: int = 3, common_pages: int = 4) -> Dict:
+    warm_up()
+    return {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "settings": {"repeat": repeat, "private_pages": private_pages, "common_pages": common_pages},
+        "sizes": {
+            size: bench_size(*SIZES[size], repeat, private_pages, common_pages) for size in sizes
+        },
+    }
+
+
+# =========================================================
+# 前回の結果との比較
+# =========================================================
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """両方にある計測の中央値を比べ、(規模, 計測名, 前回, 今回, 比率) の一覧を返す。"""
+    if baseline.get("schema") != current.get("schema"):
+        raise ValueError(f"結果JSONの形式が違います（{baseline.get('schema')} / {current.get('schema')}）")
+    rows = []
+    for size, entry in current["sizes"].items():
+        before = baseline["sizes"].get(size, {}).get("benchmarks", {})
+        for name, stats in entry["benchmarks"].items():
+            if name in before:
+                old, new = before[name]["median_sec"], stats["median_sec"]
+                rows.append({
+                    "size": size,
+                    "benchmark": name,
+                    "baseline_sec": old,
+                    "current_sec": new,
+                    "ratio": round(new / old, 3) if old > 0 else None,
+                })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="合成PDFで抽出・集計・レポート出力の時間を測り、JSONに書き出す",
+    )
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"測る規模（{', '.join(f'{k}={t}タイプ/{u}戸' for k, (t, u) in SIZES.items())}）")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数（既定: 3）")
+    parser.add_argument("--private-pages", type=int, default=3, help="専用部PDFのページ数（既定: 3）")
+    parser.add_argument("--common-pages", type=int, default=4, help="共用部PDFのページ数（既定: 4）")
+    parser.add_argument("-o", "--out", default="bench.json", help="結果JSONの出力先（既定: bench.json）")
+    parser.add_argument("--baseline", help="比較する前回の結果JSON")
+    parser.add_argument("--fail-above", type=float, default=None, help="中央値が前回のこの倍率を超えたら終了コード1（例: 1.2）")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip().upper() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"不明な規模: {', '.join(unknown)}")
+
+    result = run_benchmarks(sizes, args.repeat, args.private_pages, args.common_pages)
+    with open(args.out, "w", encoding="utf-8") as fp:
+        json.dump(result, fp, ensure_ascii=False, indent=2, sort_keys=True)
+        fp.write("\n")
+
+    for size, entry in result["sizes"].items():
+        print(f"[{size}] {entry['types']}タイプ / {entry['units']}戸")
+        for name, stats in sorted(entry["benchmarks"].items()):
+            print(f"  {name:<32} {stats['median_sec']:>10.4f} 秒")
+    print(f"結果: {args.out}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as fp:
+        rows = compare(json.load(fp), result)
+    slower = []
+    print(f"前回との比較（中央値）: {args.baseline}")
+    for row in rows:
+        ratio = row["ratio"]
+        print(f"  [{row['size']}] {row['benchmark']:<32} {row['baseline_sec']:>9.4f} → {row['current_sec']:>9.4f} 秒  ×{ratio}")
+        if args.fail_above is not None and ratio is not None and ratio > args.fail_above:
+            slower.append(row)
+    if slower:
+        print(f"❌ {len(slower)}件の計測が前回の{args.fail_above}倍を超えました", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,147 @@
+"""起動時間（モジュールの読み込み時間とアプリの初回表示時間）の計測。
+
+    python -m benchmarks.startup -o startup.json
+    python -m benchmarks.startup --repeat 10
+
+計測はそれぞれ新しいPythonプロセスで行う（読み込み済みのモジュールに影響されないため）。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+from benchmarks.run import environment, summarize
+from kwh_engine.warmup import WARM_UP_THREAD_NAME
+
+
+# 単体で読み込み時間を測るモジュール（アプリ・集計処理が使う重いもの）
+MODULES: List[str] = [
+    "streamlit",
+    "pandas",
+    "pdfplumber",
+    "openpyxl",
+    "reportlab.platypus",
+    "kwh_engine.extraction",
+    "kwh_engine.parallel",
+    "kwh_engine.pipeline",
+    "kwh_engine.reports",
+]
+
+# アプリの各画面を表示した時点で読み込み済みかを確かめるモジュール
+HEAVY_MODULES: List[str] = ["pandas", "numpy", "pdfplumber", "openpyxl", "reportlab"]
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# ログイン画面 → ログイン後の画面（アップロード画面と集計用ライブラリの読み込み）の順に表示する。
+# ログイン画面で始まる事前読み込み（kwh_engine.warmup）は、終わるまで待ってからログインする
+_APP_SCRIPT = """
+import json, sys, threading, time
+from streamlit.testing.v1 import AppTest
+
+heavy = {heavy!r}
+at = AppTest.from_file({app!r}, default_timeout=120)
+started = time.perf_counter()
+at.run()
+login = time.perf_counter() - started
+login_modules = [m for m in heavy if m in sys.modules]
+warm_up = None
+for thread in threading.enumerate():
+    if thread.name == {thread_name!r}:
+        thread.join()
+        warm_up = time.perf_counter() - started
+at.session_state["authenticated"] = True
+started = time.perf_counter()
+at.run()
+main = time.perf_counter() - started
+print(json.dumps({{
+    "login_sec": login,
+    "main_sec": main,
+    "login_modules": login_modules,
+    "warm_up_sec": warm_up,
+    "main_modules": [m for m in heavy if m in sys.modules],
+    "exceptions": [e.value for e in at.exception],
+}}))
+"""
+
+
+# =========================================================
+# 計測
+# =========================================================
+def _run_python(args: List[str]) -> subprocess.CompletedProcess:
+    root = os.path.dirname(APP_PATH)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=root, env=env, check=True)
+
+
+def import_seconds(module: str) -> float:
+    """新しいプロセスで module を読み込み、依存モジュールを含めた読み込み時間（秒）を返す。"""
+    proc = _run_python(["-X", "importtime", "-c", f"import {module}"])
+    # 各行は「import time: 自身[us] | 累計[us] | モジュール名」。入れ子はモジュール名の前の空白で表す
+    for line in reversed(proc.stderr.splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2][1:] == module:
+            return int(parts[1]) / 1e6
+    raise RuntimeError(f"{module} の読み込み時間を取得できません")
+
+
+def app_startup() -> Dict:
+    """新しいプロセスでアプリを表示し、ログイン画面・ログイン後の画面の表示時間と読み込み済みモジュールを返す。
+
+    warm_up_sec はログイン画面の表示開始から事前読み込みが終わるまでの時間（事前読み込みがなければ None）。
+    """
+    proc = _run_python(["-c", _APP_SCRIPT.format(heavy=HEAVY_MODULES, app=APP_PATH, thread_name=WARM_UP_THREAD_NAME)])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result["exceptions"]:
+        raise RuntimeError(f"アプリの表示中に例外が発生しました: {result['exceptions']}")
+    return result
+
+
+def run_startup(repeat: int = 5) -> Dict:
+    imports = {m: summarize([import_seconds(m) for _ in range(repeat)]) for m in MODULES}
+    runs = [app_startup() for _ in range(repeat)]
+    return {
+        "environment": environment(),
+        "settings": {"repeat": repeat},
+        "imports": imports,
+        "app": {
+            "login": summarize([r["login_sec"] for r in runs]),
+            "warm_up": summarize([r["warm_up_sec"] for r in runs]) if runs[-1]["warm_up_sec"] is not None else None,
+            "main": summarize([r["main_sec"] for r in runs]),
+            "login_modules": runs[-1]["login_modules"],
+            "main_modules": runs[-1]["main_modules"],
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.startup",
+        description="モジュールの読み込み時間とアプリの初回表示時間を測り、JSONに書き出す",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="各計測の繰り返し回数（既定: 5）")
+    parser.add_argument("-o", "--out", default="startup.json", help="結果JSONの出力先（既定: startup.json）")
+    args = parser.parse_args(argv)
+
+    result = run_startup(args.repeat)
+    with open(args.out, "w", encoding="utf-8") as fp:
+        json.dump(result, fp, ensure_ascii=False, indent=2, sort_keys=True)
+        fp.write("\n")
+
+    print("モジュールの読み込み時間（中央値）")
+    for module, stats in result["imports"].items():
+        print(f"  {module:<28} {stats['median_sec']:>8.3f} 秒")
+    app = result["app"]
+    print("アプリの表示時間（中央値）")
+    print(f"  {'ログイン画面':<24} {app['login']['median_sec']:>8.3f} 秒  読み込み済み: {', '.join(app['login_modules']) or 'なし'}")
+    if app["warm_up"] is not None:
+        print(f"  {'事前読み込みの完了':<21} {app['warm_up']['median_sec']:>8.3f} 秒  （ログイン画面の表示開始から）")
+    print(f"  {'ログイン後の画面':<22} {app['main']['median_sec']:>8.3f} 秒  読み込み済み: {', '.join(app['main_modules']) or 'なし'}")
+    print(f"結果: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
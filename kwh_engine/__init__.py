@@ -0,0 +1,111 @@
+"""消費電力量集計ツールのUI非依存コンポーネント。
+
+Streamlitに依存せず、スクリプトやワーカープロセスから直接使える。
+pdfplumber / pandas / reportlab などの重いライブラリは属性に初めて
+アクセスしたときに読み込むため、``import kwh_engine`` 自体は軽い。
+
+    from kwh_engine import PdfInput, PipelineInputs, run_pipeline, build_reports
+
+    result = run_pipeline(PipelineInputs(project_name, csv_bytes, [PdfInput(name, data), ...], common_bytes))
+    reports = build_reports(result)   # reports.excel / reports.pdf
+"""
+
+import importlib
+
+_EXPORTS = {
+    "DEFAULT_MEMORY_BUDGET_MB": "kwh_engine.budget",
+    "InputTooLarge": "kwh_engine.budget",
+    "check_memory_budget": "kwh_engine.budget",
+    "resolve_memory_budget": "kwh_engine.budget",
+    "ExtractionCache": "kwh_engine.cache",
+    "SOURCE_DISK": "kwh_engine.cache",
+    "SOURCE_EXTRACTED": "kwh_engine.cache",
+    "SOURCE_MEMORY": "kwh_engine.cache",
+    "SOURCE_STORE": "kwh_engine.cache",
+    "EXTRACTION_MODES": "kwh_engine.extraction",
+    "EXTRACTOR_VERSION": "kwh_engine.extraction",
+    "BufferReader": "kwh_engine.extraction",
+    "PdfBytes": "kwh_engine.extraction",
+    "SourceLocation": "kwh_engine.extraction",
+    "extract_common_area_energy": "kwh_engine.extraction",
+    "extract_common_area_located": "kwh_engine.extraction",
+    "extract_kwh_from_pdf_bytes": "kwh_engine.extraction",
+    "extract_kwh_located": "kwh_engine.extraction",
+    "extract_kwh_with_debug": "kwh_engine.extraction",
+    "extract_type_key_from_filename": "kwh_engine.extraction",
+    "extract_type_key_from_label": "kwh_engine.extraction",
+    "normalize_type_key": "kwh_engine.extraction",
+    "open_pdf": "kwh_engine.extraction",
+    "FORMAT_REGISTRY": "kwh_engine.formats",
+    "CommonPdfFormat": "kwh_engine.formats",
+    "detect_program_version": "kwh_engine.formats",
+    "resolve_format": "kwh_engine.formats",
+    "ExtractionCancelled": "kwh_engine.parallel",
+    "extract_kwh_many": "kwh_engine.parallel",
+    "resolve_workers": "kwh_engine.parallel",
+    "AggregationResult": "kwh_engine.pipeline",
+    "CommonAreaResult": "kwh_engine.pipeline",
+    "IncrementalUpdate": "kwh_engine.pipeline",
+    "PdfInput": "kwh_engine.pipeline",
+    "PipelineInputs": "kwh_engine.pipeline",
+    "Reports": "kwh_engine.pipeline",
+    "TypeChange": "kwh_engine.pipeline",
+    "build_reports": "kwh_engine.pipeline",
+    "content_digest": "kwh_engine.pipeline",
+    "diff_type_kwh": "kwh_engine.pipeline",
+    "excel_report_for": "kwh_engine.pipeline",
+    "input_fingerprint": "kwh_engine.pipeline",
+    "load_units": "kwh_engine.pipeline",
+    "pdf_report_for": "kwh_engine.pipeline",
+    "rebuild_result": "kwh_engine.pipeline",
+    "run_incremental": "kwh_engine.pipeline",
+    "run_pipeline": "kwh_engine.pipeline",
+    "Profiler": "kwh_engine.profiling",
+    "STAGE_LABELS": "kwh_engine.profiling",
+    "DetailRows": "kwh_engine.reports",
+    "PdfStyles": "kwh_engine.reports",
+    "build_pdf_report": "kwh_engine.reports",
+    "build_standard_excel": "kwh_engine.reports",
+    "build_standard_excel_streaming": "kwh_engine.reports",
+    "pdf_styles": "kwh_engine.reports",
+    "DEFAULT_MAX_ACTIVE_RUNS": "kwh_engine.scheduler",
+    "ExtractionScheduler": "kwh_engine.scheduler",
+    "SchedulerJob": "kwh_engine.scheduler",
+    "resolve_max_active_runs": "kwh_engine.scheduler",
+    "Snapshot": "kwh_engine.snapshot",
+    "load_snapshot": "kwh_engine.snapshot",
+    "save_snapshot": "kwh_engine.snapshot",
+    "ExtractionStore": "kwh_engine.store",
+    "Provenance": "kwh_engine.store",
+    "STORE_OFF": "kwh_engine.store",
+    "resolve_store_path": "kwh_engine.store",
+    "EnergyTotals": "kwh_engine.totals",
+    "compute_totals": "kwh_engine.totals",
+    "TypeKeyIndex": "kwh_engine.unitlist",
+    "UnitListColumnError": "kwh_engine.unitlist",
+    "assign_unit_kwh": "kwh_engine.unitlist",
+    "build_unit_list": "kwh_engine.unitlist",
+    "detect_unitlist_columns": "kwh_engine.unitlist",
+    "map_type_kwh": "kwh_engine.unitlist",
+    "prepare_unit_list": "kwh_engine.unitlist",
+    "read_unit_list_csv": "kwh_engine.unitlist",
+    "sniff_encoding": "kwh_engine.unitlist",
+    "type_keys": "kwh_engine.unitlist",
+    "BackgroundWarmUp": "kwh_engine.warmup",
+    "warm_up": "kwh_engine.warmup",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'kwh_engine' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,48 @@
+import os
+from typing import Iterable, Optional, Tuple
+
+
+# =========================================================
+# 1回の集計で読み込む入力サイズの上限（メモリ予算）
+# =========================================================
+DEFAULT_MEMORY_BUDGET_MB = 300
+
+_MB = 1024 * 1024
+
+
+class InputTooLarge(ValueError):
+    """入力ファイルの合計サイズが1回の集計のメモリ予算を超えた。"""
+
+
+def resolve_memory_budget(budget_mb: Optional[float] = None) -> Optional[int]:
+    """1回の集計で読み込む入力の上限[バイト]を決める。
+
+    未指定なら環境変数 KWH_MEMORY_BUDGET_MB → DEFAULT_MEMORY_BUDGET_MB の順。0 以下は上限なし（None）。
+    """
+    if budget_mb is None:
+        env = os.environ.get("KWH_MEMORY_BUDGET_MB", "").strip()
+        try:
+            budget_mb = float(env) if env else DEFAULT_MEMORY_BUDGET_MB
+        except ValueError:
+            budget_mb = DEFAULT_MEMORY_BUDGET_MB
+    return int(budget_mb * _MB) if budget_mb > 0 else None
+
+
+def format_mb(size: int) -> str:
+    return f"{size / _MB:,.1f} MB"
+
+
+def check_memory_budget(files: Iterable[Tuple[str, int]], budget: Optional[int]) -> int:
+    """(ファイル名, サイズ[バイト]) の合計が budget を超えたら InputTooLarge を送出し、合計を返す。
+
+    ファイルの中身を読む前（アップロード直後・ZIPの目次を見た時点）に呼べるよう、サイズだけで判定する。
+    """
+    files = list(files)
+    total = sum(size for _, size in files)
+    if budget is not None and total > budget:
+        largest = sorted(files, key=lambda f: f[1], reverse=True)[:3]
+        raise InputTooLarge(
+            f"入力ファイルの合計 {format_mb(total)} が1回の集計の上限 {format_mb(budget)} を超えています"
+            f"（大きいファイル: {'、'.join(f'{name} {format_mb(size)}' for name, size in largest)}）"
+        )
+    return total
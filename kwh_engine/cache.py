@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from kwh_engine.store import ExtractionStore, Provenance
+
+
+# 抽出結果の取得元（専用部PDFの抽出結果の「取得元」列に表示する）
+SOURCE_EXTRACTED = "PDFから抽出"
+SOURCE_MEMORY = "キャッシュ"
+SOURCE_STORE = "抽出ストア"
+SOURCE_DISK = "キャッシュファイル"       # disk_dir（KWH_CACHE_DIR）のJSONファイル。出どころは記録しない
+
+
+class CacheHit(NamedTuple):
+    value: Any
+    source: str                          # SOURCE_MEMORY / SOURCE_STORE / SOURCE_DISK
+    provenance: Optional[Provenance]
+
+
+# =========================================================
+# PDF抽出結果キャッシュ
+# =========================================================
+class ExtractionCache:
+    """PDFバイト列のSHA-256と抽出器バージョンをキーにした抽出結果キャッシュ。
+
+    メモリ上はLRUで保持し、件数・概算サイズのどちらかが上限を超えたら古い順に捨てる。
+    disk_dir を指定するとJSONファイルとしても書き出し（write-through）、
+    メモリから追い出された結果やプロセス再起動後もディスクから復元できる。
+    store（ExtractionStore）を指定すると、出どころと一緒にSQLiteへも書き出し、
+    同じストアを使う別のセッション・プロセスの抽出結果も使う（disk_dir より先に引く）。
+    値はJSONに変換できるもの（int / float / None / list / dict）に限る。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        max_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        store: Optional[ExtractionStore] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.store = store
+        self._entries: "OrderedDict[str, Tuple[Any, int, Optional[Provenance]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind: str, pdf_bytes: bytes, version: str) -> str:
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        return f"{kind}-{version}-{digest}"
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(ヒットしたか, 値) を返す。抽出結果が None の場合もヒットとして扱う。"""
+        hit = self.lookup(key)
+        return (True, hit.value) if hit is not None else (False, None)
+
+    def lookup(self, key: str) -> Optional[CacheHit]:
+        """メモリ → ストア → ディスクの順に探し、見つかれば値・取得元・出どころを返す。"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value, _, provenance = self._entries[key]
+                return CacheHit(value, SOURCE_MEMORY, provenance)
+
+        found, value, provenance = self._read_store(key)
+        if found:
+            with self._lock:
+                self.store_hits += 1
+                self._store(key, value, provenance)
+            return CacheHit(value, SOURCE_STORE, provenance)
+
+        found, value = self._read_disk(key)
+        with self._lock:
+            if found:
+                self.disk_hits += 1
+                self._store(key, value, None)
+                return CacheHit(value, SOURCE_DISK, None)
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any, provenance: Optional[Provenance] = None) -> None:
+        if provenance is not None and provenance.stored_at is None:
+            provenance = provenance._replace(stored_at=time.time())
+        with self._lock:
+            self._store(key, value, provenance)
+        self._write_store(key, value, provenance)
+        self._write_disk(key, value)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    # ---------------------------------------------------------
+    # 内部処理
+    # ---------------------------------------------------------
+    def _store(self, key: str, value: Any, provenance: Optional[Provenance]) -> None:
+        size = len(key) + len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size, provenance)
+        self._size += size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._size > self.max_bytes
+        ):
+            _, (_, old_size, _) = self._entries.popitem(last=False)
+            self._size -= old_size
+
+    def _read_store(self, key: str) -> Tuple[bool, Any, Optional[Provenance]]:
+        if self.store is None:
+            return False, None, None
+        try:
+            return self.store.get(key)
+        except (sqlite3.Error, ValueError):
+            return False, None, None
+
+    def _write_store(self, key: str, value: Any, provenance: Optional[Provenance]) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.put(key, value, provenance)
+        except sqlite3.Error:
+            # ストアに書けなくてもメモリキャッシュとしては動作させる
+            pass
+
+    def _disk_path(self, key: str) -> str:
+        digest = key.rsplit("-", 1)[-1]
+        return os.path.join(self.disk_dir, digest[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Tuple[bool, Any]:
+        if not self.disk_dir:
+            return False, None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as fp:
+                return True, json.load(fp)
+        except (OSError, ValueError):
+            return False, None
+
+    def _write_disk(self, key: str, value: Any) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as fp:
+                json.dump(value, fp, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            # ディスクに書けなくてもメモリキャッシュとしては動作させる
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def describe_hit(hit: CacheHit) -> str:
+    """デバッグ情報に添える、キャッシュ・ストアから取った抽出結果の説明。"""
+    where = {SOURCE_STORE: "抽出ストア", SOURCE_DISK: "キャッシュファイル"}.get(hit.source, "キャッシュ済み")
+    p = hit.provenance
+    if p is None:
+        return f"（{where}の抽出結果を使用）"
+    origin = ""
+    if p.stored_at is not None:
+        origin += time.strftime("%Y-%m-%d %H:%M", time.localtime(p.stored_at)) + "に"
+    if p.file_name:
+        origin += f"「{p.file_name}」の"
+    if p.page is not None:
+        origin += f"{p.page}ページ目"
+    if p.anchor:
+        origin += f"「{p.anchor}」"
+    return f"（{where}の抽出結果を使用: {origin}から抽出）"
+
+
+def record_lookup(run_stats: Optional[Dict[str, int]], hit: bool) -> None:
+    """実行単位のヒット/ミス件数を run_stats（{"hit": n, "miss": n}）に加算する。"""
+    if run_stats is not None:
+        k = "hit" if hit else "miss"
+        run_stats[k] = run_stats.get(k, 0) + 1
@@ -0,0 +1,311 @@
+"""複数物件の一括集計（バッチCLI）。
+
+    python -m kwh_engine 物件フォルダ/ 物件A.zip ... -o 出力先/
+
+入力はそれぞれ次のどちらか:
+  - 物件1件分のフォルダまたはZIP（住戸リストCSV・専用部PDF・共用部PDF）
+  - 物件フォルダ/ZIPをまとめた親フォルダ（直下の各フォルダ・ZIPを1物件として扱う）
+
+物件内のファイルは次の規則で振り分ける:
+  - *.csv                                        → 住戸リスト（1件）
+  - 「共用部」フォルダ内、またはファイル名に「共用部」/「common」を含むPDF → 共用部PDF（1件）
+  - それ以外のPDF                                → 専用部PDF（ファイル名がタイプ名）
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import unicodedata
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from kwh_engine.budget import check_memory_budget, resolve_memory_budget
+from kwh_engine.cache import ExtractionCache
+from kwh_engine.parallel import create_pool, resolve_workers
+from kwh_engine.pipeline import PdfInput, PipelineInputs, Reports, build_reports, run_pipeline
+from kwh_engine.profiling import Profiler
+from kwh_engine.store import ExtractionStore, resolve_store_path
+
+
+# =========================================================
+# 入力の探索
+# =========================================================
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    # Windowsの「送る→圧縮」で作ったZIPはファイル名がcp932のままなので読み替える
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("cp932")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _read_project_files(path: str, memory_budget: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """物件フォルダ/ZIP内のファイルを (相対パス, バイト列) で返す。
+
+    memory_budget を超える場合は、ファイルの中身を読む前に（サイズだけで）InputTooLarge を送出する。
+    """
+    files = []
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            members = [info for info in zf.infolist() if not info.is_dir()]
+            check_memory_budget([(_zip_member_name(info), info.file_size) for info in members], memory_budget)
+            for info in members:
+                files.append((_zip_member_name(info), zf.read(info)))
+    else:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)]
+        check_memory_budget([(os.path.relpath(full, path), os.path.getsize(full)) for full in paths], memory_budget)
+        for full in paths:
+            with open(full, "rb") as fp:
+                files.append((os.path.relpath(full, path), fp.read()))
+    return files
+
+
+def _is_project_dir(path: str) -> bool:
+    return any(name.lower().endswith(".csv") for name in os.listdir(path))
+
+
+def discover_projects(inputs: List[str]) -> List[str]:
+    """コマンドライン引数から物件（フォルダ/ZIP）のパス一覧を作る。"""
+    projects = []
+    for path in inputs:
+        if os.path.isdir(path) and not _is_project_dir(path):
+            for name in sorted(os.listdir(path)):
+                child = os.path.join(path, name)
+                if (os.path.isdir(child) and _is_project_dir(child)) or (
+                    os.path.isfile(child) and zipfile.is_zipfile(child)
+                ):
+                    projects.append(child)
+        else:
+            projects.append(path)
+    return projects
+
+
+def project_name_for(path: str) -> str:
+    """物件フォルダ/ZIPのパスから物件名（フォルダ名・ZIPの拡張子を除いたファイル名）を作る。"""
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def output_dir_names(projects: List[str]) -> List[str]:
+    """物件ごとのレポート出力フォルダ名。
+
+    別のフォルダにある同じ名前の物件や、同じ名前のフォルダとZIPが後の物件で上書きされないよう、
+    物件名が重なる2件目以降には「_2」「_3」…を付ける（大文字・小文字、全角・半角の違いも同じ名前とみなす）。
+    """
+    used = set()
+    names = []
+    for path in projects:
+        base = name = project_name_for(path)
+        n = 1
+        while unicodedata.normalize("NFKC", name).casefold() in used:
+            n += 1
+            name = f"{base}_{n}"
+        used.add(unicodedata.normalize("NFKC", name).casefold())
+        names.append(name)
+    return names
+
+
+def load_project(path: str, mode: str = "full", memory_budget: Optional[int] = None) -> PipelineInputs:
+    """物件フォルダ/ZIPを読み込み、パイプラインの入力にする。"""
+    project_name = project_name_for(path)
+    csv_files = []
+    private_pdfs = []
+    common_pdfs = []
+    for rel, data in _read_project_files(path, memory_budget):
+        rel_norm = unicodedata.normalize("NFKC", rel).replace("\\", "/")
+        name = rel_norm.split("/")[-1]
+        if name.startswith(".") or "__MACOSX" in rel_norm:
+            continue
+        if name.lower().endswith(".csv"):
+            csv_files.append(data)
+        elif name.lower().endswith(".pdf"):
+            parts = rel_norm.split("/")
+            if "共用部" in parts[:-1] or "共用部" in name or "common" in name.lower():
+                common_pdfs.append(data)
+            else:
+                private_pdfs.append(PdfInput(name, data))
+
+    if len(csv_files) != 1:
+        raise ValueError(f"住戸リストCSVが{len(csv_files)}件あります（1件にしてください）")
+    if not private_pdfs:
+        raise ValueError("専用部PDFがありません")
+    if len(common_pdfs) > 1:
+        raise ValueError(f"共用部PDFが{len(common_pdfs)}件あります（1件にしてください）")
+    return PipelineInputs(
+        project_name=project_name,
+        csv_bytes=csv_files[0],
+        private_pdfs=private_pdfs,
+        common_pdf=common_pdfs[0] if common_pdfs else None,
+        mode=mode,
+        memory_budget=memory_budget,
+    )
+
+
+# =========================================================
+# 一括実行
+# =========================================================
+def _summarize(result, reports_dir: str) -> Dict:
+    common = result.common
+    summary = {
+        "project": result.project_name,
+        "status": "ok",
+        "pdf_count": len(result.pdf_rows) + (1 if common else 0),
+        "types": {row["タイプ"]: row["kWh"] for row in result.pdf_rows},
+        "common_area": None,
+        "cache": result.cache_stats,
+        "reports_dir": reports_dir,
+    }
+    if common:
+        summary["common_area"] = {
+            "building_total_mwh": common.building_total,
+            "solar_reduction_mwh": common.solar_reduction,
+            "actual_consumption_mwh": common.actual_consumption,
+        }
+    if result.unit_list is None:
+        summary["status"] = "error"
+        summary["error"] = "CSVを読み込めませんでした"
+        return summary
+    totals = result.totals
+    summary["units"] = int(len(result.unit_list))
+    summary["total_private_kwh"] = totals.private_kwh
+    summary["missing_types"] = {str(k): int(v) for k, v in result.missing_types.items()}
+    summary["type_suggestions"] = result.type_suggestions
+    if totals.common_area_mwh:
+        summary["common_area_kwh"] = totals.common_kwh
+        summary["grand_total_kwh"] = totals.grand_total_kwh
+    return summary
+
+
+def _build_reports_profiled(result) -> Tuple[Reports, List[Dict]]:
+    # プール側で実行し、レポート作成中に増えた計測値だけを返す
+    known = len(result.profile.events)
+    reports = build_reports(result)
+    return reports, result.profile.events[known:]
+
+
+def run_project(
+    path: str,
+    out_dir: str,
+    mode: str,
+    cache: ExtractionCache,
+    executor,
+    memory_budget: Optional[int] = None,
+    output_name: Optional[str] = None,
+) -> Dict:
+    """物件1件を集計し、out_dir/output_name（未指定なら物件名）にレポートを書き出す。"""
+    started = time.perf_counter()
+    try:
+        inputs = load_project(path, mode, memory_budget)
+        result = run_pipeline(inputs, cache=cache, executor=executor, profiler=Profiler())
+        reports_dir = os.path.join(out_dir, output_name or inputs.project_name)
+        summary = _summarize(result, reports_dir)
+        if result.unit_list is not None:
+            reports, report_events = executor.submit(_build_reports_profiled, result).result()
+            result.profile.merge(report_events)
+            os.makedirs(reports_dir, exist_ok=True)
+            base = os.path.join(reports_dir, f"{inputs.project_name}_消費電力量集計")
+            with open(base + ".xlsx", "wb") as fp:
+                fp.write(reports.excel)
+            with open(base + ".pdf", "wb") as fp:
+                fp.write(reports.pdf)
+        summary["profile"] = result.profile.summary()
+    except Exception as e:
+        summary = {
+            "project": os.path.basename(os.path.normpath(path)),
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "pdf_count": 0,
+        }
+    summary["source"] = path
+    summary["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def run_batch(
+    inputs: List[str],
+    out_dir: str,
+    mode: str = "full",
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    store_path: Optional[str] = None,
+    memory_budget: Optional[int] = None,
+) -> Dict:
+    """全物件を共有プロセスプールで集計し、レポートと summary.json を出力する。
+
+    store_path を指定すると、抽出結果をそのSQLiteファイル（アプリと共有できる）にも保存・参照する。
+    memory_budget（バイト）を超える物件は、ファイルを読み込まずにエラーとして記録する。
+    """
+    projects = discover_projects(inputs)
+    # 物件名が重なる場合も、集計を始める前に物件ごとの出力フォルダを決めておく
+    output_names = output_dir_names(projects)
+    os.makedirs(out_dir, exist_ok=True)
+    cache = ExtractionCache(disk_dir=cache_dir, store=ExtractionStore(store_path) if store_path else None)
+    workers = resolve_workers(max_workers)
+
+    started = time.perf_counter()
+    with create_pool(workers) as pool:
+        # 物件ごとの待ち合わせ（CSV読み込み・結果の組み立て）中もプールが空かないよう、物件単位でも並行させる
+        with ThreadPoolExecutor(max_workers=max(1, min(len(projects), workers * 2))) as threads:
+            summaries = list(threads.map(
+                lambda p, name: run_project(p, out_dir, mode, cache, pool, memory_budget, name),
+                projects, output_names,
+            ))
+    elapsed = time.perf_counter() - started
+
+    pdf_count = sum(s["pdf_count"] for s in summaries)
+    batch = {
+        "projects": summaries,
+        "project_count": len(summaries),
+        "failed": sum(1 for s in summaries if s["status"] != "ok"),
+        "pdf_count": pdf_count,
+        "elapsed_sec": round(elapsed, 3),
+        "pdfs_per_sec": round(pdf_count / elapsed, 2) if elapsed > 0 else None,
+        "workers": workers,
+        "mode": mode,
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as fp:
+        json.dump(batch, fp, ensure_ascii=False, indent=2)
+    return batch
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m kwh_engine",
+        description="複数物件の消費電力量を一括集計し、Excel/PDFレポートと summary.json を出力する",
+    )
+    parser.add_argument("inputs", nargs="+", help="物件フォルダ/ZIP、または物件をまとめた親フォルダ")
+    parser.add_argument("-o", "--out", default="kwh_reports", help="出力先フォルダ（既定: kwh_reports）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="プロセス数（既定: KWH_MAX_WORKERS または CPU数）")
+    parser.add_argument("--mode", choices=["anchor", "full"], default="full", help="抽出方式（既定: full）")
+    parser.add_argument("--cache-dir", default=os.environ.get("KWH_CACHE_DIR") or None, help="抽出結果キャッシュの保存先")
+    parser.add_argument(
+        "--store", default=None, help="抽出ストア（SQLiteファイル）のパス（既定: KWH_STORE_PATH、off で使わない）"
+    )
+    parser.add_argument(
+        "--memory-budget-mb", type=float, default=None,
+        help="1物件で読み込む入力の上限[MB]（既定: KWH_MEMORY_BUDGET_MB または 300、0で上限なし）",
+    )
+    args = parser.parse_args(argv)
+
+    batch = run_batch(
+        args.inputs, args.out, args.mode, args.workers, args.cache_dir, resolve_store_path(args.store),
+        resolve_memory_budget(args.memory_budget_mb),
+    )
+    for s in batch["projects"]:
+        if s["status"] == "ok":
+            grand = s.get("grand_total_kwh", s.get("total_private_kwh"))
+            # 物件名が重なって「_2」などを付けた場合は、出力先のフォルダ名も表示する
+            renamed = os.path.basename(s["reports_dir"])
+            where = f", 出力先 {renamed}/" if renamed != s["project"] else ""
+            print(f"✓ {s['project']}: {grand:,} kWh（PDF {s['pdf_count']}件, {s['elapsed_sec']}秒{where}）")
+        else:
+            print(f"❌ {s['project']}: {s.get('error')}", file=sys.stderr)
+    print(
+        f"{batch['project_count']}物件 / PDF {batch['pdf_count']}件 / {batch['elapsed_sec']}秒"
+        f" / {batch['pdfs_per_sec']} PDF/秒（{batch['workers']}プロセス）"
+    )
+    print(f"サマリー: {os.path.join(args.out, 'summary.json')}")
+    return 1 if batch["failed"] else 0
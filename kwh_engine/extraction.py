@@ -0,0 +1,409 @@
+import io
+import re
+import unicodedata
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from kwh_engine.formats import detect_program_version, resolve_format
+
+
+# =========================================================
+# タイプキー抽出
+# =========================================================
+# NFKC では「-」にならないハイフン・ダッシュ類（「A‐1.pdf」と「A-1」を同じタイプにする）。
+# 長音「ー」はカタカナのタイプ名に使われるので含めない（近い候補の提示で拾う）。
+_DASH_TABLE = str.maketrans({c: "-" for c in "\u2010\u2011\u2012\u2013\u2014\u2015\u2212\ufe63"})
+
+
+def normalize_type_key(s: str) -> str:
+    """タイプ名の表記ゆれ（全角/半角・ハイフンの種類・前後の空白・「棟/」などの前置き）をそろえる。"""
+    s = unicodedata.normalize("NFKC", s).strip().translate(_DASH_TABLE)
+    if "/" in s:
+        s = s.split("/")[-1]
+    return s.strip()
+
+
+def extract_type_key_from_filename(name: str) -> str:
+    s = unicodedata.normalize("NFKC", name).strip()
+    if s.lower().endswith(".pdf"):
+        s = s[:-4]
+    return normalize_type_key(s)
+
+
+def extract_type_key_from_label(label: str) -> str:
+    return normalize_type_key(str(label))
+
+
+# =========================================================
+# アンカー語の位置検出（文字座標ベース）
+# =========================================================
+# 抽出方式:
+#   - "full":   ページ全体を extract_text する（既定）
+#   - "anchor": 文字座標からアンカー語を探し、その周辺領域だけをレイアウトして読む
+# anchor で見つからない場合は full にフォールバックする。
+# 時間の大半は pdfplumber がページの文字一覧（page.chars）を作る処理で、切り出しの前に済んでいるため、
+# anchor にしても速くはならない（python -m benchmarks で差は数%）。既定は full のままにする。
+EXTRACTION_MODES = ("anchor", "full")
+
+Bbox = Tuple[float, float, float, float]
+
+
+def find_anchor_bboxes(page, anchor: str) -> List[Bbox]:
+    """ページ内のアンカー語の出現位置 (x0, top, x1, bottom) を出現順に返す。
+
+    page.chars をコンテンツストリーム順に連結して検索するため、
+    extract_text のような行組み立て（レイアウト解析）は行わない。
+    """
+    chars = [c for c in page.chars if c.get("text", "").strip()]
+    owners = []
+    texts = []
+    for idx, c in enumerate(chars):
+        t = unicodedata.normalize("NFKC", c["text"])
+        texts.append(t)
+        owners.extend([idx] * len(t))
+    joined = "".join(texts)
+
+    bboxes = []
+    start = joined.find(anchor)
+    while start != -1:
+        hit = [chars[i] for i in sorted(set(owners[start:start + len(anchor)]))]
+        bboxes.append((
+            min(c["x0"] for c in hit),
+            min(c["top"] for c in hit),
+            max(c["x1"] for c in hit),
+            max(c["bottom"] for c in hit),
+        ))
+        start = joined.find(anchor, start + len(anchor))
+    return bboxes
+
+
+def _bottom_of_lines_below(page, bottom: float, n_lines: int, tolerance: float = 3) -> float:
+    # アンカー行より下にある文字の行位置（top）をまとめ、n行目の下端を返す
+    rows: List[Tuple[float, float]] = []
+    for c in sorted((c for c in page.chars if c["top"] > bottom), key=lambda c: c["top"]):
+        if rows and c["top"] - rows[-1][0] <= tolerance:
+            rows[-1] = (rows[-1][0], max(rows[-1][1], c["bottom"]))
+        else:
+            if len(rows) == n_lines:
+                break
+            rows.append((c["top"], c["bottom"]))
+    return rows[-1][1] if rows else bottom
+
+
+def _crop_text(page, bbox: Bbox) -> str:
+    x0, top, x1, bottom = bbox
+    region = page.crop((
+        max(0, x0), max(0, top), min(page.width, x1), min(page.height, bottom),
+    ))
+    try:
+        return region.extract_text() or ""
+    finally:
+        # 切り出した領域が持つ文字・レイアウトのキャッシュをすぐ解放する
+        region.close()
+
+
+def _format_bbox(bbox: Bbox) -> str:
+    return "({:.1f}, {:.1f})-({:.1f}, {:.1f})".format(*bbox)
+
+
+class SourceLocation(NamedTuple):
+    """抽出した値の出どころ。page は1始まり、anchor は値を探す起点にした行の文字列。"""
+    page: int
+    anchor: str
+
+
+# =========================================================
+# PDFの読み込み（アップロードされたバッファをコピーせずに読む）
+# =========================================================
+# PDFの中身。アップロードファイルの getbuffer() などの memoryview もそのまま渡せる
+PdfBytes = Union[bytes, bytearray, memoryview]
+
+
+class BufferReader(io.RawIOBase):
+    """bytes 以外のバッファ（memoryview など）を、コピーせずに seek できるファイルとして読む。
+
+    io.BytesIO は bytes 以外を渡すと全体をコピーするため、その代わりに使う。
+    """
+
+    def __init__(self, data: PdfBytes):
+        super().__init__()
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), self._view.nbytes - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._view.nbytes}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+@contextmanager
+def open_pdf(data: PdfBytes) -> Iterator:
+    """PDFのバイト列（bytes / memoryview）を pdfplumber で開く。全体のコピーは作らない。"""
+    # pdfplumber（pdfminer）はPDFを読むときに初めて読み込む（タイプ名の正規化だけなら不要）
+    import pdfplumber
+
+    # bytes を渡した io.BytesIO は書き込むまで同じメモリを共有する
+    stream = io.BytesIO(data) if isinstance(data, bytes) else BufferReader(data)
+    with stream, pdfplumber.open(stream) as pdf:
+        yield pdf
+
+
+# =========================================================
+# PDFから消費電力量[kWh]を抽出（専用部）
+# =========================================================
+# 抽出ロジックを変更したら更新する（キャッシュ済みの古い抽出結果を無効化するため）
+EXTRACTOR_VERSION = "2026.10-1"
+
+
+# 「1,800」のような3桁区切りは先頭が1〜2桁でも1つの数値として読む（区切りなしは3桁以上）
+_KWH_RE = re.compile(r"([0-9]{1,3}(?:,[0-9]{3})+|[0-9]{3,})")
+
+
+def _parse_private_kwh(raw: str) -> Tuple[Optional[int], Optional[str]]:
+    """(kWh, 値を探す起点にした「消費電力量 … kWh」の行) を返す。"""
+    raw = unicodedata.normalize("NFKC", raw).replace("ｋＷｈ", "kWh")
+    lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
+
+    for i, ln in enumerate(lines):
+        if "消費電力量" in ln and "kWh" in ln:
+            for j in range(1, 4):
+                if i + j < len(lines):
+                    m = _KWH_RE.search(lines[i + j])
+                    if m:
+                        return int(m.group(1).replace(",", "")), ln
+            m = _KWH_RE.search(ln)
+            if m:
+                return int(m.group(1).replace(",", "")), ln
+    return None, None
+
+
+def extract_kwh_located(pdf_bytes: PdfBytes, mode: str = "full") -> Tuple[Optional[int], list, Optional[SourceLocation]]:
+    """extract_kwh_with_debug と同じ抽出を行い、(値, デバッグ情報, 値の出どころ) を返す。"""
+    debug_info = []
+    try:
+        with open_pdf(pdf_bytes) as pdf:
+            page_no = len(pdf.pages)
+            page = pdf.pages[-1]
+            if mode == "anchor":
+                # 「消費電力量」行と、その下3行（値の候補）だけを切り出して読む
+                for bbox in find_anchor_bboxes(page, "消費電力量"):
+                    region = (0, bbox[1] - 1, page.width, _bottom_of_lines_below(page, bbox[3], 3) + 1)
+                    kwh, anchor = _parse_private_kwh(_crop_text(page, region))
+                    if kwh is not None:
+                        debug_info.append(
+                            f"✓ アンカー「消費電力量」{_format_bbox(bbox)} "
+                            f"切り出し範囲 {_format_bbox(region)}: {kwh} kWh"
+                        )
+                        return kwh, debug_info, SourceLocation(page_no, anchor)
+                debug_info.append("アンカー周辺で値が見つからないためページ全体を読み込み")
+            raw = page.extract_text() or ""
+    except Exception as e:
+        debug_info.append(f"❌ PDF読み込みエラー: {str(e)}")
+        return None, debug_info, None
+
+    kwh, anchor = _parse_private_kwh(raw)
+    if kwh is None:
+        debug_info.append("❌ 消費電力量が見つかりません")
+        return None, debug_info, None
+    debug_info.append(f"✓ ページ全体から抽出: {kwh} kWh")
+    return kwh, debug_info, SourceLocation(page_no, anchor)
+
+
+def extract_kwh_with_debug(pdf_bytes: PdfBytes, mode: str = "full") -> Tuple[Optional[int], list]:
+    """専用部PDFの最終ページから消費電力量[kWh]を抽出し、(値, デバッグ情報) を返す。"""
+    return extract_kwh_located(pdf_bytes, mode)[:2]
+
+
+def extract_kwh_from_pdf_bytes(pdf_bytes: PdfBytes, mode: str = "full") -> Optional[int]:
+    return extract_kwh_with_debug(pdf_bytes, mode)[0]
+
+
+# =========================================================
+# 共用部PDFから消費電力量を抽出（3〜4ページ目）
+# =========================================================
+def extract_common_area_energy(
+    pdf_bytes: PdfBytes, mode: str = "full"
+) -> Tuple[Optional[float], Optional[float], Optional[float], list]:
+    """共用部PDFから「建物全体」「太陽光削減量」「実消費電力」(MWh) を抽出。
+
+    対応フォーマット:
+      - 新 (Ver.3.10 2026.04 以降): 4ページ目に「二次エネルギー消費量計算結果」。
+        太陽光発電は正の値（例: 5.33）で表示される。
+      - 旧: 3ページ目に「二次エネルギー消費量計算結果」。
+        太陽光発電はマイナス符号付き（例: -5.78）で表示される。
+
+    文書メタデータの計算プログラムのバージョンから formats.FORMAT_REGISTRY の
+    フォーマットを判定できれば、該当ページだけを読む。判定できない場合は4→3ページ目の順に探す。
+    mode="anchor" では見出しの位置を文字座標で探し、見出しから下の領域だけを読む。
+
+    solar_reduction は内部的に常に正の「削減量」として保持し、
+    actual_consumption = building_total + solar_reduction を返す。
+    """
+    return extract_common_area_located(pdf_bytes, mode)[:4]
+
+
+def _read_common_page(page, idx: int, mode: str, debug_info: list) -> Optional[str]:
+    # mode="anchor" では見出しより下だけを読む（見出しがなければ None）
+    if mode != "anchor":
+        return page.extract_text() or ""
+    bboxes = find_anchor_bboxes(page, "二次エネルギー消費量計算結果")
+    if not bboxes:
+        return None
+    bbox = bboxes[0]
+    txt = _crop_text(page, (0, bbox[1] - 1, page.width, page.height))
+    debug_info.append(
+        f"アンカー「二次エネルギー消費量計算結果」{_format_bbox(bbox)}"
+        f"（{idx + 1}ページ目、見出しより下のみ読み込み）"
+    )
+    return txt
+
+
+def extract_common_area_located(
+    pdf_bytes: PdfBytes, mode: str = "full"
+) -> Tuple[Optional[float], Optional[float], Optional[float], list, Optional[SourceLocation]]:
+    """extract_common_area_energy の戻り値に、値の出どころ（見出しのあるページと行）を加えて返す。"""
+    debug_info = []
+
+    raw = None
+    page_used = None
+    fmt = None
+    try:
+        with open_pdf(pdf_bytes) as pdf:
+            debug_info.append(f"PDFページ数: {len(pdf.pages)}ページ")
+            version, version_source = detect_program_version(pdf)
+            fmt = resolve_format(version)
+            if fmt is not None:
+                # 判定したページを最初に読み、見つからなければ残りのページも確認する
+                page_order = (fmt.page_index,) + tuple(i for i in (3, 2) if i != fmt.page_index)
+                debug_info.append(
+                    f"✓ 計算プログラム: {version}（{version_source}）→ {fmt.name}、{fmt.page_index + 1}ページ目を読み込み"
+                )
+            else:
+                # 4ページ目→3ページ目の順に「二次エネルギー消費量計算結果」を探す（新旧両対応）
+                page_order = (3, 2)
+                debug_info.append("文書メタデータで計算プログラムのバージョンを判定できないため4→3ページ目の順に探索")
+            for idx in page_order:
+                if idx < len(pdf.pages):
+                    page = pdf.pages[idx]
+                    try:
+                        txt = _read_common_page(page, idx, mode, debug_info)
+                    finally:
+                        # ページの文字・レイアウトのキャッシュはファイルを閉じるまで残るので、読み終えたら解放する
+                        page.close()
+                    if txt is None:
+                        continue
+                    txt_norm = unicodedata.normalize("NFKC", txt)
+                    if (
+                        "二次エネルギー消費量計算結果" in txt_norm
+                        and "建物全体" in txt_norm
+                    ):
+                        raw = txt_norm
+                        page_used = idx + 1
+                        debug_info.append(
+                            f"✓ {page_used}ページ目から「二次エネルギー消費量計算結果」を検出: {len(raw)}文字"
+                        )
+                        break
+            if raw is None and mode == "anchor":
+                debug_info.append("アンカーが見つからないためページ全体で再検索")
+                return _with_prefix(debug_info, extract_common_area_located(pdf_bytes, mode="full"))
+            if raw is None:
+                debug_info.append(
+                    "❌ 「二次エネルギー消費量計算結果」が3〜4ページ目に見つかりません"
+                )
+                return None, None, None, debug_info, None
+    except Exception as e:
+        debug_info.append(f"❌ PDF読み込みエラー: {str(e)}")
+        return None, None, None, debug_info, None
+
+    lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
+    debug_info.append(f"抽出行数: {len(lines)}行")
+
+    section_start_idx = None
+    for i, ln in enumerate(lines):
+        if "二次エネルギー消費量計算結果" in ln:
+            section_start_idx = i
+            debug_info.append(f"✓ セクション発見(行{i}): {ln[:50]}")
+            break
+
+    if section_start_idx is None:
+        debug_info.append("❌ 二次エネルギー消費量計算結果セクションが見つかりません")
+        return None, None, None, debug_info, None
+    location = SourceLocation(page_used, lines[section_start_idx])
+
+    building_total = None
+    solar_reduction = None
+    building_idx = None
+
+    for i in range(section_start_idx, min(section_start_idx + 30, len(lines))):
+        ln = lines[i]
+        # 「建物全体（延床面積あたり）」は除外
+        if "建物全体" in ln and "延床" not in ln and building_total is None:
+            building_idx = i
+            for offset in range(0, 5):
+                if i + offset < len(lines):
+                    search_line = lines[i + offset]
+                    match = re.search(r"(\d+\.\d+)", search_line)
+                    if match:
+                        building_total = float(match.group(1))
+                        debug_info.append(f"✓ 建物全体の値: {building_total} MWh")
+                        break
+            if building_total is not None:
+                break
+
+    if building_idx is not None:
+        for i in range(max(section_start_idx, building_idx - 20), building_idx):
+            ln = lines[i]
+            if "太陽光" in ln or "PV" in ln:
+                # マイナス符号あり/なし両対応。値は常に正の「削減量」として保持する
+                for offset in range(0, 4):
+                    if i + offset < len(lines):
+                        search_line = lines[i + offset]
+                        match = re.search(r"(-?\d+\.\d+)", search_line)
+                        if match:
+                            solar_signed = float(match.group(1))
+                            solar_reduction = abs(solar_signed)
+                            debug_info.append(
+                                f"✓ 太陽光削減量: {solar_reduction} MWh（符号は除去して正値で保持）"
+                            )
+                            if fmt is not None and solar_signed != 0 and (solar_signed > 0) != (fmt.solar_sign > 0):
+                                debug_info.append(
+                                    f"⚠️ 太陽光の符号が{fmt.name}の表示規則と異なります（{solar_signed}）"
+                                )
+                            break
+                if solar_reduction is not None:
+                    break
+
+    if building_total is not None and solar_reduction is not None:
+        # 建物全体は太陽光削減後の値。実消費 = 建物全体 + 太陽光削減量
+        actual_consumption = building_total + solar_reduction
+        debug_info.append(
+            f"✓ 計算完了: {building_total} + {solar_reduction} = {actual_consumption} MWh"
+        )
+        return building_total, solar_reduction, actual_consumption, debug_info, location
+
+    return building_total, solar_reduction, None, debug_info, location
+
+
+def _with_prefix(prefix: list, result: tuple) -> tuple:
+    building_total, solar_reduction, actual_consumption, debug_info, location = result
+    return building_total, solar_reduction, actual_consumption, prefix + debug_info, location
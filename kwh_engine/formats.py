@@ -0,0 +1,69 @@
+import re
+import unicodedata
+from typing import List, NamedTuple, Optional, Tuple
+
+
+# =========================================================
+# 共用部PDFの計算プログラムバージョン判定
+# =========================================================
+class CommonPdfFormat(NamedTuple):
+    """計算プログラムのバージョンごとの共用部PDFレイアウト。"""
+    name: str
+    page_index: int   # 「二次エネルギー消費量計算結果」があるページ（0始まり）
+    solar_sign: int   # 太陽光発電の表示符号（+1: 正値で表示 / -1: マイナス符号付き）
+
+
+# (最小バージョン, フォーマット) を新しい順に並べたレジストリ。
+# 新しい計算プログラムに対応するときはここに1行追加する。
+FORMAT_REGISTRY: List[Tuple[Tuple[int, int], CommonPdfFormat]] = [
+    ((3, 10), CommonPdfFormat("新形式 (Ver.3.10 2026.04 以降)", 3, +1)),
+    ((0, 0), CommonPdfFormat("旧形式", 2, -1)),
+]
+
+# バージョンを探す文書メタデータ。Creator / Producer はPDFを書き出したソフトの名前
+# （例: 「Acrobat Distiller Ver.11.0」）なので、計算プログラムのバージョンと取り違えないよう見ない
+_METADATA_FIELDS = ("Title", "Subject", "Keywords")
+
+_VERSION_RE = re.compile(r"Ver\.?\s*(\d+)\.(\d+)(?:\.\d+)*(?:\s*\(?(\d{4})\.(\d{1,2})\)?)?", re.IGNORECASE)
+
+
+def parse_program_version(text: str) -> Optional[str]:
+    """テキストから「Ver.3.10 2026.04」形式のバージョン表記を取り出す。"""
+    m = _VERSION_RE.search(unicodedata.normalize("NFKC", text or ""))
+    if not m:
+        return None
+    version = f"Ver.{m.group(1)}.{m.group(2)}"
+    if m.group(3):
+        version += f" {m.group(3)}.{int(m.group(4)):02d}"
+    return version
+
+
+def detect_program_version(pdf) -> Tuple[Optional[str], str]:
+    """(バージョン, 取得元) を返す。文書メタデータ（Title / Subject / Keywords）だけを見る。
+
+    ページの文字を読むにはそのページの内容ストリームをすべて解析する必要があり、
+    1ページ目を読むと新形式では解析するページが倍になるので、メタデータにない場合は
+    判定せずに呼び出し側のページ探索（4→3ページ目）に任せる。
+    """
+    for field in _METADATA_FIELDS:
+        value = (pdf.metadata or {}).get(field)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", errors="ignore")
+        version = parse_program_version(str(value)) if value else None
+        if version:
+            return version, f"メタデータ({field})"
+    return None, "不明"
+
+
+def resolve_format(version: Optional[str]) -> Optional[CommonPdfFormat]:
+    """バージョン表記からレジストリのフォーマットを引く。判定できなければ None。"""
+    if not version:
+        return None
+    m = re.match(r"Ver\.(\d+)\.(\d+)", version)
+    if not m:
+        return None
+    key = (int(m.group(1)), int(m.group(2)))
+    for min_version, fmt in FORMAT_REGISTRY:
+        if key >= min_version:
+            return fmt
+    return None
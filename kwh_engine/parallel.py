@@ -0,0 +1,156 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from functools import partial
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Sequence
+
+from kwh_engine.cache import SOURCE_EXTRACTED, ExtractionCache, describe_hit, record_lookup
+from kwh_engine.extraction import EXTRACTOR_VERSION, PdfBytes, extract_kwh_located
+from kwh_engine.profiling import Profiler, measure_call
+from kwh_engine.store import Provenance
+
+
+# 1件抽出するごとに (入力の位置, kWh, デバッグ情報, 取得元) で呼ばれるコールバック
+ResultCallback = Callable[[int, Optional[int], list, str], None]
+
+
+class ExtractionCancelled(RuntimeError):
+    """cancel イベントがセットされ、抽出を途中で打ち切った。"""
+
+
+# =========================================================
+# 専用部PDFの並列抽出（プロセスプール）
+# =========================================================
+def available_cpus() -> int:
+    # コンテナのCPU制限（affinity）を優先し、取れない環境では cpu_count を使う
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_workers(max_workers: Optional[int] = None) -> int:
+    """並列数を決める。未指定なら環境変数 KWH_MAX_WORKERS → 利用可能CPU数の順。"""
+    if max_workers is None:
+        env = os.environ.get("KWH_MAX_WORKERS", "").strip()
+        max_workers = int(env) if env.isdigit() else available_cpus()
+    return max(1, min(max_workers, available_cpus()))
+
+
+def create_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """複数回の抽出で使い回すプロセスプールを作る（バッチ処理用）。"""
+    # Streamlitのスクリプトスレッドからforkしないよう spawn で起動する
+    return ProcessPoolExecutor(max_workers=resolve_workers(max_workers), mp_context=get_context("spawn"))
+
+
+class _PoolPayload:
+    """プロセスプールへ送るPDF。pickle されるとき（ワーカーへ送る直前）だけ bytes にする。"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: PdfBytes):
+        self.data = data
+
+    def __reduce__(self):
+        return bytes, (bytes(self.data),)
+
+
+def pool_payload(data: PdfBytes):
+    """executor.submit に渡すPDF。memoryview は pickle できないが、投入時に全件を bytes にすると
+    待ち行列のPDFすべての複製を抱えるので、送る直前まで元のバッファのまま持つ。"""
+    return data if isinstance(data, bytes) else _PoolPayload(data)
+
+
+def _check_cancel(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise ExtractionCancelled("抽出を中止しました")
+
+
+def extract_kwh_many(
+    pdf_bytes_list: Sequence[PdfBytes],
+    max_workers: Optional[int] = None,
+    cache: Optional[ExtractionCache] = None,
+    run_stats: Optional[Dict[str, int]] = None,
+    mode: str = "full",
+    debug_out: Optional[List[list]] = None,
+    executor: Optional[Executor] = None,
+    on_result: Optional[ResultCallback] = None,
+    cancel: Optional[threading.Event] = None,
+    profiler: Optional[Profiler] = None,
+    labels: Optional[Sequence[str]] = None,
+) -> List[Optional[int]]:
+    """複数の専用部PDFから消費電力量[kWh]を抽出し、入力と同じ順序で返す。
+
+    キャッシュにある結果は親プロセスで返し、未抽出のPDFだけをプロセスプールへ回す。
+    並列数が1（1コア環境など）または未抽出が1件以下なら直列で処理する。
+    debug_out を渡すと、各PDFのデバッグ情報（アンカー座標など）を同じ順序で追加する。
+    executor を渡すと、プールを新しく作らずにそのプールへ投入する（max_workers は無視）。
+    on_result は1件終わるたびに（終わった順で）呼ばれる。cancel がセットされるか
+    on_result が例外を投げると、まだ始まっていない抽出を取り消して例外を送出する。
+    profiler を渡すと、抽出したPDFごとの計測値をワーカー側で測って記録する。
+    labels は各PDFの表示名で、計測値とキャッシュに保存する出どころ（Provenance）に使う。
+    """
+    results: List[Optional[int]] = [None] * len(pdf_bytes_list)
+    debugs: List[list] = [[] for _ in pdf_bytes_list]
+    version = f"{EXTRACTOR_VERSION}-{mode}"
+    keys = [ExtractionCache.make_key("private", b, version) for b in pdf_bytes_list]
+
+    def finish(i: int, value: Optional[int], debug_info: list, source: str) -> None:
+        results[i], debugs[i] = value, debug_info
+        if on_result is not None:
+            on_result(i, value, debug_info, source)
+
+    pending = []
+    for i, key in enumerate(keys):
+        hit = cache.lookup(key) if cache is not None else None
+        if hit is not None:
+            value, debug_info = hit.value
+            finish(i, value, debug_info + [describe_hit(hit)], hit.source)
+        record_lookup(run_stats, hit is not None)
+        if hit is None:
+            pending.append(i)
+
+    def store(i: int, extracted) -> None:
+        label = labels[i] if labels is not None else None
+        if profiler is not None:
+            extracted, measurement = extracted
+            profiler.record("extract_private", measurement, label or f"#{i + 1}")
+        value, debug_info, location = extracted
+        if cache is not None:
+            provenance = Provenance(label, *(location or (None, None)))
+            cache.put(keys[i], [value, debug_info], provenance)
+        finish(i, value, debug_info, SOURCE_EXTRACTED)
+
+    if profiler is not None:
+        worker = partial(measure_call, extract_kwh_located, mode=mode, trace_memory=profiler.trace_memory)
+    else:
+        worker = partial(extract_kwh_located, mode=mode)
+    workers = min(resolve_workers(max_workers), len(pending))
+    if executor is None and workers <= 1:
+        for i in pending:
+            _check_cancel(cancel)
+            store(i, worker(pdf_bytes_list[i]))
+    elif pending:
+        # 終わった順に結果を受け取れるよう1件ずつ投入する
+        pool = executor if executor is not None else create_pool(workers)
+        futures = {pool.submit(worker, pool_payload(pdf_bytes_list[i])): i for i in pending}
+        not_done = set(futures)
+        completed = False
+        try:
+            while not_done:
+                done, not_done = wait(not_done, timeout=0.5, return_when=FIRST_COMPLETED)
+                _check_cancel(cancel)
+                for future in done:
+                    store(futures[future], future.result())
+            completed = True
+        finally:
+            for future in not_done:
+                future.cancel()
+            if pool is not executor:
+                # 中断時は実行中のPDFの完了を待たずに戻る
+                pool.shutdown(wait=completed, cancel_futures=True)
+
+    if debug_out is not None:
+        debug_out.extend(debugs)
+    return results
@@ -0,0 +1,653 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from kwh_engine.budget import check_memory_budget
+from kwh_engine.cache import ExtractionCache, describe_hit, record_lookup
+from kwh_engine.extraction import (
+    EXTRACTOR_VERSION,
+    PdfBytes,
+    extract_common_area_located,
+    extract_type_key_from_filename,
+)
+from kwh_engine.parallel import ExtractionCancelled, extract_kwh_many, pool_payload
+from kwh_engine.profiling import Profiler, keep_tracing, measure_call
+from kwh_engine.store import Provenance
+from kwh_engine.totals import EnergyTotals, compute_totals
+from kwh_engine.unitlist import TypeKeyIndex, assign_unit_kwh, map_type_kwh, prepare_unit_list, read_unit_list_csv
+
+
+# =========================================================
+# 入出力の型
+# =========================================================
+class PdfInput(NamedTuple):
+    name: str
+    data: PdfBytes   # アップロードファイルの getbuffer() などの memoryview でもよい（コピーせずに読む）
+
+
+@dataclass
+class PipelineInputs:
+    """集計1回分の入力。CSV・PDFはアップロード元に依存しないバイト列で渡す。
+
+    memory_budget（バイト）を指定すると、入力の合計サイズがそれを超える場合は抽出を始める前に
+    budget.InputTooLarge を送出する。
+    """
+    project_name: str
+    csv_bytes: bytes
+    private_pdfs: List[PdfInput]
+    common_pdf: Optional[PdfBytes] = None
+    mode: str = "full"
+    max_workers: Optional[int] = None
+    memory_budget: Optional[int] = None
+
+    def files(self) -> List[Tuple[str, int]]:
+        """入力ファイルの (名前, サイズ[バイト])。"""
+        files = [("住戸リストCSV", len(self.csv_bytes))]
+        files += [(p.name, memoryview(p.data).nbytes) for p in self.private_pdfs]
+        if self.common_pdf is not None:
+            files.append(("共用部PDF", memoryview(self.common_pdf).nbytes))
+        return files
+
+
+@dataclass
+class CommonAreaResult:
+    building_total: Optional[float]
+    solar_reduction: Optional[float]
+    actual_consumption: Optional[float]
+    debug_info: list = field(default_factory=list)
+
+
+@dataclass
+class AggregationResult:
+    project_name: str
+    pdf_rows: List[dict]                   # 専用部PDFごとの {"PDF名", "タイプ", "kWh", "取得元"}
+    type_kwh: Dict[str, Optional[int]]
+    private_debug: List[list]              # pdf_rows と同じ順序のデバッグ情報
+    common: Optional[CommonAreaResult]     # 共用部PDFなしの場合は None
+    unit_list: Optional[pd.DataFrame]      # CSVを読み込めなかった場合は None
+    cache_stats: Dict[str, int] = field(default_factory=dict)
+    # 差分再集計（run_incremental）で前回の入力と突き合わせるための情報
+    mode: str = "full"
+    pdf_digests: List[str] = field(default_factory=list)   # pdf_rows と同じ順序
+    csv_digest: Optional[str] = None
+    common_digest: Optional[str] = None
+    # 処理段階ごとの計測結果（レポート作成の計測もここへ追記する）
+    profile: Optional[Profiler] = field(default=None, repr=False, compare=False)
+    # レポートは必要になったときに作り、同じ集計結果では使い回す（excel_report_for / pdf_report_for）
+    _reports: Dict[tuple, bytes] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _reports_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+    _totals: Optional[EnergyTotals] = field(default=None, init=False, repr=False, compare=False)
+
+    def __getstate__(self):
+        # プロセスプールへ渡せるよう、ロックは pickle しない
+        state = self.__dict__.copy()
+        state.pop("_reports_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reports_lock = threading.Lock()
+
+    @property
+    def common_area_mwh(self) -> Optional[float]:
+        return self.common.actual_consumption if self.common else None
+
+    @property
+    def totals(self) -> EnergyTotals:
+        """画面・Excel・PDFで共通に使う集計値。初回だけ計算する（住戸リストがある場合のみ）。"""
+        if self._totals is None:
+            common = self.common
+            has_breakdown = common is not None and common.actual_consumption is not None
+            self._totals = compute_totals(
+                self.unit_list,
+                self.common_area_mwh,
+                common.building_total if has_breakdown else None,
+                common.solar_reduction if has_breakdown else None,
+            )
+        return self._totals
+
+    @property
+    def total_private_kwh(self) -> int:
+        return self.totals.private_kwh
+
+    @property
+    def missing_types(self) -> pd.Series:
+        missing = self.unit_list[self.unit_list["消費電力量[kWh]"].isna()]
+        # カテゴリ型のままだと件数0のタイプも並ぶので、文字列にして数える
+        return missing["タイプ"].astype(str).value_counts()
+
+    @property
+    def type_suggestions(self) -> Dict[str, List[str]]:
+        """住戸リストにあって専用部PDFにないタイプ → 名前の近いPDF側のタイプ（近い順）。"""
+        if self.unit_list is None:
+            return {}
+        return TypeKeyIndex(self.type_kwh).suggestions(self.unit_list["タイプ"])
+
+
+# 専用部PDFが1件終わるたびに (入力の位置, {"PDF名", "タイプ", "kWh", "取得元"}) で呼ばれるコールバック
+RowCallback = Callable[[int, dict], None]
+
+
+class Reports(NamedTuple):
+    excel: bytes
+    pdf: bytes
+
+
+class TypeChange(NamedTuple):
+    """前回の集計から変わったタイプ。before / after が None のときはkWh未取得（またはPDFなし）。"""
+    type_key: str
+    before: Optional[int]
+    after: Optional[int]
+    units: int   # 住戸リストでそのタイプに該当する住戸数
+
+    @property
+    def delta(self) -> Optional[int]:
+        if self.before is None or self.after is None:
+            return None
+        return self.after - self.before
+
+
+# 差分再集計で前回の抽出結果をそのまま使った行の「取得元」
+SOURCE_PREVIOUS = "前回の集計"
+
+
+@dataclass
+class IncrementalUpdate:
+    result: AggregationResult
+    extracted_pdfs: List[str]     # 追加・差し替えで再抽出したPDF名
+    removed_pdfs: List[str]       # 前回にあって今回なくなったPDF名
+    reused_pdfs: int              # 前回の抽出結果をそのまま使ったPDF数
+    type_changes: List[TypeChange]
+
+
+# =========================================================
+# 入力の識別
+# =========================================================
+def content_digest(data: PdfBytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def input_fingerprint(
+    project_name: str,
+    csv_digest: str,
+    pdf_digests: List[Tuple[str, str]],
+    common_digest: Optional[str],
+    mode: str = "full",
+) -> str:
+    """集計結果を左右する入力（物件名・CSV・PDFのファイル名と内容・抽出方式）の指紋。"""
+    payload = json.dumps(
+        [project_name, csv_digest, pdf_digests, common_digest, mode, EXTRACTOR_VERSION],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# =========================================================
+# 抽出・集計
+# =========================================================
+def _stage(profiler: Optional[Profiler], stage: str, **kwargs):
+    return profiler.stage(stage, **kwargs) if profiler is not None else nullcontext()
+
+
+def _run_stage(profiler: Optional[Profiler]):
+    # 集計全体。メモリ計測時は、並行する段階の計測が途切れないよう tracemalloc を通して有効にしておく
+    return keep_tracing(profiler is not None and profiler.trace_memory)
+
+
+def load_units(csv_bytes: bytes, profiler: Optional[Profiler] = None) -> Optional[pd.DataFrame]:
+    """住戸リストCSVを読み込み、列を検出して集計用の3列（行番号/住戸の番号/タイプ）にする。読めなければ None。
+
+    タイプ別kWhを使わないので、PDFの抽出と並行して進められる。列が見つからなければ UnitListColumnError。
+    """
+    with _stage(profiler, "csv_load"):
+        units = read_unit_list_csv(csv_bytes)
+        return prepare_unit_list(units) if units is not None else None
+
+
+def _assign_kwh(
+    units: Optional[pd.DataFrame], type_kwh: Dict[str, Optional[int]], profiler: Optional[Profiler]
+) -> Optional[pd.DataFrame]:
+    if units is None:
+        return None
+    with _stage(profiler, "unit_mapping"):
+        return assign_unit_kwh(units, type_kwh)
+
+
+# =========================================================
+# 処理段階の並行実行（CSV読み込み・共用部PDF抽出・専用部PDF抽出）
+# =========================================================
+class _AnyEvent:
+    """渡したイベントのどれかがセットされていればセットとみなす（extract_kwh_many の cancel 用）。"""
+
+    def __init__(self, *events: Optional[threading.Event]):
+        self.events = [e for e in events if e is not None]
+
+    def is_set(self) -> bool:
+        return any(e.is_set() for e in self.events)
+
+
+class _StageGraph:
+    """互いに依存しない処理段階をスレッドで進め、タイプ別kWhの割り当て（合流点）で結果を待つ。
+
+    専用部PDFの抽出は呼び出し元のスレッドで行い（進捗のコールバックをそのスレッドで呼ぶため）、
+    その cancel には利用者の cancel と「どれかの段階が失敗した」をまとめた self.cancel を渡す。
+    段階が失敗すると専用部の抽出は次の確認の時点で打ち切られ、raise_failed でその段階の例外を送出する。
+    """
+
+    def __init__(self, cancel: Optional[threading.Event] = None):
+        self.failed = threading.Event()
+        self.cancel = _AnyEvent(cancel, self.failed)
+        self._threads = ThreadPoolExecutor(max_workers=2, thread_name_prefix="kwh-stage")
+        self._futures: Dict[str, Future] = {}
+
+    def start(self, name: str, fn: Callable, *args) -> None:
+        future = self._threads.submit(fn, *args)
+        future.add_done_callback(self._on_done)
+        self._futures[name] = future
+
+    def _on_done(self, future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            self.failed.set()
+
+    def result(self, name: str):
+        return self._futures[name].result()
+
+    def raise_failed(self) -> None:
+        for future in self._futures.values():
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                raise future.exception()
+
+    def __enter__(self) -> "_StageGraph":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        # 失敗・中止で抜けるときは、残りの段階の完了を待たない
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_private(
+    pdfs: List[PdfInput],
+    mode: str = "full",
+    max_workers: Optional[int] = None,
+    cache: Optional[ExtractionCache] = None,
+    run_stats: Optional[Dict[str, int]] = None,
+    executor: Optional[Executor] = None,
+    on_row: Optional[RowCallback] = None,
+    cancel: Optional[threading.Event] = None,
+    profiler: Optional[Profiler] = None,
+) -> Tuple[List[dict], Dict[str, Optional[int]], List[list]]:
+    """専用部PDFを抽出し、(抽出結果の行, タイプ→kWh, デバッグ情報) を返す。
+
+    on_row を渡すと、PDFが1件終わるたびにその行を渡す（進捗表示用）。
+    行の「取得元」は、PDFから抽出したかキャッシュ・抽出ストアの結果を使ったかを表す。
+    """
+    private_debug: List[list] = []
+    rows: List[dict] = [
+        {"PDF名": p.name, "タイプ": extract_type_key_from_filename(p.name), "kWh": None, "取得元": None}
+        for p in pdfs
+    ]
+
+    def on_result(i: int, kwh: Optional[int], _debug: list, source: str) -> None:
+        rows[i]["kWh"] = kwh
+        rows[i]["取得元"] = source
+        if on_row is not None:
+            on_row(i, rows[i])
+
+    extract_kwh_many(
+        [p.data for p in pdfs],
+        max_workers=max_workers,
+        cache=cache,
+        run_stats=run_stats,
+        mode=mode,
+        debug_out=private_debug,
+        executor=executor,
+        on_result=on_result,
+        cancel=cancel,
+        profiler=profiler,
+        labels=[p.name for p in pdfs],
+    )
+    type_kwh: Dict[str, Optional[int]] = {row["タイプ"]: row["kWh"] for row in rows}
+    return rows, type_kwh, private_debug
+
+
+def extract_common(
+    pdf_bytes: PdfBytes,
+    mode: str = "full",
+    cache: Optional[ExtractionCache] = None,
+    run_stats: Optional[Dict[str, int]] = None,
+    executor: Optional[Executor] = None,
+    profiler: Optional[Profiler] = None,
+) -> Callable[[], CommonAreaResult]:
+    """共用部PDFの抽出を開始し、結果を返す関数を返す。
+
+    executor を渡すとプールで抽出を進めるので、その間に専用部の抽出を並行できる。
+    """
+    key = ExtractionCache.make_key("common", pdf_bytes, f"{EXTRACTOR_VERSION}-{mode}")
+    hit = cache.lookup(key) if cache is not None else None
+    record_lookup(run_stats, hit is not None)
+    if hit is not None:
+        building_total, solar_reduction, actual_consumption, debug_info = hit.value
+        result = CommonAreaResult(
+            building_total, solar_reduction, actual_consumption, debug_info + [describe_hit(hit)],
+        )
+        return lambda: result
+
+    trace_memory = profiler is not None and profiler.trace_memory
+    future = None
+    if executor is not None:
+        future = executor.submit(
+            measure_call, extract_common_area_located, pool_payload(pdf_bytes), mode, trace_memory=trace_memory
+        )
+
+    def wait() -> CommonAreaResult:
+        if future is not None:
+            extracted, measurement = future.result()
+        else:
+            extracted, measurement = measure_call(extract_common_area_located, pdf_bytes, mode, trace_memory=trace_memory)
+        if profiler is not None:
+            profiler.record("extract_common", measurement)
+        *value, location = extracted
+        if cache is not None:
+            cache.put(key, value, Provenance(None, *(location or (None, None))))
+        return CommonAreaResult(*value)
+
+    return wait
+
+
+def run_pipeline(
+    inputs: PipelineInputs,
+    cache: Optional[ExtractionCache] = None,
+    executor: Optional[Executor] = None,
+    on_pdf_done: Optional[RowCallback] = None,
+    cancel: Optional[threading.Event] = None,
+    profiler: Optional[Profiler] = None,
+) -> AggregationResult:
+    """専用部・共用部PDFの抽出から住戸リストへの割り当てまでを実行する。
+
+    住戸リストCSVの読み込み・列検出と共用部PDFの抽出は、専用部PDFの抽出と並行して進め、
+    タイプ別kWhの割り当てで合流する。CSVの列が見つからない場合は、専用部の抽出を打ち切って
+    すぐに UnitListColumnError を送出する。
+    executor を渡すと、複数物件で同じプロセスプールを共有できる（バッチ処理用）。
+    on_pdf_done は専用部PDFが1件終わるたびに呼ばれる。cancel をセットすると
+    ExtractionCancelled で打ち切る。profiler を渡すと処理段階ごとの時間・メモリを記録する
+    （並行する段階のピークメモリには、同時に進んだ段階の分も含まれる）。
+    inputs.memory_budget を超える入力は、抽出を始める前に InputTooLarge で断る。
+    """
+    check_memory_budget(inputs.files(), inputs.memory_budget)
+    with _stage(profiler, "pipeline", memory=False), _run_stage(profiler):
+        result = _run_pipeline(inputs, cache, executor, on_pdf_done, cancel, profiler)
+    result.profile = profiler
+    return result
+
+
+def _run_pipeline(
+    inputs: PipelineInputs,
+    cache: Optional[ExtractionCache],
+    executor: Optional[Executor],
+    on_pdf_done: Optional[RowCallback],
+    cancel: Optional[threading.Event],
+    profiler: Optional[Profiler],
+) -> AggregationResult:
+    run_stats = {"hit": 0, "miss": 0}
+    with _StageGraph(cancel) as graph:
+        graph.start("csv", load_units, inputs.csv_bytes, profiler)
+        if inputs.common_pdf:
+            graph.start(
+                "common", extract_common(inputs.common_pdf, inputs.mode, cache, run_stats, executor, profiler),
+            )
+        try:
+            pdf_rows, type_kwh, private_debug = extract_private(
+                inputs.private_pdfs, inputs.mode, inputs.max_workers, cache, run_stats, executor, on_pdf_done,
+                graph.cancel, profiler,
+            )
+        except ExtractionCancelled:
+            graph.raise_failed()
+            raise
+        units = graph.result("csv")
+        common = graph.result("common") if inputs.common_pdf else None
+    unit_list = _assign_kwh(units, type_kwh, profiler)
+
+    return AggregationResult(
+        project_name=inputs.project_name,
+        pdf_rows=pdf_rows,
+        type_kwh=type_kwh,
+        private_debug=private_debug,
+        common=common,
+        unit_list=unit_list,
+        cache_stats=run_stats,
+        mode=inputs.mode,
+        pdf_digests=[content_digest(p.data) for p in inputs.private_pdfs],
+        csv_digest=content_digest(inputs.csv_bytes),
+        common_digest=content_digest(inputs.common_pdf) if inputs.common_pdf else None,
+    )
+
+
+# =========================================================
+# 差分再集計
+# =========================================================
+def diff_type_kwh(
+    before: Dict[str, Optional[int]],
+    after: Dict[str, Optional[int]],
+    unit_list: Optional[pd.DataFrame] = None,
+) -> List[TypeChange]:
+    """2回の集計のタイプ別kWhを比べ、値が変わった・増えた・なくなったタイプを返す。"""
+    counts = unit_list["タイプ"].value_counts() if unit_list is not None else pd.Series(dtype=int)
+    changes = []
+    for tkey in sorted(set(before) | set(after)):
+        if tkey in before and tkey in after and before[tkey] == after[tkey]:
+            continue
+        changes.append(TypeChange(tkey, before.get(tkey), after.get(tkey), int(counts.get(tkey, 0))))
+    return changes
+
+
+def run_incremental(
+    inputs: PipelineInputs,
+    previous: Optional[AggregationResult],
+    cache: Optional[ExtractionCache] = None,
+    executor: Optional[Executor] = None,
+    on_pdf_done: Optional[RowCallback] = None,
+    cancel: Optional[threading.Event] = None,
+    profiler: Optional[Profiler] = None,
+) -> IncrementalUpdate:
+    """前回の集計結果との差分だけを再集計する。
+
+    専用部PDFはファイル名と内容のハッシュで前回と突き合わせ、追加・差し替えられたものだけを抽出する。
+    共用部PDF・住戸リストCSVも内容が同じなら前回の結果を使い、住戸リストは
+    kWhの変わったタイプがあるときだけ割り当て直す（CSVの再読み込みとタイプ名の解析は省く）。
+    抽出方式が前回と違う場合や previous が None の場合は、すべて抽出し直す。
+    on_pdf_done / cancel / profiler / inputs.memory_budget は run_pipeline と同じ
+    （前回の結果を使ったPDFも on_pdf_done に渡す）。
+    """
+    check_memory_budget(inputs.files(), inputs.memory_budget)
+    with _stage(profiler, "pipeline", memory=False), _run_stage(profiler):
+        update = _run_incremental(inputs, previous, cache, executor, on_pdf_done, cancel, profiler)
+    update.result.profile = profiler
+    return update
+
+
+def _run_incremental(
+    inputs: PipelineInputs,
+    previous: Optional[AggregationResult],
+    cache: Optional[ExtractionCache],
+    executor: Optional[Executor],
+    on_pdf_done: Optional[RowCallback],
+    cancel: Optional[threading.Event],
+    profiler: Optional[Profiler],
+) -> IncrementalUpdate:
+    reusable = previous is not None and previous.mode == inputs.mode
+    digests = [content_digest(p.data) for p in inputs.private_pdfs]
+    prev_by_name = {}
+    if reusable:
+        prev_by_name = {
+            row["PDF名"]: (digest, row, debug)
+            for row, digest, debug in zip(previous.pdf_rows, previous.pdf_digests, previous.private_debug)
+        }
+
+    run_stats = {"hit": 0, "miss": 0, "reused": 0}
+    common_digest = content_digest(inputs.common_pdf) if inputs.common_pdf else None
+    csv_digest = content_digest(inputs.csv_bytes)
+    reuse_common = reusable and common_digest == previous.common_digest
+    reuse_units = reusable and csv_digest == previous.csv_digest and previous.unit_list is not None
+
+    pdf_rows: List[Optional[dict]] = [None] * len(inputs.private_pdfs)
+    private_debug: List[list] = [[] for _ in inputs.private_pdfs]
+    pending = []
+    for i, (p, digest) in enumerate(zip(inputs.private_pdfs, digests)):
+        prev = prev_by_name.get(p.name)
+        if prev is not None and prev[0] == digest:
+            pdf_rows[i], private_debug[i] = dict(prev[1], 取得元=SOURCE_PREVIOUS), prev[2]
+            if on_pdf_done is not None:
+                on_pdf_done(i, pdf_rows[i])
+        else:
+            pending.append(i)
+    run_stats["reused"] = len(inputs.private_pdfs) - len(pending)
+
+    # 変わったCSV・共用部PDFだけを、専用部PDFの再抽出と並行して読み直す
+    with _StageGraph(cancel) as graph:
+        if not reuse_units:
+            graph.start("csv", load_units, inputs.csv_bytes, profiler)
+        if inputs.common_pdf and not reuse_common:
+            graph.start(
+                "common", extract_common(inputs.common_pdf, inputs.mode, cache, run_stats, executor, profiler),
+            )
+        if pending:
+            try:
+                rows, _, debugs = extract_private(
+                    [inputs.private_pdfs[i] for i in pending], inputs.mode, inputs.max_workers, cache, run_stats,
+                    executor,
+                    (lambda j, row: on_pdf_done(pending[j], row)) if on_pdf_done is not None else None,
+                    graph.cancel,
+                    profiler,
+                )
+            except ExtractionCancelled:
+                graph.raise_failed()
+                raise
+            for i, row, debug in zip(pending, rows, debugs):
+                pdf_rows[i], private_debug[i] = row, debug
+        units = None if reuse_units else graph.result("csv")
+        if reuse_common:
+            common = previous.common
+        else:
+            common = graph.result("common") if inputs.common_pdf else None
+    type_kwh: Dict[str, Optional[int]] = {row["タイプ"]: row["kWh"] for row in pdf_rows}
+
+    before = previous.type_kwh if previous is not None else {}
+    if reuse_units:
+        unit_list = previous.unit_list
+        if diff_type_kwh(before, type_kwh):
+            with _stage(profiler, "unit_mapping"):
+                unit_list = unit_list.copy()
+                unit_list["消費電力量[kWh]"] = map_type_kwh(unit_list["タイプ"], type_kwh)
+    else:
+        unit_list = _assign_kwh(units, type_kwh, profiler)
+
+    result = AggregationResult(
+        project_name=inputs.project_name,
+        pdf_rows=pdf_rows,
+        type_kwh=type_kwh,
+        private_debug=private_debug,
+        common=common,
+        unit_list=unit_list,
+        cache_stats=run_stats,
+        mode=inputs.mode,
+        pdf_digests=digests,
+        csv_digest=csv_digest,
+        common_digest=common_digest,
+    )
+    current_names = {p.name for p in inputs.private_pdfs}
+    return IncrementalUpdate(
+        result=result,
+        extracted_pdfs=[inputs.private_pdfs[i].name for i in pending],
+        removed_pdfs=[row["PDF名"] for row in (previous.pdf_rows if previous else []) if row["PDF名"] not in current_names],
+        reused_pdfs=run_stats["reused"],
+        type_changes=diff_type_kwh(before, type_kwh, unit_list),
+    )
+
+
+def rebuild_result(
+    previous: AggregationResult,
+    project_name: Optional[str] = None,
+    csv_bytes: Optional[bytes] = None,
+    profiler: Optional[Profiler] = None,
+) -> AggregationResult:
+    """PDFを読まずに、前回の集計結果（スナップショットから復元したものでもよい）を作り直す。
+
+    project_name を渡すと物件名を差し替え、csv_bytes を渡すとその住戸リストに
+    前回のタイプ別kWhを割り当て直す。作成済みのレポートは引き継がない。
+    """
+    with _stage(profiler, "pipeline", memory=False):
+        unit_list, csv_digest = previous.unit_list, previous.csv_digest
+        if csv_bytes is not None and content_digest(csv_bytes) != csv_digest:
+            csv_digest = content_digest(csv_bytes)
+            unit_list = _assign_kwh(load_units(csv_bytes, profiler), previous.type_kwh, profiler)
+        result = replace(
+            previous,
+            project_name=previous.project_name if project_name is None else project_name,
+            unit_list=unit_list,
+            csv_digest=csv_digest,
+            cache_stats={"hit": 0, "miss": 0, "reused": len(previous.pdf_rows)},
+            profile=profiler,
+        )
+    return result
+
+
+# =========================================================
+# レポート出力
+# =========================================================
+def _memoized_report(result: AggregationResult, key: tuple, build: Callable[[], bytes]) -> bytes:
+    # ダウンロードボタンのコールバックは別スレッドで呼ばれるため、同時に2回作らないようロックする
+    with result._reports_lock:
+        if key not in result._reports:
+            result._reports[key] = build()
+        return result._reports[key]
+
+
+def excel_report_for(result: AggregationResult, streaming_excel: bool = True) -> bytes:
+    """集計結果のExcelレポート。初回だけ作成し、以降は同じバイト列を返す。
+
+    streaming_excel=True ではExcelを write-only ブックで書き出す（レイアウトは同じ）。
+    """
+    from kwh_engine.reports import build_standard_excel
+
+    def build() -> bytes:
+        with _stage(result.profile, "excel", label="streaming" if streaming_excel else "standard"):
+            return build_standard_excel(
+                result.unit_list, result.project_name, result.common_area_mwh,
+                streaming=streaming_excel, totals=result.totals,
+            )
+
+    return _memoized_report(result, ("excel", streaming_excel), build)
+
+
+def pdf_report_for(result: AggregationResult, streaming_pdf: bool = True) -> bytes:
+    """集計結果のPDFレポート。初回だけ作成し、以降は同じバイト列を返す。
+
+    streaming_pdf=True では住戸別詳細をページごとに組み立てる（見た目は同じ）。
+    """
+    from kwh_engine.reports import build_pdf_report
+
+    def build() -> bytes:
+        with _stage(result.profile, "pdf", label="streaming" if streaming_pdf else "standard"):
+            totals = result.totals
+            return build_pdf_report(
+                result.unit_list,
+                result.project_name,
+                totals.common_area_mwh,
+                totals.building_total,
+                totals.solar_reduction,
+                streaming=streaming_pdf,
+                totals=totals,
+            )
+
+    return _memoized_report(result, ("pdf", streaming_pdf), build)
+
+
+def build_reports(result: AggregationResult, streaming_excel: bool = True, streaming_pdf: bool = True) -> Reports:
+    """集計結果からExcel・PDFレポートのバイト列を作る。"""
+    return Reports(excel=excel_report_for(result, streaming_excel), pdf=pdf_report_for(result, streaming_pdf))
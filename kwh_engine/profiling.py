@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# =========================================================
+# 処理段階ごとの計測（経過時間・CPU時間・ピークメモリ）
+# =========================================================
+# 段階名 → 画面表示名（JSONには段階名で出力する）
+STAGE_LABELS: Dict[str, str] = {
+    "queue_wait": "順番待ち（他の集計の実行中）",
+    "extract_private": "専用部PDF抽出（1件ごと）",
+    "extract_common": "共用部PDF抽出",
+    "csv_load": "住戸リストCSV読み込み・列検出",
+    "unit_mapping": "タイプ別kWhの割り当て",
+    "excel": "Excel作成",
+    "pdf": "PDF作成",
+    "pipeline": "集計全体",
+}
+
+# (経過時間[秒], CPU時間[秒], ピークメモリ[バイト] または None)
+Measurement = Tuple[float, float, Optional[int]]
+
+
+@contextmanager
+def _measure(trace_memory: bool) -> Iterator[list]:
+    # CPU時間はスレッド単位で測る（レポートはダウンロード用の別スレッドで作られるため）
+    out: list = []
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if trace_memory:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield out
+    finally:
+        peak = tracemalloc.get_traced_memory()[1] - base if trace_memory else None
+        out.append((time.perf_counter() - wall, time.thread_time() - cpu, peak))
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def keep_tracing(enabled: bool) -> Iterator[None]:
+    """enabled のとき、抜けるまで tracemalloc を有効にしておく。
+
+    並行して進む段階の計測が、先に終わった段階の tracemalloc.stop() で途切れないようにする。
+    """
+    started_tracing = enabled and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def measure_call(fn: Callable, *args, trace_memory: bool = False, **kwargs) -> Tuple[Any, Measurement]:
+    """fn(*args, **kwargs) を実行し、(戻り値, 計測値) を返す。ワーカープロセス内でも使える。"""
+    with _measure(trace_memory) as out:
+        value = fn(*args, **kwargs)
+    return value, out[0]
+
+
+class Profiler:
+    """集計1回分の計測結果を段階ごとに記録する。
+
+    trace_memory=True では tracemalloc でピークメモリも測る（処理は遅くなる）。
+    tracemalloc のピークはプロセス全体で1つなので、同時に走る段階があると
+    ピークメモリはそれらを合わせた値になる。
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, measurement: Measurement, label: Optional[str] = None) -> None:
+        wall, cpu, peak = measurement
+        with self._lock:
+            self.events.append({
+                "stage": stage,
+                "label": label,
+                "wall_sec": round(wall, 6),
+                "cpu_sec": round(cpu, 6),
+                "peak_bytes": peak,
+            })
+
+    def merge(self, events: List[Dict[str, Any]]) -> None:
+        """別プロセスで記録した計測値（events の要素）を取り込む。"""
+        with self._lock:
+            self.events.extend(events)
+
+    @contextmanager
+    def stage(self, stage: str, label: Optional[str] = None, memory: bool = True) -> Iterator[None]:
+        # 他の段階を内側に含む段階は memory=False にする（内側の計測でピークがリセットされるため）
+        with _measure(self.trace_memory and memory) as out:
+            yield
+        self.record(stage, out[0], label)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """段階ごとの (回数, 経過時間合計, CPU時間合計, 最大ピークメモリ)。STAGE_LABELS の順。"""
+        with self._lock:
+            events = list(self.events)
+        order = {name: i for i, name in enumerate(STAGE_LABELS)}
+        stages: Dict[str, Dict[str, Any]] = {}
+        for e in events:
+            s = stages.setdefault(e["stage"], {
+                "stage": e["stage"], "count": 0, "wall_sec": 0.0, "cpu_sec": 0.0, "peak_bytes": None,
+            })
+            s["count"] += 1
+            s["wall_sec"] = round(s["wall_sec"] + e["wall_sec"], 6)
+            s["cpu_sec"] = round(s["cpu_sec"] + e["cpu_sec"], 6)
+            if e["peak_bytes"] is not None:
+                s["peak_bytes"] = max(s["peak_bytes"] or 0, e["peak_bytes"])
+        return sorted(stages.values(), key=lambda s: order.get(s["stage"], len(order)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self.events)
+        return {"trace_memory": self.trace_memory, "stages": self.summary(), "events": events}
+
+    def to_json(self) -> bytes:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2).encode("utf-8")
@@ -0,0 +1,666 @@
+import io
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.lib.enums import TA_CENTER
+
+from kwh_engine.totals import EnergyTotals, compute_totals
+
+# 作成日時は実行環境のタイムゾーンに依存させず、常に日本時間で表示する
+JST = timezone(timedelta(hours=9))
+
+
+# =========================================================
+# 列単位の表示用フォーマット
+# =========================================================
+def format_thousands(values: pd.Series, na: str = "-") -> pd.Series:
+    """数値列を整数（小数切り捨て）の3桁区切り文字列にする。欠損値は na にする。"""
+    out = pd.Series(na, index=values.index, dtype=object)
+    mask = values.notna()
+    out[mask] = values[mask].astype("int64").map("{:,}".format)
+    return out
+
+
+def format_text(values: pd.Series) -> pd.Series:
+    return values.astype(str)
+
+
+def _table_rows(*columns: pd.Series) -> List[list]:
+    return [list(row) for row in zip(*(c.tolist() for c in columns))]
+
+
+# =========================================================
+# PDFの日本語フォント・段落スタイル（プロセスで1回だけ用意する）
+# =========================================================
+# OS別の日本語TTF。(パス, .ttc 内のフォント番号) を上から順に試す
+JAPANESE_TTF_CANDIDATES = [
+    ('C:\\Windows\\Fonts\\msgothic.ttc', 0),               # Windows
+    ('/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc', 0),  # macOS
+    ('/usr/share/fonts/truetype/fonts-japanese-gothic.ttf', None),
+    ('/usr/share/fonts/opentype/ipafont-gothic/ipagp.ttf', None),
+]
+
+
+class PdfStyles(NamedTuple):
+    font_name: str
+    title: ParagraphStyle
+    heading: ParagraphStyle
+    normal: ParagraphStyle
+
+
+_pdf_styles: Optional[PdfStyles] = None
+_pdf_styles_lock = threading.Lock()
+
+
+def _register_japanese_font() -> str:
+    # 日本語フォント設定（OS別TTFを順に試し、最後はreportlab内蔵CIDフォントに必ずフォールバック）
+    for ttf_path, idx in JAPANESE_TTF_CANDIDATES:
+        try:
+            if idx is not None:
+                pdfmetrics.registerFont(TTFont('Japanese', ttf_path, subfontIndex=idx))
+            else:
+                pdfmetrics.registerFont(TTFont('Japanese', ttf_path))
+            return 'Japanese'
+        except Exception:
+            continue
+    # Render等の最小環境向け: reportlab同梱のCID日本語フォント（追加パッケージ不要）
+    try:
+        pdfmetrics.registerFont(UnicodeCIDFont('HeiseiKakuGo-W5'))
+        return 'HeiseiKakuGo-W5'
+    except Exception:
+        return 'Courier'
+
+
+def pdf_styles() -> PdfStyles:
+    """日本語フォントを登録し、PDFレポートの段落スタイルを返す。
+
+    TTFの読み込み（フォントファイルの解析）は重いので、プロセスで最初の1回だけ行い、
+    以降は登録済みのフォントと作成済みのスタイルを返す。
+    """
+    global _pdf_styles
+    with _pdf_styles_lock:
+        if _pdf_styles is None:
+            font_name = _register_japanese_font()
+            styles = getSampleStyleSheet()
+            _pdf_styles = PdfStyles(
+                font_name=font_name,
+                title=ParagraphStyle(
+                    'CustomTitle',
+                    parent=styles['Heading1'],
+                    fontName=font_name,
+                    fontSize=16,
+                    alignment=TA_CENTER,
+                    spaceAfter=20
+                ),
+                heading=ParagraphStyle(
+                    'CustomHeading',
+                    parent=styles['Heading2'],
+                    fontName=font_name,
+                    fontSize=14,
+                    spaceAfter=10
+                ),
+                normal=ParagraphStyle(
+                    'CustomNormal',
+                    parent=styles['Normal'],
+                    fontName=font_name,
+                    fontSize=10
+                ),
+            )
+        return _pdf_styles
+
+
+# =========================================================
+# PDFの住戸別詳細（1つの表、または高速モードのページごとの表）
+# =========================================================
+DETAIL_HEADER = ["行番号", "住戸番号", "タイプ", "消費電力量[kWh]"]
+DETAIL_COL_WIDTHS = [25*mm, 35*mm, 40*mm, 60*mm]
+
+
+def _detail_rows(unit_list: pd.DataFrame) -> List[list]:
+    # 見出し行を除いた住戸別詳細の行（表示用の文字列）
+    return _table_rows(
+        format_text(unit_list["行番号"]),
+        format_text(unit_list["住戸の番号"]),
+        format_text(unit_list["タイプ"]),
+        format_thousands(unit_list["消費電力量[kWh]"]),
+    )
+
+
+def _detail_table(rows: List[list], font_name: str, header: bool) -> Table:
+    commands = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (0, 0), (2, -1), 'CENTER'),
+        ('ALIGN', (3, 0), (3, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ]
+    if header:
+        commands.insert(0, ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue))
+    table = Table(rows, colWidths=DETAIL_COL_WIDTHS)
+    table.setStyle(TableStyle(commands))
+    return table
+
+
+class DetailRows(Flowable):
+    """住戸別詳細の表を、ページに収まる分だけの Table として順に組み立てる flowable。
+
+    1つの Table に全行を入れると、ReportLab はページごとの分割で残りの行すべての Table を
+    作り直すため、処理時間が行数の2乗で増える。ここでは表の行番号 start（0 が見出し行）以降のうち、
+    残りの高さに入りうる行数（最小の行の高さから見積もる）だけの Table を作って分割させ、
+    入らなかった行は DetailRows の続きとして返す。分割位置は ReportLab の Table の分割に任せるので、
+    1つの Table と同じ位置でページが変わる（続きのページに見出し行は付かない）。
+    """
+
+    def __init__(self, rows: List[list], font_name: str, start: int = 0, row_height: Optional[float] = None):
+        Flowable.__init__(self)
+        self.hAlign = 'CENTER'
+        self.rows = rows
+        self.font_name = font_name
+        self.start = start
+        if row_height is None:
+            row_height = _detail_table([DETAIL_HEADER], font_name, header=True).wrap(0, 0)[1]
+        self._row_height = row_height
+        self._total = len(rows) + 1
+        self._chunk: Optional[Table] = None
+        self._stop = start
+
+    def _table_for(self, avail_height: float) -> Table:
+        # 入りうる行数 +1 行まで作る（収まらないことを Table の分割で確かめるため）。
+        # wrap と split で高さが少し違っても、作った表が足りていれば作り直さない
+        stop = min(self._total, self.start + int(avail_height // self._row_height) + 1)
+        if self._chunk is None or stop > self._stop:
+            header = self.start == 0
+            rows = ([DETAIL_HEADER] if header else []) + self.rows[max(self.start - 1, 0):stop - 1]
+            self._chunk = _detail_table(rows, self.font_name, header=header)
+            self._stop = stop
+        return self._chunk
+
+    def wrap(self, availWidth, availHeight):
+        width, height = self._table_for(availHeight).wrap(availWidth, availHeight)
+        # 作らなかった行の分は最小の行の高さで見積もる（このページに収まらないことが伝わればよい）
+        return width, height + (self._total - self._stop) * self._row_height
+
+    def split(self, availWidth, availHeight):
+        parts = self._table_for(availHeight).split(availWidth, availHeight)
+        if not parts:
+            return []
+        stop = self.start + len(parts[0]._cellvalues)
+        if stop >= self._total:
+            return [parts[0]]
+        return [parts[0], DetailRows(self.rows, self.font_name, stop, self._row_height)]
+
+    def draw(self):
+        # wrap で残りの行がすべて収まった場合だけ呼ばれる
+        self._chunk.drawOn(self.canv, 0, 0)
+
+
+# =========================================================
+# PDF出力機能
+# =========================================================
+def build_pdf_report(
+    unit_list: pd.DataFrame,
+    project_name: str,
+    common_area_mwh: Optional[float] = None,
+    building_total: Optional[float] = None,
+    solar_reduction: Optional[float] = None,
+    streaming: bool = False,
+    totals: Optional[EnergyTotals] = None
+) -> bytes:
+    """集計結果のPDFレポート（サマリー・共用部の内訳・タイプ別集計・住戸別詳細）を作る。
+
+    streaming=True では住戸別詳細をページごとに組み立てる（DetailRows）。見た目は同じで、
+    住戸数が多くても処理時間がほぼ行数に比例し、ReportLab の表は1ページ分ずつしか作らない。
+    totals（compute_totals の結果）を渡すと、合計値・タイプ別集計を計算し直さずに使う。
+    """
+    if totals is None:
+        totals = compute_totals(unit_list, common_area_mwh, building_total, solar_reduction)
+    common_area_mwh, building_total, solar_reduction = totals.common_area_mwh, totals.building_total, totals.solar_reduction
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=20*mm,
+        leftMargin=20*mm,
+        topMargin=20*mm,
+        bottomMargin=20*mm
+    )
+    
+    styles = pdf_styles()
+    font_name = styles.font_name
+    title_style, heading_style, normal_style = styles.title, styles.heading, styles.normal
+
+    elements = []
+    
+    elements.append(Paragraph(project_name, title_style))
+    elements.append(Paragraph(f"作成日時: {datetime.now(JST).strftime('%Y年%m月%d日 %H:%M')}", normal_style))
+    elements.append(Spacer(1, 10*mm))
+    
+    elements.append(Paragraph("集計結果サマリー", heading_style))
+    
+    summary_data = [["専用部合計消費電力量", f"{totals.private_kwh:,} kWh"]]
+    
+    if common_area_mwh:
+        summary_data.extend([
+            ["共用部消費電力量", f"{totals.common_kwh:,} kWh"],
+            ["建物全体消費電力量", f"{totals.grand_total_kwh:,} kWh"]
+        ])
+    
+    summary_table = Table(summary_data, colWidths=[80*mm, 80*mm])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.yellow),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 10*mm))
+    
+    if common_area_mwh and building_total is not None and solar_reduction is not None:
+        elements.append(Paragraph("共用部消費電力量の計算内訳", heading_style))
+        
+        common_detail_data = [
+            ["項目", "値"],
+            ["建物全体（太陽光削減後）", f"{building_total:.2f} MWh"],
+            ["太陽光削減量", f"{solar_reduction:.2f} MWh"],
+            ["実際の消費電力（太陽光削減前）", f"{common_area_mwh:.2f} MWh"],
+            ["", f"= {common_area_mwh * 1000:,.0f} kWh"]
+        ]
+        
+        common_detail_table = Table(common_detail_data, colWidths=[80*mm, 80*mm])
+        common_detail_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+            ('BACKGROUND', (0, 3), (-1, 3), colors.lightgreen),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('FONTNAME', (0, 0), (-1, -1), font_name),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]))
+        elements.append(common_detail_table)
+        elements.append(Spacer(1, 5*mm))
+        
+        calc_text = f"計算式: {building_total:.2f} + {solar_reduction:.2f} = {common_area_mwh:.2f} MWh"
+        elements.append(Paragraph(calc_text, normal_style))
+        elements.append(Spacer(1, 10*mm))
+    
+    elements.append(Paragraph("タイプ別集計", heading_style))
+    
+    type_summary = totals.types
+    type_data = [["タイプ", "戸数", "1住戸あたり[kWh]", "合計[kWh]"]] + _table_rows(
+        format_text(type_summary["タイプ"]),
+        format_text(type_summary["戸数"]),
+        format_thousands(type_summary["1住戸あたり"]),
+        format_thousands(type_summary["合計消費電力量"]),
+    )
+    
+    type_table = Table(type_data, colWidths=[40*mm, 30*mm, 45*mm, 45*mm])
+    type_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(type_table)
+    elements.append(PageBreak())
+    
+    elements.append(Paragraph("住戸別詳細", heading_style))
+    detail_rows = _detail_rows(unit_list)
+    if streaming:
+        elements.append(DetailRows(detail_rows, font_name))
+    else:
+        elements.append(_detail_table([DETAIL_HEADER] + detail_rows, font_name, header=True))
+    
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer.getvalue()
+
+
+# =========================================================
+# Excel作成
+# =========================================================
+def build_standard_excel(
+    unit_list: pd.DataFrame, 
+    project_name: str,
+    common_area_mwh: Optional[float] = None,
+    streaming: bool = False,
+    totals: Optional[EnergyTotals] = None
+) -> bytes:
+    if totals is None:
+        totals = compute_totals(unit_list, common_area_mwh)
+    if streaming:
+        return build_standard_excel_streaming(unit_list, project_name, common_area_mwh, totals)
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "集計"
+
+    thin = Side(border_style="thin", color="999999")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_fill = PatternFill("solid", fgColor="667EEA")
+    total_fill = PatternFill("solid", fgColor="FFF2CC")
+    title_fill = PatternFill("solid", fgColor="764BA2")
+    common_fill = PatternFill("solid", fgColor="E8DAEF")
+    grand_fill = PatternFill("solid", fgColor="F5576C")
+    bold = Font(bold=True, color="FFFFFF")
+    center = Alignment(horizontal="center")
+    right = Alignment(horizontal="right")
+
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=10)
+    t = ws.cell(row=1, column=1)
+    t.value = project_name
+    t.font = Font(bold=True, size=16, color="FFFFFF")
+    t.alignment = center
+    t.fill = title_fill
+
+    left_headers = ["行番号", "住戸の番号", "タイプ", "消費電力量[kWh]"]
+    for c, h in enumerate(left_headers, start=1):
+        cell = ws.cell(row=2, column=c, value=h)
+        cell.font = bold
+        cell.fill = header_fill
+        cell.alignment = center
+        cell.border = border
+
+    for r, (row_no, unit_no, tkey, kwh) in enumerate(zip(
+        unit_list["行番号"].tolist(),
+        unit_list["住戸の番号"].tolist(),
+        unit_list["タイプ"].tolist(),
+        unit_list["消費電力量[kWh]"].tolist(),
+    ), start=3):
+        ws.cell(row=r, column=1, value=row_no).border = border
+        ws.cell(row=r, column=2, value=unit_no).border = border
+        ws.cell(row=r, column=3, value=tkey).border = border
+        ws.cell(row=r, column=4, value=kwh).border = border
+
+        ws.cell(row=r, column=1).alignment = center
+        ws.cell(row=r, column=2).alignment = right
+        ws.cell(row=r, column=3).alignment = center
+        ws.cell(row=r, column=4).alignment = right
+
+    sum_row = len(unit_list) + 3
+
+    ws.cell(row=sum_row, column=1, value="専用部合計住戸数").fill = total_fill
+    ws.cell(row=sum_row, column=2, value=totals.units).fill = total_fill
+    ws.cell(row=sum_row, column=3, value="専用部合計消費電力量[kWh]").fill = total_fill
+    ws.cell(row=sum_row, column=4, value=totals.private_kwh).fill = total_fill
+
+    for c in range(1, 5):
+        ws.cell(row=sum_row, column=c).font = Font(bold=True)
+        ws.cell(row=sum_row, column=c).border = border
+
+    if totals.common_kwh is not None:
+        sum_row += 1
+        ws.cell(row=sum_row, column=3, value="共用部消費電力量[kWh]").fill = common_fill
+        ws.cell(row=sum_row, column=4, value=totals.common_kwh).fill = common_fill
+        ws.cell(row=sum_row, column=3).font = Font(bold=True)
+        ws.cell(row=sum_row, column=4).font = Font(bold=True)
+        ws.cell(row=sum_row, column=3).border = border
+        ws.cell(row=sum_row, column=4).border = border
+        ws.cell(row=sum_row, column=4).alignment = right
+
+        sum_row += 1
+        ws.cell(row=sum_row, column=3, value="建物全体消費電力量[kWh]").fill = grand_fill
+        ws.cell(row=sum_row, column=4, value=totals.grand_total_kwh).fill = grand_fill
+        ws.cell(row=sum_row, column=3).font = Font(bold=True, size=12, color="FFFFFF")
+        ws.cell(row=sum_row, column=4).font = Font(bold=True, size=12, color="FFFFFF")
+        ws.cell(row=sum_row, column=3).border = border
+        ws.cell(row=sum_row, column=4).border = border
+        ws.cell(row=sum_row, column=4).alignment = right
+
+    right_headers = ["タイプ", "戸数", "1住戸あたり消費電力量[kWh]", "合計消費電力量[kWh]"]
+    for c, h in enumerate(right_headers, start=6):
+        cell = ws.cell(row=2, column=c, value=h)
+        cell.font = bold
+        cell.fill = header_fill
+        cell.alignment = center
+        cell.border = border
+
+    r0 = 3
+    ts = totals.types
+    for tkey, units, per_unit, total in zip(
+        ts["タイプ"].tolist(),
+        ts["戸数"].tolist(),
+        ts["1住戸あたり"].astype("int64").tolist(),
+        ts["合計消費電力量"].astype("int64").tolist(),
+    ):
+        ws.cell(row=r0, column=6, value=tkey).border = border
+        ws.cell(row=r0, column=7, value=units).border = border
+        ws.cell(row=r0, column=8, value=per_unit).border = border
+        ws.cell(row=r0, column=9, value=total).border = border
+
+        for c in range(6, 10):
+            ws.cell(row=r0, column=c).alignment = right if c >= 7 else center
+        r0 += 1
+    
+    r0 += 1
+
+    ws.cell(row=r0, column=6, value="専用部合計住戸数").fill = total_fill
+    ws.cell(row=r0, column=7, value=totals.type_units).fill = total_fill
+    ws.cell(row=r0, column=6).font = Font(bold=True)
+    ws.cell(row=r0, column=7).font = Font(bold=True)
+    ws.cell(row=r0, column=6).border = border
+    ws.cell(row=r0, column=7).border = border
+    ws.cell(row=r0, column=6).alignment = center
+    ws.cell(row=r0, column=7).alignment = right
+
+    r0 += 1
+    ws.cell(row=r0, column=6, value="専用部合計消費電力量[kWh]").fill = total_fill
+    ws.cell(row=r0, column=7, value=totals.private_kwh).fill = total_fill
+    ws.cell(row=r0, column=6).font = Font(bold=True)
+    ws.cell(row=r0, column=7).font = Font(bold=True)
+    ws.cell(row=r0, column=6).border = border
+    ws.cell(row=r0, column=7).border = border
+    ws.cell(row=r0, column=6).alignment = center
+    ws.cell(row=r0, column=7).alignment = right
+
+    if totals.common_kwh is not None:
+        r0 += 1
+        ws.cell(row=r0, column=6, value="共用部消費電力量[kWh]").fill = common_fill
+        ws.cell(row=r0, column=7, value=totals.common_kwh).fill = common_fill
+        ws.cell(row=r0, column=6).font = Font(bold=True)
+        ws.cell(row=r0, column=7).font = Font(bold=True)
+        ws.cell(row=r0, column=6).border = border
+        ws.cell(row=r0, column=7).border = border
+        ws.cell(row=r0, column=6).alignment = center
+        ws.cell(row=r0, column=7).alignment = right
+
+        r0 += 1
+        ws.cell(row=r0, column=6, value="建物全体消費電力量[kWh]").fill = grand_fill
+        ws.cell(row=r0, column=7, value=totals.grand_total_kwh).fill = grand_fill
+        ws.cell(row=r0, column=6).font = Font(bold=True, size=12, color="FFFFFF")
+        ws.cell(row=r0, column=7).font = Font(bold=True, size=12, color="FFFFFF")
+        ws.cell(row=r0, column=6).border = border
+        ws.cell(row=r0, column=7).border = border
+        ws.cell(row=r0, column=6).alignment = center
+        ws.cell(row=r0, column=7).alignment = right
+
+    ws.column_dimensions["A"].width = 10
+    ws.column_dimensions["B"].width = 15
+    ws.column_dimensions["C"].width = 12
+    ws.column_dimensions["D"].width = 20
+    ws.column_dimensions["F"].width = 12
+    ws.column_dimensions["G"].width = 10
+    ws.column_dimensions["H"].width = 26
+    ws.column_dimensions["I"].width = 22
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf.getvalue()
+
+
+# =========================================================
+# Excel作成（高速モード: write-only ブック + 名前付きスタイル）
+# =========================================================
+EXCEL_COLUMN_WIDTHS = {"A": 10, "B": 15, "C": 12, "D": 20, "F": 12, "G": 10, "H": 26, "I": 22}
+
+
+def _excel_named_styles() -> List[NamedStyle]:
+    # build_standard_excel と同じ書式を、セルごとではなく名前付きスタイルとして1回だけ定義する
+    thin = Side(border_style="thin", color="999999")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_fill = PatternFill("solid", fgColor="667EEA")
+    total_fill = PatternFill("solid", fgColor="FFF2CC")
+    title_fill = PatternFill("solid", fgColor="764BA2")
+    common_fill = PatternFill("solid", fgColor="E8DAEF")
+    grand_fill = PatternFill("solid", fgColor="F5576C")
+    bold = Font(bold=True)
+    white_bold = Font(bold=True, color="FFFFFF")
+    grand_font = Font(bold=True, size=12, color="FFFFFF")
+    center = Alignment(horizontal="center")
+    right = Alignment(horizontal="right")
+    plain = Alignment()
+
+    return [
+        NamedStyle("kwh_title", font=Font(bold=True, size=16, color="FFFFFF"), fill=title_fill, border=DEFAULT_BORDER, alignment=center),
+        NamedStyle("kwh_header", font=white_bold, fill=header_fill, border=border, alignment=center),
+        NamedStyle("kwh_cell_center", font=DEFAULT_FONT, border=border, alignment=center),
+        NamedStyle("kwh_cell_right", font=DEFAULT_FONT, border=border, alignment=right),
+        NamedStyle("kwh_total", font=bold, fill=total_fill, border=border, alignment=plain),
+        NamedStyle("kwh_total_center", font=bold, fill=total_fill, border=border, alignment=center),
+        NamedStyle("kwh_total_right", font=bold, fill=total_fill, border=border, alignment=right),
+        NamedStyle("kwh_common", font=bold, fill=common_fill, border=border, alignment=plain),
+        NamedStyle("kwh_common_center", font=bold, fill=common_fill, border=border, alignment=center),
+        NamedStyle("kwh_common_right", font=bold, fill=common_fill, border=border, alignment=right),
+        NamedStyle("kwh_grand", font=grand_font, fill=grand_fill, border=border, alignment=plain),
+        NamedStyle("kwh_grand_center", font=grand_font, fill=grand_fill, border=border, alignment=center),
+        NamedStyle("kwh_grand_right", font=grand_font, fill=grand_fill, border=border, alignment=right),
+    ]
+
+
+def build_standard_excel_streaming(
+    unit_list: pd.DataFrame,
+    project_name: str,
+    common_area_mwh: Optional[float] = None,
+    totals: Optional[EnergyTotals] = None
+) -> bytes:
+    """build_standard_excel と同じレイアウトを write-only ブックで行ごとに書き出す。
+
+    セルを保持しないため、住戸数が多くてもメモリ使用量と処理時間がほぼ行数に比例する。
+    """
+    if totals is None:
+        totals = compute_totals(unit_list, common_area_mwh)
+    wb = openpyxl.Workbook(write_only=True)
+    for style in _excel_named_styles():
+        wb.add_named_style(style)
+    ws = wb.create_sheet("集計")
+    for col, width in EXCEL_COLUMN_WIDTHS.items():
+        ws.column_dimensions[col].width = width
+    ws.merged_cells.add("A1:J1")
+
+    def cell(value, style):
+        c = WriteOnlyCell(ws, value=value)
+        c.style = style
+        return c
+
+    # 右側（タイプ別集計）は行数が少ないので先に「行番号 → セル」を組み立てておく
+    ts = totals.types
+    right_rows: Dict[int, list] = {}
+    r0 = 3
+    for tkey, units, per_unit, total in zip(
+        ts["タイプ"].tolist(),
+        ts["戸数"].tolist(),
+        ts["1住戸あたり"].astype("int64").tolist(),
+        ts["合計消費電力量"].astype("int64").tolist(),
+    ):
+        right_rows[r0] = [
+            cell(tkey, "kwh_cell_center"),
+            cell(units, "kwh_cell_right"),
+            cell(per_unit, "kwh_cell_right"),
+            cell(total, "kwh_cell_right"),
+        ]
+        r0 += 1
+
+    r0 += 1
+    right_rows[r0] = [cell("専用部合計住戸数", "kwh_total_center"), cell(totals.type_units, "kwh_total_right")]
+    r0 += 1
+    right_rows[r0] = [cell("専用部合計消費電力量[kWh]", "kwh_total_center"), cell(totals.private_kwh, "kwh_total_right")]
+    if totals.common_kwh is not None:
+        r0 += 1
+        right_rows[r0] = [cell("共用部消費電力量[kWh]", "kwh_common_center"), cell(totals.common_kwh, "kwh_common_right")]
+        r0 += 1
+        right_rows[r0] = [cell("建物全体消費電力量[kWh]", "kwh_grand_center"), cell(totals.grand_total_kwh, "kwh_grand_right")]
+
+    # 左側（住戸別明細）の合計行
+    sum_row = len(unit_list) + 3
+    left_tail: Dict[int, list] = {
+        sum_row: [
+            cell("専用部合計住戸数", "kwh_total"),
+            cell(totals.units, "kwh_total"),
+            cell("専用部合計消費電力量[kWh]", "kwh_total"),
+            cell(totals.private_kwh, "kwh_total"),
+        ],
+    }
+    if totals.common_kwh is not None:
+        left_tail[sum_row + 1] = [None, None, cell("共用部消費電力量[kWh]", "kwh_common"), cell(totals.common_kwh, "kwh_common_right")]
+        left_tail[sum_row + 2] = [
+            None, None,
+            cell("建物全体消費電力量[kWh]", "kwh_grand"),
+            cell(totals.grand_total_kwh, "kwh_grand_right"),
+        ]
+
+    def with_right(r: int, left: list) -> list:
+        right = right_rows.get(r)
+        if right is None:
+            return left
+        return list(left) + [None] * (5 - len(left)) + right
+
+    ws.append([cell(project_name, "kwh_title")])
+    headers = ["行番号", "住戸の番号", "タイプ", "消費電力量[kWh]"]
+    right_headers = ["タイプ", "戸数", "1住戸あたり消費電力量[kWh]", "合計消費電力量[kWh]"]
+    ws.append([cell(h, "kwh_header") for h in headers] + [None] + [cell(h, "kwh_header") for h in right_headers])
+
+    r = 3
+    for row_no, unit_no, tkey, kwh in zip(
+        unit_list["行番号"].tolist(),
+        unit_list["住戸の番号"].tolist(),
+        unit_list["タイプ"].tolist(),
+        unit_list["消費電力量[kWh]"].tolist(),
+    ):
+        ws.append(with_right(r, [
+            cell(row_no, "kwh_cell_center"),
+            cell(unit_no, "kwh_cell_right"),
+            cell(tkey, "kwh_cell_center"),
+            cell(kwh, "kwh_cell_right"),
+        ]))
+        r += 1
+
+    last_row = max([sum_row] + list(left_tail) + list(right_rows))
+    while r <= last_row:
+        ws.append(with_right(r, left_tail.get(r, [])))
+        r += 1
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
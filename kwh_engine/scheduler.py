@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+from kwh_engine.parallel import create_pool, resolve_workers
+
+
+# =========================================================
+# 抽出スケジューラ（全セッションで1つのプロセスプールを共有する）
+# =========================================================
+DEFAULT_MAX_ACTIVE_RUNS = 2
+
+# 待機中の集計に順番（1始まり）を知らせるコールバック
+WaitCallback = Callable[[int], None]
+
+
+def resolve_max_active_runs(max_active_runs: Optional[int] = None) -> int:
+    """同時に抽出を進める集計の数。未指定なら環境変数 KWH_MAX_ACTIVE_RUNS → DEFAULT_MAX_ACTIVE_RUNS の順。"""
+    if max_active_runs is None:
+        env = os.environ.get("KWH_MAX_ACTIVE_RUNS", "").strip()
+        max_active_runs = int(env) if env.isdigit() else DEFAULT_MAX_ACTIVE_RUNS
+    return max(1, max_active_runs)
+
+
+class SchedulerJob(Executor):
+    """ExtractionScheduler に受け付けられた集計1回分。run_pipeline などの executor として渡す。
+
+    submit した抽出はこの集計の待ち行列に入り、ワーカーが空いたときに他の集計と順番に実行される。
+    同時に実行する数は max_in_flight まで（「⚙️ 詳細設定」の並列数）。
+    """
+
+    def __init__(self, scheduler: "ExtractionScheduler", session_id: str, max_in_flight: Optional[int] = None):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.max_in_flight = max_in_flight
+        self.queue: Deque[tuple] = deque()
+        self.in_flight = 0
+        self.waited_sec = 0.0   # 受け付けられるまでの待ち時間
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self.scheduler._submit(self, fn, args, kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        # プールはスケジューラのもの。集計の終了は ExtractionScheduler.job を抜けたときに行う
+        pass
+
+
+class ExtractionScheduler:
+    """全セッションで共有する、大きさの決まったプロセスプールと抽出の待ち行列。
+
+    同時に抽出を進める集計は max_active_runs 件までで、それ以上は受け付け順に待たせる
+    （同じセッションの集計は前の集計が終わるまで待つ）。プールに投入する抽出は常にワーカー数までにし、
+    残りは集計ごとの待ち行列に置いて、空いたワーカーを実行中の集計へ順番に（ラウンドロビンで）割り当てる。
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_active_runs: Optional[int] = None,
+        pool_factory: Callable[[int], Executor] = create_pool,
+    ):
+        self.max_workers = resolve_workers(max_workers)
+        self.max_active_runs = resolve_max_active_runs(max_active_runs)
+        self._pool_factory = pool_factory
+        self._pool: Optional[Executor] = None
+        # 完了コールバックがロックを持ったまま呼ばれることがあるので再入可能なロックにする
+        self._cond = threading.Condition(threading.RLock())
+        self._waiting: List[SchedulerJob] = []
+        self._active: List[SchedulerJob] = []
+        self._next = 0            # ラウンドロビンで次に割り当てる集計（_active の位置）
+        self._running = 0
+        self._started = time.monotonic()
+        self._busy_sec = 0.0
+        self._completed = 0
+        self._peak_queued = 0
+
+    # ---- 集計の受け付け ----
+    @contextmanager
+    def job(
+        self,
+        session_id: str,
+        max_in_flight: Optional[int] = None,
+        on_wait: Optional[WaitCallback] = None,
+        poll: float = 0.5,
+    ) -> Iterator[SchedulerJob]:
+        """順番が来るまで待ってから集計を受け付ける。
+
+        待っている間は poll 秒ごとに on_wait(何件目か) を呼ぶ（on_wait が例外を投げると待つのをやめる）。
+        with を抜けると、まだ始まっていない抽出を取り消して次の集計に順番を回す。
+        """
+        job = SchedulerJob(self, session_id, max_in_flight)
+        started = time.monotonic()
+        with self._cond:
+            self._waiting.append(job)
+            self._admit()
+        try:
+            while True:
+                with self._cond:
+                    if job not in self._waiting:
+                        break
+                    self._cond.wait(poll)
+                    position = self._waiting.index(job) + 1 if job in self._waiting else 0
+                if position and on_wait is not None:
+                    on_wait(position)
+            job.waited_sec = time.monotonic() - started
+            yield job
+        finally:
+            self._finish(job)
+
+    def _admit(self) -> None:
+        # 受け付け順に、同じセッションの集計が実行中でないものから空いている枠に入れる
+        for job in list(self._waiting):
+            if len(self._active) >= self.max_active_runs:
+                break
+            if any(a.session_id == job.session_id for a in self._active):
+                continue
+            self._waiting.remove(job)
+            self._active.append(job)
+        self._cond.notify_all()
+
+    def _finish(self, job: SchedulerJob) -> None:
+        with self._cond:
+            if job in self._waiting:
+                self._waiting.remove(job)
+            if job in self._active:
+                index = self._active.index(job)
+                self._active.remove(job)
+                if index < self._next:
+                    self._next -= 1
+            cancelled = list(job.queue)
+            job.queue.clear()
+            self._admit()
+            self._dispatch()
+        for future, *_ in cancelled:
+            future.cancel()
+
+    # ---- 抽出の割り当て ----
+    def _submit(self, job: SchedulerJob, fn, args, kwargs) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if job not in self._active:
+                raise RuntimeError("受け付けられていない集計からは抽出を投入できません")
+            job.queue.append((future, fn, args, kwargs))
+            self._peak_queued = max(self._peak_queued, self._queued())
+            self._dispatch()
+        return future
+
+    def _queued(self) -> int:
+        return sum(len(job.queue) for job in self._active)
+
+    def _next_job(self) -> Optional[SchedulerJob]:
+        n = len(self._active)
+        for k in range(n):
+            job = self._active[(self._next + k) % n]
+            if job.queue and (job.max_in_flight is None or job.in_flight < job.max_in_flight):
+                self._next = (self._next + k + 1) % n
+                return job
+        return None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = self._pool_factory(self.max_workers)
+        return self._pool
+
+    def _dispatch(self) -> None:
+        # 空いているワーカーの数だけ、実行中の集計から順番に1件ずつプールへ投入する
+        while self._running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            future, fn, args, kwargs = job.queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            job.in_flight += 1
+            self._running += 1
+            started = time.monotonic()
+            pool = self._get_pool()
+            try:
+                pool_future = pool.submit(fn, *args, **kwargs)
+            except BrokenProcessPool as e:
+                self._on_done(job, future, started, pool, None, e)
+                continue
+            pool_future.add_done_callback(partial(self._on_done, job, future, started, pool))
+
+    def _on_done(
+        self, job: SchedulerJob, future: Future, started: float, pool: Executor, pool_future: Optional[Future],
+        error: Optional[BaseException] = None,
+    ) -> None:
+        # pool はこの抽出を投入したプール（作り直した後の self._pool とは別のことがある）
+        if pool_future is not None:
+            if pool_future.cancelled():
+                error = CancelledError()
+            else:
+                error = pool_future.exception()
+        with self._cond:
+            job.in_flight -= 1
+            self._running -= 1
+            self._busy_sec += time.monotonic() - started
+            self._completed += 1
+            if isinstance(error, BrokenProcessPool) and self._pool is pool:
+                # ワーカーが落ちた（メモリ不足など）プールは捨て、次の投入で作り直す。
+                # 壊れたプールの残りの抽出も同じ例外で戻ってくるが、作り直した後のプールは止めない
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            self._dispatch()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(pool_future.result())
+
+    # ---- 状態 ----
+    def stats(self) -> Dict[str, float]:
+        """待ち行列の長さとワーカーの稼働状況。
+
+        utilization は今の稼働率、average_utilization は作成時からの平均稼働率（0〜1）。
+        """
+        with self._cond:
+            uptime = time.monotonic() - self._started
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued(),
+                "peak_queued": self._peak_queued,
+                "active_runs": len(self._active),
+                "waiting_runs": len(self._waiting),
+                "completed": self._completed,
+                "utilization": round(self._running / self.max_workers, 3),
+                "average_utilization": round(self._busy_sec / (self.max_workers * uptime), 3) if uptime > 0 else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+from kwh_engine.extraction import EXTRACTOR_VERSION
+from kwh_engine.pipeline import AggregationResult, CommonAreaResult
+
+
+# =========================================================
+# 集計結果のスナップショット（PDFを読み直さずにレポートを作り直す）
+# =========================================================
+SNAPSHOT_FORMAT = "kwh-snapshot"
+SNAPSHOT_VERSION = 1
+
+# 保存日時はサーバーのタイムゾーンに依存させず、日本時間で記録・表示する
+JST = timezone(timedelta(hours=9))
+
+
+class Snapshot(NamedTuple):
+    result: AggregationResult
+    extractor_version: str     # 保存したときの抽出器バージョン（今の EXTRACTOR_VERSION と違うことがある）
+    saved_at: str              # 保存日時（ISO 8601、日本時間）
+
+
+def _plain(values: List[Any]) -> List[Any]:
+    # JSONにNaNは書けないので None にする
+    return [None if pd.isna(v) else v for v in values]
+
+
+def _encode_unit_list(unit_list: pd.DataFrame) -> Dict[str, Any]:
+    # 列ごとに値と型を保存する。カテゴリ型はカテゴリ一覧とコードに分けて小さくする
+    columns = {}
+    for name, col in unit_list.items():
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            columns[name] = {
+                "dtype": "category",
+                "categories": col.cat.categories.tolist(),
+                "codes": col.cat.codes.tolist(),
+            }
+        else:
+            columns[name] = {"dtype": str(col.dtype), "values": _plain(col.tolist())}
+    return columns
+
+
+def _decode_unit_list(columns: Dict[str, Any]) -> pd.DataFrame:
+    data = {}
+    for name, col in columns.items():
+        if col["dtype"] == "category":
+            data[name] = pd.Categorical.from_codes(col["codes"], categories=col["categories"])
+        else:
+            data[name] = pd.Series(col["values"], dtype=col["dtype"])
+    return pd.DataFrame(data)
+
+
+def save_snapshot(result: AggregationResult) -> bytes:
+    """集計結果を、レポートの再作成に必要な分だけのJSON（UTF-8）にする。
+
+    タイプ別kWh・専用部PDFの抽出結果・共用部の値・住戸リスト・入力のハッシュ・抽出器バージョンを含む。
+    専用部PDFのデバッグ情報とPDF本体は含めない。
+    """
+    common = result.common
+    payload = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "extractor_version": EXTRACTOR_VERSION,
+        "saved_at": datetime.now(JST).isoformat(timespec="seconds"),
+        "project_name": result.project_name,
+        "mode": result.mode,
+        "pdf_rows": result.pdf_rows,
+        "type_kwh": result.type_kwh,
+        "common": None if common is None else {
+            "building_total": common.building_total,
+            "solar_reduction": common.solar_reduction,
+            "actual_consumption": common.actual_consumption,
+            "debug_info": common.debug_info,
+        },
+        "unit_list": None if result.unit_list is None else _encode_unit_list(result.unit_list),
+        "pdf_digests": result.pdf_digests,
+        "csv_digest": result.csv_digest,
+        "common_digest": result.common_digest,
+    }
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_snapshot(data: bytes) -> Snapshot:
+    """save_snapshot で保存したJSONから集計結果を復元する。形式が違う場合は ValueError。"""
+    try:
+        payload = json.loads(data.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError("スナップショットのJSONを読み込めません")
+    if not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("集計結果のスナップショットではありません")
+    if payload.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"対応していないスナップショットの形式です（version {payload.get('version')}）")
+
+    try:
+        common: Optional[CommonAreaResult] = None
+        if payload["common"] is not None:
+            common = CommonAreaResult(**payload["common"])
+        unit_list = _decode_unit_list(payload["unit_list"]) if payload["unit_list"] is not None else None
+        pdf_rows = payload["pdf_rows"]
+        result = AggregationResult(
+            project_name=payload["project_name"],
+            pdf_rows=pdf_rows,
+            type_kwh=payload["type_kwh"],
+            private_debug=[[] for _ in pdf_rows],
+            common=common,
+            unit_list=unit_list,
+            mode=payload["mode"],
+            pdf_digests=payload["pdf_digests"],
+            csv_digest=payload["csv_digest"],
+            common_digest=payload["common_digest"],
+        )
+        # 以前の保存分はサーバーのタイムゾーンで記録されているので、日本時間に揃える
+        saved_at = datetime.fromisoformat(payload["saved_at"]).astimezone(JST).isoformat(timespec="seconds")
+        return Snapshot(result, payload["extractor_version"], saved_at)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"スナップショットの内容が不正です: {e}")
@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+# =========================================================
+# 抽出結果の永続ストア（SQLite）
+# =========================================================
+# KWH_STORE_PATH / --store にこの値を指定すると抽出ストアを使わない
+STORE_OFF = "off"
+
+
+def resolve_store_path(store_path: Optional[str] = None, default: Optional[str] = None) -> Optional[str]:
+    """抽出ストアのパス。未指定なら環境変数 KWH_STORE_PATH → default の順。"off" なら None（使わない）。"""
+    if store_path is None:
+        store_path = os.environ.get("KWH_STORE_PATH", "").strip() or default
+    if not store_path or store_path.strip().lower() == STORE_OFF:
+        return None
+    return store_path
+
+
+class Provenance(NamedTuple):
+    """抽出結果の出どころ。デバッグ情報は抽出結果の値そのものに含まれる。"""
+    file_name: Optional[str]     # 最初に抽出したときのファイル名
+    page: Optional[int]          # 値を読んだページ（1始まり）
+    anchor: Optional[str]        # 値を探す起点にした行
+    stored_at: Optional[float] = None   # 保存日時（UNIX時刻）
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key       TEXT PRIMARY KEY,
+    value     TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    file_name TEXT,
+    page      INTEGER,
+    anchor    TEXT,
+    stored_at REAL NOT NULL,
+    used_at   REAL NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS extractions_used_at ON extractions (used_at);
+"""
+
+
+class ExtractionStore:
+    """抽出結果を1つのSQLiteファイルに保存し、プロセス・セッションをまたいで共有する。
+
+    キーは ExtractionCache.make_key と同じ（PDF内容のSHA-256と抽出器バージョン）で、
+    主キー1回の参照で引ける。値と一緒に出どころ（Provenance）を保存する。
+    最終利用から max_age_days を過ぎた結果は削除し、件数・サイズの上限を超えたら
+    最終利用の古い順に削除する（put が prune_interval 回行われるたびに確認）。
+    同じファイルを複数プロセスから開いてもよい（WALモード）。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age_days: Optional[float] = 180,
+        prune_interval: int = 256,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.prune_interval = prune_interval
+        self._puts = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Streamlitではセッションごとに別スレッドから呼ばれるので、1つの接続をロックで守って使う
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.prune()
+
+    def get(self, key: str) -> Tuple[bool, Any, Optional[Provenance]]:
+        """(見つかったか, 値, 出どころ) を返し、見つかった結果の最終利用日時を更新する。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, file_name, page, anchor, stored_at FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False, None, None
+            self._conn.execute(
+                "UPDATE extractions SET used_at = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+        value, file_name, page, anchor, stored_at = row
+        return True, json.loads(value), Provenance(file_name, page, anchor, stored_at)
+
+    def put(self, key: str, value: Any, provenance: Optional[Provenance] = None) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        file_name, page, anchor = provenance[:3] if provenance is not None else (None, None, None)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, value, size, file_name, page, anchor, stored_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, data, len(key) + len(data.encode("utf-8")), file_name, page, anchor, now, now),
+            )
+            self._puts += 1
+            due = self._puts % self.prune_interval == 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """保持期限・件数・サイズの上限を超えた結果を削除し、削除した件数を返す。"""
+        with self._lock:
+            removed = 0
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute("DELETE FROM extractions WHERE used_at < ?", (cutoff,)).rowcount
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+            if entries > self.max_entries or size > self.max_bytes:
+                # 新しい順に数えて、件数またはサイズの累計が上限を超えた分を削除する
+                removed += self._conn.execute(
+                    "DELETE FROM extractions WHERE key IN ("
+                    " SELECT key FROM ("
+                    "  SELECT key,"
+                    "   ROW_NUMBER() OVER (ORDER BY used_at DESC, key) AS n,"
+                    "   SUM(size) OVER (ORDER BY used_at DESC, key) AS total"
+                    "  FROM extractions)"
+                    " WHERE n > ? OR total > ?)",
+                    (self.max_entries, self.max_bytes),
+                ).rowcount
+            return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM extractions"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": hits}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
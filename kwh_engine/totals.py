@@ -0,0 +1,50 @@
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+
+# =========================================================
+# 集計値（画面の合計表示・Excel・PDFで共通に使う）
+# =========================================================
+class EnergyTotals(NamedTuple):
+    """住戸リストと共用部の値から求めた集計値。画面・Excel・PDFはすべてこの値を表示する。"""
+    types: pd.DataFrame                 # タイプ別集計（タイプ/戸数/合計消費電力量/1住戸あたり、タイプ順）
+    units: int                          # 住戸数（住戸の番号の重複を除いた数）
+    type_units: int                     # タイプ別集計の戸数の合計
+    private_kwh: int                    # 専用部合計消費電力量
+    common_area_mwh: Optional[float]    # 共用部の実際の消費電力（太陽光削減前）
+    building_total: Optional[float]     # 共用部PDFの建物全体（太陽光削減後）[MWh]
+    solar_reduction: Optional[float]    # 共用部PDFの太陽光削減量 [MWh]
+    common_kwh: Optional[int]           # 共用部消費電力量（common_area_mwh を kWh にして切り捨て）
+    grand_total_kwh: Optional[int]      # 建物全体消費電力量（専用部 + 共用部）
+
+
+def compute_totals(
+    unit_list: pd.DataFrame,
+    common_area_mwh: Optional[float] = None,
+    building_total: Optional[float] = None,
+    solar_reduction: Optional[float] = None,
+) -> EnergyTotals:
+    """タイプ別の戸数・合計を1回の groupby で求め、合計値と共用部の内訳をまとめる。"""
+    kwh = unit_list["消費電力量[kWh]"]
+    types = (
+        unit_list
+        .groupby("タイプ", as_index=False, observed=True, sort=True)
+        .agg(戸数=("住戸の番号", "count"), 合計消費電力量=("消費電力量[kWh]", "sum"))
+    )
+    types["戸数"] = types["戸数"].astype("int64")
+    types["1住戸あたり"] = (types["合計消費電力量"] / types["戸数"]).round(0).astype(int)
+
+    private_kwh = int(kwh.sum())
+    common_kwh = int(common_area_mwh * 1000) if common_area_mwh is not None else None
+    return EnergyTotals(
+        types=types,
+        units=int(unit_list["住戸の番号"].nunique()),
+        type_units=int(types["戸数"].sum()),
+        private_kwh=private_kwh,
+        common_area_mwh=common_area_mwh,
+        building_total=building_total,
+        solar_reduction=solar_reduction,
+        common_kwh=common_kwh,
+        grand_total_kwh=private_kwh + common_kwh if common_kwh is not None else None,
+    )
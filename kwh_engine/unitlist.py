@@ -0,0 +1,208 @@
+import codecs
+import difflib
+import io
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from kwh_engine.extraction import extract_type_key_from_label
+
+
+# =========================================================
+# 住戸リストCSVの読み込み
+# =========================================================
+SNIFF_BYTES = 64 * 1024                      # 文字コード判定に使う先頭のバイト数
+CHUNKED_THRESHOLD_BYTES = 16 * 1024 * 1024   # これより大きいCSVは分割して読む
+CHUNK_ROWS = 100_000
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """先頭のバイト列から文字コードを判定する。BOMつき/UTF-8として読めれば utf-8-sig、それ以外は cp932。"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # 先頭だけを切り出したので、末尾のマルチバイト文字が途中で切れている場合は UTF-8 とみなす
+        if not (e.reason == "unexpected end of data" and e.start >= len(sample) - 3):
+            return "cp932"
+    return "utf-8-sig"
+
+
+def _downcast_integers(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast="integer")
+    return values
+
+
+def _read_csv_once(csv_bytes: bytes, encoding: str, chunksize: Optional[int]) -> pd.DataFrame:
+    header = pd.read_csv(io.BytesIO(csv_bytes), encoding=encoding, nrows=0)
+    try:
+        col_row, col_num, col_type = detect_unitlist_columns(header)
+    except UnitListColumnError:
+        # 必要な列が見つからないCSVは全列を読み、列検出のエラーは prepare_unit_list で出す
+        return pd.read_csv(io.BytesIO(csv_bytes), encoding=encoding)
+
+    kwargs = dict(encoding=encoding, usecols=[col_row, col_num, col_type], dtype={col_type: "category"})
+    if chunksize:
+        chunks = list(pd.read_csv(io.BytesIO(csv_bytes), chunksize=chunksize, **kwargs))
+        units = pd.concat(chunks, ignore_index=True) if chunks else header[[col_row, col_num, col_type]]
+        # チャンクごとにカテゴリが違うので、連結後のタイプ列はカテゴリを合わせて作り直す
+        if len(chunks) > 1:
+            units[col_type] = union_categoricals([c[col_type] for c in chunks], sort_categories=True)
+    else:
+        units = pd.read_csv(io.BytesIO(csv_bytes), **kwargs)
+    units[col_row] = _downcast_integers(units[col_row])
+    units[col_num] = _downcast_integers(units[col_num])
+    return units
+
+
+def read_unit_list_csv(csv_bytes: bytes, chunksize: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """住戸リストCSVを読み込む。読めなければ None。
+
+    文字コードは先頭のバイト列から1回だけ判定し（判定が外れたときだけ他方で読み直す）、
+    detect_unitlist_columns が使う3列だけを、タイプはカテゴリ型・整数列は最小の整数型で読む。
+    chunksize（行数）を指定するか CHUNKED_THRESHOLD_BYTES を超える大きさなら分割して読む。
+    """
+    if chunksize is None and len(csv_bytes) > CHUNKED_THRESHOLD_BYTES:
+        chunksize = CHUNK_ROWS
+    encoding = sniff_encoding(csv_bytes[:SNIFF_BYTES])
+    for enc in (encoding, "cp932" if encoding != "cp932" else "utf-8-sig"):
+        try:
+            return _read_csv_once(csv_bytes, enc, chunksize)
+        except Exception:
+            continue
+    return None
+
+
+# =========================================================
+# 住戸リストCSVの列検出
+# =========================================================
+class UnitListColumnError(RuntimeError):
+    """住戸リストCSVに集計に必要な列（行番号・住戸の番号・住宅タイプの名称）がない。"""
+
+
+def detect_unitlist_columns(df: pd.DataFrame):
+    col_row = next((c for c in df.columns if "行" in c), None)
+    if col_row is None:
+        raise UnitListColumnError("『行番号』列が見つかりません")
+    col_num = next((c for c in df.columns if ("住戸" in c and "番号" in c)), None)
+    if col_num is None:
+        raise UnitListColumnError("『住戸の番号』列が見つかりません")
+    candidates = [
+        c for c in df.columns
+        if ("住宅タイプ" in c) or ("タイプ" in c and "名称" in c)
+    ]
+    if not candidates:
+        raise UnitListColumnError("『住宅タイプの名称』列が見つかりません")
+    return col_row, col_num, candidates[0]
+
+
+# =========================================================
+# 住戸リストとタイプ別kWhの突き合わせ
+# =========================================================
+def type_keys(labels: pd.Series) -> pd.Series:
+    """「住宅タイプの名称」列をタイプキーのカテゴリ列にする。名称の正規化はカテゴリごとに1回だけ行う。"""
+    labels = labels.astype("category")
+    if labels.isna().any():
+        # 空欄は従来どおり文字列 "nan" のタイプとして扱う
+        if "nan" not in labels.cat.categories:
+            labels = labels.cat.add_categories(["nan"])
+        labels = labels.fillna("nan")
+    keys = labels.cat.categories.map(extract_type_key_from_label)
+    # 正規化で同じキーになる名称（全角/半角違いなど）をまとめ、キーは文字列順に並べる
+    key_codes, uniques = pd.factorize(np.asarray(keys, dtype=object), sort=True)
+    codes = key_codes[labels.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=labels.index)
+
+
+def _loose_key(key: str) -> str:
+    # 近い候補を探すための比較用キー（大文字小文字・区切り記号・長音の違いを無視）
+    return re.sub(r"[\s\-_・.ー]", "", key.casefold())
+
+
+class TypeKeyIndex:
+    """専用部PDFのタイプ別kWhを住戸リストのタイプへ割り当てるための索引。集計1回につき1つ作る。
+
+    住戸リスト側はカテゴリ型のタイプ列を受け取り、カテゴリごとにPDF側の位置を引いてから
+    カテゴリコードで全行へ一括で展開する。一致しなかったタイプには近いPDF側のタイプを提示する。
+    """
+
+    def __init__(self, type_kwh: Dict[str, Optional[int]]):
+        self.type_kwh = type_kwh
+        self.keys = pd.Index(list(type_kwh), dtype=object)
+        self._loose = [_loose_key(k) for k in self.keys]
+
+    def lookup(self, categories: pd.Index) -> pd.Series:
+        """カテゴリごとのkWh。すべてそろっていれば整数型、欠けがあれば float（NaN）になる。"""
+        positions = self.keys.get_indexer(pd.Index(categories, dtype=object))
+        values = [self.type_kwh[self.keys[p]] if p >= 0 else None for p in positions]
+        return pd.Series(values, dtype=object).infer_objects() if values else pd.Series(values, dtype=float)
+
+    def map(self, types: pd.Series) -> pd.Series:
+        types = types.astype("category")
+        kwh = self.lookup(types.cat.categories)
+        if kwh.isna().any() or kwh.dtype == object:
+            kwh = kwh.astype(float)
+        return pd.Series(kwh.to_numpy()[types.cat.codes.to_numpy()], index=types.index, dtype=kwh.dtype)
+
+    def unmatched(self, types: pd.Series) -> List[str]:
+        """住戸リストにあってPDF側にないタイプ（文字列順）。"""
+        categories = types.astype("category").cat.categories
+        return sorted(c for c, p in zip(categories, self.keys.get_indexer(pd.Index(categories, dtype=object))) if p < 0)
+
+    def suggest(self, key: str, exclude: Tuple[str, ...] = (), limit: int = 3, cutoff: float = 0.6) -> List[str]:
+        """key に近いPDF側のタイプを、近い順に最大 limit 件返す。
+
+        区切り記号・長音・大文字小文字だけが違うものを最優先し、残りは文字列の類似度で並べる。
+        exclude には住戸リストで既に使われているタイプを渡す（それらは候補から外す）。
+        """
+        loose = _loose_key(key)
+        scored = []
+        for candidate, candidate_loose in zip(self.keys, self._loose):
+            if candidate in exclude or candidate == key:
+                continue
+            if candidate_loose == loose:
+                score = 1.0
+            else:
+                score = difflib.SequenceMatcher(None, loose, candidate_loose).ratio()
+            if score >= cutoff:
+                scored.append((-score, candidate))
+        return [candidate for _, candidate in sorted(scored)[:limit]]
+
+    def suggestions(self, types: pd.Series, limit: int = 3) -> Dict[str, List[str]]:
+        """住戸リストのタイプのうちPDF側にないものについて、{タイプ: 近いPDF側のタイプ} を返す。"""
+        used = tuple(types.astype("category").cat.categories)
+        return {key: self.suggest(key, used, limit) for key in self.unmatched(types)}
+
+
+def map_type_kwh(types: pd.Series, type_kwh: Dict[str, Optional[int]]) -> pd.Series:
+    """タイプ列（カテゴリ型）の各行にタイプ別kWhを割り当てる。"""
+    return TypeKeyIndex(type_kwh).map(types)
+
+
+def prepare_unit_list(units: pd.DataFrame) -> pd.DataFrame:
+    """住戸リストの列を検出し、集計用の3列（行番号/住戸の番号/タイプ）を返す。
+
+    タイプ別kWhを使わないので、PDFの抽出と並行して進められる。列が見つからなければ UnitListColumnError。
+    """
+    col_row, col_num, col_type = detect_unitlist_columns(units)
+    return pd.DataFrame({
+        "行番号": units[col_row],
+        "住戸の番号": units[col_num],
+        "タイプ": type_keys(units[col_type]),
+    })
+
+
+def assign_unit_kwh(prepared: pd.DataFrame, type_kwh: Dict[str, Optional[int]]) -> pd.DataFrame:
+    """prepare_unit_list の結果にタイプ別kWhの列（消費電力量[kWh]）を足す（prepared をそのまま使う）。"""
+    prepared["消費電力量[kWh]"] = map_type_kwh(prepared["タイプ"], type_kwh)
+    return prepared
+
+
+def build_unit_list(units: pd.DataFrame, type_kwh: Dict[str, Optional[int]]) -> pd.DataFrame:
+    """住戸リストの各行にタイプ別kWhを割り当て、集計用の4列（行番号/住戸の番号/タイプ/消費電力量[kWh]）を返す。"""
+    return assign_unit_kwh(prepare_unit_list(units), type_kwh)
@@ -0,0 +1,61 @@
+import importlib
+import threading
+import time
+from typing import Dict, Optional
+
+
+# =========================================================
+# 事前読み込み（集計用ライブラリ・PDFレポートの日本語フォント）
+# =========================================================
+# 集計・レポート作成で使うモジュール（使う順）
+WARM_UP_MODULES = ["pandas", "kwh_engine.pipeline", "kwh_engine.snapshot", "pdfplumber", "kwh_engine.reports"]
+
+WARM_UP_THREAD_NAME = "kwh-warm-up"
+
+
+def warm_up() -> Dict[str, float]:
+    """集計・レポート作成に使うモジュールを読み込み、PDFレポートの日本語フォントを登録する。
+
+    読み込み済みのものは何もしない。モジュール名（フォントは "pdf_styles"）→ 所要時間[秒] を返す。
+    """
+    timings: Dict[str, float] = {}
+    for name in WARM_UP_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = round(time.perf_counter() - started, 6)
+
+    from kwh_engine.reports import pdf_styles
+
+    started = time.perf_counter()
+    pdf_styles()
+    timings["pdf_styles"] = round(time.perf_counter() - started, 6)
+    return timings
+
+
+class BackgroundWarmUp:
+    """warm_up をデーモンスレッドで実行する。ログイン画面の表示中など、待ち時間に始めておく。
+
+    本処理は完了を待たずに進めてよい（同じモジュールの読み込みは Python が1回にまとめ、
+    フォントの登録は reports.pdf_styles のロックで1回にまとめる）。
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name=WARM_UP_THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self.timings = warm_up()
+        except Exception as e:
+            # 失敗しても、本処理で必要になったときに改めて読み込まれる
+            self.error = e
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._thread.join(timeout)
+        return self.done
@@ -0,0 +1,9 @@
+import pytest
+
+from benchmarks.corpus import make_project
+
+
+@pytest.fixture(scope="session")
+def project():
+    """6タイプ・60戸の合成物件（正解値つき）。入力を変えるテストは dataclasses.replace で複製して使う。"""
+    return make_project(6, 60, private_pages=2, common_pages=4)
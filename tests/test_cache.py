@@ -0,0 +1,32 @@
+from kwh_engine.cache import SOURCE_DISK, SOURCE_MEMORY, SOURCE_STORE, ExtractionCache, describe_hit
+from kwh_engine.store import ExtractionStore, Provenance
+
+
+def test_memory_hit(tmp_path):
+    cache = ExtractionCache()
+    cache.put("k", [1800, []], Provenance("A.pdf", 3, "消費電力量 [kWh/年]"))
+    hit = cache.lookup("k")
+    assert (hit.value, hit.source, hit.provenance.file_name) == ([1800, []], SOURCE_MEMORY, "A.pdf")
+
+
+def test_disk_hit_is_reported_as_cache_file(tmp_path):
+    ExtractionCache(disk_dir=str(tmp_path)).put("private-v-abcd", [1800, []])
+    hit = ExtractionCache(disk_dir=str(tmp_path)).lookup("private-v-abcd")
+    assert hit.source == SOURCE_DISK
+    assert hit.provenance is None
+    assert describe_hit(hit) == "（キャッシュファイルの抽出結果を使用）"
+
+
+def test_store_hit_keeps_provenance(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    ExtractionCache(store=ExtractionStore(path)).put("private-v-abcd", [1800, []], Provenance("A.pdf", 3, "消費電力量"))
+    hit = ExtractionCache(store=ExtractionStore(path)).lookup("private-v-abcd")
+    assert hit.source == SOURCE_STORE
+    assert hit.provenance.file_name == "A.pdf"
+    assert describe_hit(hit).startswith("（抽出ストアの抽出結果を使用: ")
+
+
+def test_miss():
+    cache = ExtractionCache()
+    assert cache.lookup("missing") is None
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,41 @@
+import json
+import os
+import zipfile
+
+from benchmarks.corpus import make_project
+from kwh_engine.cli import output_dir_names, run_batch
+
+
+def test_output_dir_names():
+    projects = ["A/物件1", "B/物件1.zip", "C/物件2", "D/物件１", "E/物件1_2", "F/Project", "G/project.zip"]
+    assert output_dir_names(projects) == ["物件1", "物件1_2", "物件2", "物件１_3", "物件1_2_2", "Project", "project_2"]
+
+
+def _write_project(project, folder: str) -> None:
+    os.makedirs(folder)
+    with open(os.path.join(folder, "住戸リスト.csv"), "wb") as fp:
+        fp.write(project.inputs.csv_bytes)
+    for pdf in project.inputs.private_pdfs:
+        with open(os.path.join(folder, pdf.name), "wb") as fp:
+            fp.write(pdf.data)
+
+
+def test_same_project_name_does_not_overwrite(tmp_path):
+    # 別のフォルダにある同じ名前の物件（フォルダとZIP）を1回のバッチで集計する
+    first = make_project(2, 4, private_pages=1)
+    second = make_project(3, 6, private_pages=1)
+    _write_project(first, str(tmp_path / "A" / "物件1"))
+    _write_project(second, str(tmp_path / "B" / "物件1"))
+    with zipfile.ZipFile(tmp_path / "物件1.zip", "w") as zf:
+        for name in os.listdir(tmp_path / "B" / "物件1"):
+            zf.write(tmp_path / "B" / "物件1" / name, name)
+
+    out = tmp_path / "out"
+    batch = run_batch([str(tmp_path / "A" / "物件1"), str(tmp_path / "物件1.zip")], str(out), max_workers=1)
+    assert [s["status"] for s in batch["projects"]] == ["ok", "ok"]
+    assert [os.path.basename(s["reports_dir"]) for s in batch["projects"]] == ["物件1", "物件1_2"]
+    assert [s["units"] for s in batch["projects"]] == [4, 6]
+    for name in ("物件1", "物件1_2"):
+        assert sorted(os.listdir(out / name)) == ["物件1_消費電力量集計.pdf", "物件1_消費電力量集計.xlsx"]
+    summary = json.loads((out / "summary.json").read_text(encoding="utf-8"))
+    assert [s["reports_dir"] for s in summary["projects"]] == [s["reports_dir"] for s in batch["projects"]]
@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks.corpus import make_common_pdf, make_private_pdf
+from kwh_engine.extraction import (
+    EXTRACTION_MODES,
+    _parse_private_kwh,
+    extract_common_area_energy,
+    extract_kwh_from_pdf_bytes,
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1,800", 1800),
+    ("12,345", 12345),
+    ("800", 800),
+    ("1,234,567", 1234567),
+    ("12345", 12345),
+])
+def test_private_kwh_thousands_separator(text, expected):
+    # 「1,800」は以前 800 と読まれていた（3桁区切りの先頭が1〜2桁の場合）
+    raw = f"設計一次エネルギー消費量\n消費電力量 [kWh/年]\n{text}\n"
+    kwh, anchor = _parse_private_kwh(raw)
+    assert kwh == expected
+    assert anchor == "消費電力量 [kWh/年]"
+
+
+def test_private_kwh_on_anchor_line():
+    assert _parse_private_kwh("消費電力量 [kWh/年] 1,800\n") == (1800, "消費電力量 [kWh/年] 1,800")
+
+
+def test_private_kwh_fullwidth_digits():
+    assert _parse_private_kwh("消費電力量 ｋＷｈ\n１，８００")[0] == 1800
+
+
+def test_private_kwh_not_found():
+    assert _parse_private_kwh("消費電力量 kWh\n値なし\n") == (None, None)
+
+
+@pytest.mark.parametrize("mode", EXTRACTION_MODES)
+@pytest.mark.parametrize("kwh", [800, 1800, 12345])
+def test_extract_from_pdf(mode, kwh):
+    assert extract_kwh_from_pdf_bytes(make_private_pdf("A", kwh, pages=2), mode) == kwh
+
+
+@pytest.mark.parametrize("mode", EXTRACTION_MODES)
+@pytest.mark.parametrize("layout", ["new", "old"])
+def test_extract_common_without_metadata(mode, layout):
+    # 合成PDFはバージョンを1ページ目の本文にだけ書くので、4→3ページ目の探索で見つける
+    building_total, solar_reduction, actual, debug_info = extract_common_area_energy(
+        make_common_pdf(120.45, 5.33, layout), mode
+    )
+    assert (building_total, solar_reduction) == (120.45, 5.33)
+    assert actual == pytest.approx(125.78)
+    assert any("4→3ページ目" in line for line in debug_info)
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from kwh_engine.formats import FORMAT_REGISTRY, detect_program_version, parse_program_version, resolve_format
+
+
+class _Page:
+    # 文字を読まれたら失敗する代わりのページ（バージョン判定でページを解析しないことを確かめる）
+    @property
+    def chars(self):
+        raise AssertionError("ページの文字を読みました")
+
+
+def _pdf(metadata):
+    # detect_program_version が使う属性（metadata と pages）だけを持つ代わりのPDF
+    return SimpleNamespace(metadata=metadata, pages=[_Page()])
+
+
+def test_parse_program_version():
+    assert parse_program_version("計算プログラム Ver.3.10 (2026.4)") == "Ver.3.10 2026.04"
+    assert parse_program_version("Ｖｅｒ．３．２") == "Ver.3.2"
+    assert parse_program_version("バージョン表記なし") is None
+
+
+def test_version_from_title():
+    assert detect_program_version(_pdf({"Title": "非住宅 Ver.3.10 2026.04"})) == ("Ver.3.10 2026.04", "メタデータ(Title)")
+
+
+def test_producer_version_is_not_the_program_version():
+    pdf = _pdf({"Producer": "Acrobat Distiller Ver.11.0 (Windows)", "Creator": "PScript5.dll Version 5.2.2"})
+    assert detect_program_version(pdf) == (None, "不明")
+
+
+def test_first_page_is_not_read_without_metadata():
+    # 1ページ目を読むと、新形式では4ページ目と合わせて2ページ分を解析することになる
+    assert detect_program_version(_pdf({})) == (None, "不明")
+    assert detect_program_version(_pdf(None)) == (None, "不明")
+
+
+def test_old_version_from_subject():
+    version, source = detect_program_version(_pdf({"Subject": b"Ver.3.8 (2025.4)"}))
+    assert (version, source) == ("Ver.3.8 2025.04", "メタデータ(Subject)")
+    assert resolve_format(version) is FORMAT_REGISTRY[-1][1]
@@ -0,0 +1,187 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import pandas as pd
+import pytest
+
+from benchmarks.corpus import make_private_pdf
+from kwh_engine.parallel import ExtractionCancelled
+from kwh_engine.pipeline import PdfInput, TypeChange, diff_type_kwh, rebuild_result, run_incremental, run_pipeline
+from kwh_engine.unitlist import UnitListColumnError, detect_unitlist_columns
+
+# 「行番号」列のない住戸リスト
+BAD_CSV = "住戸の番号,住宅タイプの名称\r\n101,A1\r\n".encode("cp932")
+
+
+def _rows(result):
+    return [(r["PDF名"], r["タイプ"], r["kWh"]) for r in result.pdf_rows]
+
+
+# =========================================================
+# 通しの集計
+# =========================================================
+def test_run_pipeline_matches_corpus(project):
+    result = run_pipeline(project.inputs)
+    assert result.type_kwh == project.type_kwh
+    building_total, solar_reduction, actual = project.common
+    assert result.common.building_total == building_total
+    assert result.common.solar_reduction == solar_reduction
+    assert result.common_area_mwh == pytest.approx(actual)
+    assert len(result.unit_list) == 60
+    assert result.unit_list["消費電力量[kWh]"].notna().all()
+    assert result.total_private_kwh == sum(10 * kwh for kwh in project.type_kwh.values())
+
+
+def test_executor_gives_same_result(project):
+    serial = run_pipeline(project.inputs)
+    with ThreadPoolExecutor(2) as executor:
+        pooled = run_pipeline(project.inputs, executor=executor)
+    assert _rows(pooled) == _rows(serial)
+    assert pooled.common == serial.common
+    pd.testing.assert_frame_equal(pooled.unit_list, serial.unit_list)
+
+
+def test_on_pdf_done_called_for_each_pdf(project):
+    seen = []
+    run_pipeline(project.inputs, on_pdf_done=lambda i, row: seen.append(i))
+    assert sorted(seen) == list(range(len(project.inputs.private_pdfs)))
+
+
+# =========================================================
+# 中止・CSVの列エラー
+# =========================================================
+def test_cancel_before_start(project):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(ExtractionCancelled):
+        run_pipeline(project.inputs, cancel=cancel)
+
+
+def test_cancel_during_extraction(project):
+    cancel = threading.Event()
+    seen = []
+
+    def on_pdf_done(i, row):
+        seen.append(i)
+        cancel.set()
+
+    with pytest.raises(ExtractionCancelled):
+        run_pipeline(project.inputs, on_pdf_done=on_pdf_done, cancel=cancel)
+    assert len(seen) < len(project.inputs.private_pdfs)
+
+
+@pytest.mark.parametrize("executor", [None, "threads"])
+def test_csv_column_error_stops_extraction(project, executor):
+    seen = []
+    inputs = replace(project.inputs, csv_bytes=BAD_CSV)
+    pool = ThreadPoolExecutor(1) if executor else None
+    try:
+        with pytest.raises(UnitListColumnError, match="行番号"):
+            run_pipeline(inputs, executor=pool, on_pdf_done=lambda i, row: seen.append(i))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    # CSVの列エラーは専用部PDFをすべて抽出し終える前に届く
+    assert len(seen) < len(inputs.private_pdfs)
+
+
+def test_csv_column_error_in_incremental(project):
+    previous = run_pipeline(project.inputs)
+    with pytest.raises(UnitListColumnError):
+        run_incremental(replace(project.inputs, csv_bytes=BAD_CSV), previous)
+
+
+@pytest.mark.parametrize("header, missing", [
+    ("住戸の番号,住宅タイプの名称", "行番号"),
+    ("行番号,住宅タイプの名称", "住戸の番号"),
+    ("行番号,住戸の番号,備考", "住宅タイプの名称"),
+])
+def test_detect_unitlist_columns_errors(header, missing):
+    with pytest.raises(UnitListColumnError, match=missing):
+        detect_unitlist_columns(pd.DataFrame(columns=header.split(",")))
+
+
+# =========================================================
+# 差分再集計
+# =========================================================
+def test_diff_type_kwh():
+    unit_list = pd.DataFrame({"タイプ": ["A1", "A1", "B1", "C1"]})
+    before = {"A1": 1800, "B1": 2400, "C1": None, "D1": 3000}
+    after = {"A1": 1900, "B1": 2400, "C1": 2100, "E1": 2600}
+    assert diff_type_kwh(before, after, unit_list) == [
+        TypeChange("A1", 1800, 1900, 2),
+        TypeChange("C1", None, 2100, 1),
+        TypeChange("D1", 3000, None, 0),
+        TypeChange("E1", None, 2600, 0),
+    ]
+
+
+def test_diff_type_kwh_without_changes():
+    assert diff_type_kwh({"A1": 1800, "B1": None}, {"A1": 1800, "B1": None}) == []
+
+
+def test_type_change_delta():
+    assert TypeChange("A1", 1800, 1900, 2).delta == 100
+    assert TypeChange("A1", None, 1900, 2).delta is None
+
+
+def test_incremental_replace_remove_add(project):
+    previous = run_pipeline(project.inputs)
+    pdfs = list(project.inputs.private_pdfs)
+    replaced = PdfInput(pdfs[0].name, make_private_pdf("A1", 4321, 2))
+    added = PdfInput("Z9.pdf", make_private_pdf("Z9", 2500, 2))
+    removed = pdfs.pop()
+    inputs = replace(project.inputs, private_pdfs=[replaced] + pdfs[1:] + [added])
+
+    update = run_incremental(inputs, previous)
+    assert update.extracted_pdfs == [replaced.name, added.name]
+    assert update.removed_pdfs == [removed.name]
+    assert update.reused_pdfs == len(pdfs) - 1
+    changes = {c.type_key: (c.before, c.after, c.units) for c in update.type_changes}
+    assert changes == {
+        "A1": (project.type_kwh["A1"], 4321, 10),
+        removed.name[:-4]: (project.type_kwh[removed.name[:-4]], None, 10),
+        "Z9": (None, 2500, 0),
+    }
+    # 全件を集計し直した結果と同じになる
+    full = run_pipeline(inputs)
+    assert _rows(update.result) == _rows(full)
+    pd.testing.assert_frame_equal(update.result.unit_list, full.unit_list)
+
+
+def test_incremental_without_changes_reuses_everything(project):
+    previous = run_pipeline(project.inputs)
+    update = run_incremental(project.inputs, previous)
+    assert update.extracted_pdfs == [] and update.removed_pdfs == [] and update.type_changes == []
+    assert update.reused_pdfs == len(project.inputs.private_pdfs)
+    assert update.result.unit_list is previous.unit_list
+    assert update.result.common == previous.common
+
+
+def test_incremental_with_other_mode_extracts_again(project):
+    previous = run_pipeline(project.inputs)
+    update = run_incremental(replace(project.inputs, mode="anchor"), previous)
+    assert update.reused_pdfs == 0
+    assert _rows(update.result) == _rows(previous)
+
+
+def test_incremental_without_previous_extracts_everything(project):
+    update = run_incremental(project.inputs, None)
+    assert update.reused_pdfs == 0
+    assert _rows(update.result) == _rows(run_pipeline(project.inputs))
+
+
+# =========================================================
+# 前回の結果からの作り直し
+# =========================================================
+def test_rebuild_result_with_new_csv(project):
+    previous = run_pipeline(project.inputs)
+    csv = project.inputs.csv_bytes.decode("cp932").replace(",A1\r\n", ",B1\r\n").encode("cp932")
+    rebuilt = rebuild_result(previous, "改名物件", csv)
+    assert rebuilt.project_name == "改名物件"
+    assert rebuilt.type_kwh == previous.type_kwh
+    assert (rebuilt.unit_list["タイプ"] == "A1").sum() == 0
+    assert rebuilt.total_private_kwh == previous.total_private_kwh + 10 * (
+        project.type_kwh["B1"] - project.type_kwh["A1"]
+    )
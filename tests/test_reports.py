@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pdfplumber
+import pytest
+
+from kwh_engine.pipeline import run_pipeline
+from kwh_engine.reports import build_pdf_report, build_standard_excel
+
+
+def _cells(data: bytes):
+    """ブックの全セルの値と書式、列幅、結合セル。"""
+    ws = openpyxl.load_workbook(io.BytesIO(data)).active
+    cells = []
+    for row in ws.iter_rows():
+        for c in row:
+            value = c.value
+            if isinstance(value, float) and value != value:
+                value = "NaN"
+            cells.append((
+                c.coordinate, value, c.number_format, c.font.b, c.font.sz,
+                c.font.color.rgb if c.font.color else None, c.fill.fill_type, c.fill.fgColor.rgb,
+                c.alignment.horizontal, c.border.left.style, c.border.bottom.style,
+            ))
+    widths = {k: v.width for k, v in ws.column_dimensions.items() if v.width}
+    return cells, widths, sorted(map(str, ws.merged_cells.ranges))
+
+
+def _pages(data: bytes):
+    """各ページの文字列（作成日時の行を除く）。"""
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return [
+            [line for line in (page.extract_text() or "").splitlines() if not line.startswith("作成日時")]
+            for page in pdf.pages
+        ]
+
+
+def _unit_list(n_units: int, n_types: int) -> pd.DataFrame:
+    # kWh のないタイプ（NaN）と、同じ住戸の番号の重複を含む住戸リスト
+    types = [f"T{i % n_types}" for i in range(n_units)]
+    kwh = {f"T{i}": (2000 + i * 7 if i % 5 else np.nan) for i in range(n_types)}
+    unit_list = pd.DataFrame({
+        "行番号": range(1, n_units + 1),
+        "住戸の番号": [100 + i // 2 for i in range(n_units)],
+        "タイプ": pd.Categorical(types),
+    })
+    unit_list["消費電力量[kWh]"] = unit_list["タイプ"].map(kwh).astype(float)
+    return unit_list
+
+
+@pytest.mark.parametrize("n_units, n_types, common_area_mwh", [
+    (1, 1, None),
+    (20, 6, 125.78),
+    (300, 30, 12.3),
+])
+def test_streaming_excel_matches_standard(n_units, n_types, common_area_mwh):
+    unit_list = _unit_list(n_units, n_types)
+    standard = build_standard_excel(unit_list, "物件", common_area_mwh)
+    streaming = build_standard_excel(unit_list, "物件", common_area_mwh, streaming=True)
+    assert _cells(streaming) == _cells(standard)
+
+
+
+def test_streaming_excel_matches_standard_for_pipeline_result(project):
+    result = run_pipeline(project.inputs)
+    standard = build_standard_excel(result.unit_list, result.project_name, result.common_area_mwh, totals=result.totals)
+    streaming = build_standard_excel(
+        result.unit_list, result.project_name, result.common_area_mwh, streaming=True, totals=result.totals
+    )
+    assert _cells(streaming) == _cells(standard)
+
+
+@pytest.mark.parametrize("n_units, n_types", [
+    (1, 1),
+    (150, 12),   # 住戸別詳細が複数ページにまたがる
+])
+def test_streaming_pdf_matches_table(n_units, n_types):
+    unit_list = _unit_list(n_units, n_types)
+    table = _pages(build_pdf_report(unit_list, "物件", 125.78, 300.5, 174.72))
+    streaming = _pages(build_pdf_report(unit_list, "物件", 125.78, 300.5, 174.72, streaming=True))
+    assert streaming == table
+    # 住戸別詳細には全住戸が行番号順に1行ずつ載る
+    lines = [line for page in streaming for line in page]
+    detail = lines[lines.index("住戸別詳細") + 2:]
+    assert [int(line.split()[0]) for line in detail] == list(range(1, n_units + 1))
+    detail_pages = sum(any(line in detail for line in page) for page in streaming)
+    assert (detail_pages > 1) == (n_units > 100)
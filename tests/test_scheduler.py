@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from kwh_engine.scheduler import ExtractionScheduler
+
+
+def _echo(value, delay=0.0):
+    time.sleep(delay)
+    return value
+
+
+def _crash(delay):
+    # ワーカープロセスを落とす（メモリ不足で強制終了された場合と同じく BrokenProcessPool になる）
+    time.sleep(delay)
+    os._exit(1)
+
+
+class _ManualPool:
+    """投入された抽出を手動で完了・失敗させるプール（壊れたプールの後始末を決まった順序で確かめる）。"""
+
+    def __init__(self):
+        self.items = []
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_running_or_notify_cancel()   # ワーカーに渡った扱い（shutdown で取り消されない）
+        self.items.append((future, fn, args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+        if cancel_futures:
+            for future, _, _ in self.items:
+                future.cancel()
+
+    def run(self):
+        for future, fn, args in self.items:
+            if not future.done():
+                future.set_result(fn(*args))
+
+    def crash(self):
+        for future, _, _ in self.items:
+            if not future.done():
+                future.set_exception(BrokenProcessPool("ワーカーが終了しました"))
+
+
+def _thread_scheduler(**kwargs):
+    return ExtractionScheduler(pool_factory=lambda n: ThreadPoolExecutor(n), **kwargs)
+
+
+def test_results_and_errors():
+    scheduler = _thread_scheduler(max_workers=2)
+    with scheduler.job("s") as job:
+        assert [job.submit(_echo, i).result() for i in range(3)] == [0, 1, 2]
+        with pytest.raises(ValueError):
+            job.submit(int, "x").result()
+    stats = scheduler.stats()
+    assert (stats["running"], stats["queued"], stats["active_runs"], stats["completed"]) == (0, 0, 0, 4)
+    scheduler.shutdown()
+
+
+def test_round_robin_between_runs():
+    scheduler = _thread_scheduler(max_workers=1, max_active_runs=2)
+    order = []
+    with scheduler.job("a") as a, scheduler.job("b") as b:
+        gate = a.submit(_echo, "gate", 0.2)   # ワーカーを塞いでいる間に両方の集計から投入する
+        futures = [a.submit(_echo, "a") for _ in range(3)] + [b.submit(_echo, "b") for _ in range(3)]
+        for f in futures:
+            f.add_done_callback(lambda f: order.append(f.result()))
+        gate.result()
+        for f in futures:
+            f.result()
+    assert order == ["b", "a", "b", "a", "b", "a"] or order == ["a", "b", "a", "b", "a", "b"]
+    scheduler.shutdown()
+
+
+def test_waiting_position_and_same_session():
+    scheduler = _thread_scheduler(max_workers=1, max_active_runs=1)
+    positions = []
+    admitted = threading.Event()
+
+    def second_run():
+        with scheduler.job("s", on_wait=positions.append, poll=0.02):
+            admitted.set()
+
+    with scheduler.job("other"):
+        thread = threading.Thread(target=second_run)
+        thread.start()
+        time.sleep(0.1)
+        assert not admitted.is_set()
+        assert scheduler.stats()["waiting_runs"] == 1
+    thread.join(5)
+    assert admitted.is_set()
+    assert positions and set(positions) == {1}
+    scheduler.shutdown()
+
+
+def test_cancelled_wait_leaves_the_queue():
+    scheduler = _thread_scheduler(max_workers=1, max_active_runs=1)
+
+    def stop(position):
+        raise KeyboardInterrupt
+
+    with scheduler.job("a"):
+        with pytest.raises(KeyboardInterrupt):
+            with scheduler.job("b", on_wait=stop, poll=0.02):
+                pass
+        assert scheduler.stats()["waiting_runs"] == 0
+    scheduler.shutdown()
+
+
+def test_crashed_worker_does_not_cancel_other_runs(monkeypatch):
+    # a の抽出2件が壊れたプールから BrokenProcessPool で戻る間に、b の抽出は作り直したプールで完了する。
+    # 1つのプールに2件入っている必要があるので、CPU数にかかわらずワーカーを2つにする
+    monkeypatch.setattr("kwh_engine.scheduler.resolve_workers", lambda n=None: 2)
+    scheduler = ExtractionScheduler(max_workers=2, max_active_runs=2)
+    try:
+        with scheduler.job("a") as a, scheduler.job("b") as b:
+            crashed = [a.submit(_crash, 0.5), a.submit(_echo, "a", 2.0)]
+            others = [b.submit(_echo, i) for i in range(4)]
+            for f in crashed:
+                with pytest.raises(BrokenProcessPool):
+                    f.result(timeout=60)
+            assert [f.result(timeout=60) for f in others] == [0, 1, 2, 3]
+    finally:
+        scheduler.shutdown()
+
+
+def test_broken_pool_is_discarded_only_once(monkeypatch):
+    # 壊れたプールの2件目以降の BrokenProcessPool で、作り直したプール（b の抽出が入っている）を止めない
+    monkeypatch.setattr("kwh_engine.scheduler.resolve_workers", lambda n=None: 2)
+    pools = []
+
+    def factory(n):
+        pools.append(_ManualPool())
+        return pools[-1]
+
+    scheduler = ExtractionScheduler(max_workers=2, max_active_runs=2, pool_factory=factory)
+    with scheduler.job("a") as a, scheduler.job("b") as b:
+        crashed = [a.submit(_echo, "a") for _ in range(2)]
+        others = [b.submit(_echo, i) for i in range(2)]
+        pools[0].crash()
+        for f in crashed:
+            with pytest.raises(BrokenProcessPool):
+                f.result(timeout=0)
+        assert len(pools) == 2 and pools[0].shut_down and not pools[1].shut_down
+        pools[1].run()
+        assert [f.result(timeout=0) for f in others] == [0, 1]
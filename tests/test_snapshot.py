@@ -0,0 +1,70 @@
+import json
+
+import pandas as pd
+import pytest
+
+from kwh_engine.extraction import EXTRACTOR_VERSION
+from kwh_engine.pipeline import excel_report_for, rebuild_result, run_pipeline
+from kwh_engine.snapshot import load_snapshot, save_snapshot
+from tests.test_reports import _cells
+
+
+@pytest.fixture(scope="module")
+def result(project):
+    return run_pipeline(project.inputs)
+
+
+def test_round_trip(result):
+    snapshot = load_snapshot(save_snapshot(result))
+    restored = snapshot.result
+    assert snapshot.extractor_version == EXTRACTOR_VERSION
+    assert restored.project_name == result.project_name
+    assert restored.type_kwh == result.type_kwh
+    assert [(r["PDF名"], r["タイプ"], r["kWh"]) for r in restored.pdf_rows] == [
+        (r["PDF名"], r["タイプ"], r["kWh"]) for r in result.pdf_rows
+    ]
+    assert restored.common.building_total == result.common.building_total
+    assert restored.common.solar_reduction == result.common.solar_reduction
+    assert restored.common.actual_consumption == result.common.actual_consumption
+    assert (restored.pdf_digests, restored.csv_digest, restored.common_digest) == (
+        result.pdf_digests, result.csv_digest, result.common_digest
+    )
+    pd.testing.assert_frame_equal(restored.unit_list, result.unit_list, check_dtype=False, check_categorical=False)
+    assert restored.totals.grand_total_kwh == result.totals.grand_total_kwh
+
+
+def test_rebuilt_report_matches_original(result):
+    rebuilt = rebuild_result(load_snapshot(save_snapshot(result)).result)
+    assert _cells(excel_report_for(rebuilt)) == _cells(excel_report_for(result))
+
+
+def test_rename_and_replace_csv(project, result):
+    rebuilt = rebuild_result(load_snapshot(save_snapshot(result)).result, "改名物件", project.inputs.csv_bytes)
+    assert rebuilt.project_name == "改名物件"
+    assert rebuilt.total_private_kwh == result.total_private_kwh
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"not json", "読み込めません"),
+    (b'{"format": "other"}', "スナップショットではありません"),
+    (b'{"format": "kwh-snapshot", "version": 99}', "対応していない"),
+])
+def test_invalid_snapshot(data, message):
+    with pytest.raises(ValueError, match=message):
+        load_snapshot(data)
+
+
+@pytest.mark.parametrize("key", ["extractor_version", "saved_at", "pdf_rows", "unit_list"])
+def test_snapshot_with_missing_key(result, key):
+    payload = json.loads(save_snapshot(result))
+    del payload[key]
+    with pytest.raises(ValueError, match="スナップショットの内容が不正です"):
+        load_snapshot(json.dumps(payload).encode("utf-8"))
+
+
+def test_saved_at_is_japan_time(result):
+    assert load_snapshot(save_snapshot(result)).saved_at.endswith("+09:00")
+    # サーバーのタイムゾーン（UTCなど）で保存された以前のスナップショットも日本時間で返す
+    payload = json.loads(save_snapshot(result))
+    payload["saved_at"] = "2026-10-16T23:30:00+00:00"
+    assert load_snapshot(json.dumps(payload).encode("utf-8")).saved_at == "2026-10-17T08:30:00+09:00"
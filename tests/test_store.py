@@ -0,0 +1,26 @@
+import pytest
+
+from kwh_engine.store import resolve_store_path
+
+
+def test_store_path_from_argument(monkeypatch):
+    monkeypatch.setenv("KWH_STORE_PATH", "env.sqlite3")
+    assert resolve_store_path("arg.sqlite3") == "arg.sqlite3"
+
+
+def test_store_path_from_env_or_default(monkeypatch):
+    monkeypatch.delenv("KWH_STORE_PATH", raising=False)
+    assert resolve_store_path() is None
+    assert resolve_store_path(default="default.sqlite3") == "default.sqlite3"
+    monkeypatch.setenv("KWH_STORE_PATH", "env.sqlite3")
+    assert resolve_store_path(default="default.sqlite3") == "env.sqlite3"
+
+
+@pytest.mark.parametrize("argument, env", [("off", None), ("OFF", None), (None, "off"), (None, " Off ")])
+def test_store_off(monkeypatch, argument, env):
+    # 「off」という名前のSQLiteファイルを作らず、ストアを使わない
+    if env is None:
+        monkeypatch.delenv("KWH_STORE_PATH", raising=False)
+    else:
+        monkeypatch.setenv("KWH_STORE_PATH", env)
+    assert resolve_store_path(argument, default="default.sqlite3") is None